@@ -0,0 +1,27 @@
+import sys
+from database import SessionLocal
+from services.audit_archive import ensure_audit_partitions, apply_audit_retention, AUDIT_RETENTION_MONTHS
+
+def main():
+    # Optional argument overrides AUDIT_RETENTION_MONTHS
+    retention_months = int(sys.argv[1]) if len(sys.argv) > 1 else AUDIT_RETENTION_MONTHS
+    try:
+        ensure_audit_partitions()
+    except Exception as e:
+        # Retention still runs: months without a partition are deleted row by row
+        print(f"Error preparing audit_log partitions: {e}")
+    db = SessionLocal()
+    try:
+        print(f"--- AUDIT LOG RETENTION ({retention_months} months) ---")
+        archived = apply_audit_retention(db, retention_months)
+        for month, count in archived.items():
+            print(f"{month:%Y-%m}: {count} entries archived")
+        print(f"SUCCESS: {len(archived)} months archived.")
+    except Exception as e:
+        db.rollback()
+        print(f"Error archiving audit log: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
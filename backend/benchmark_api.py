@@ -0,0 +1,196 @@
+"""
+API benchmarks against a seeded database, run in-process through the ASGI test client.
+
+Usage: DATABASE_URL=... python benchmark_api.py [--output results.json] [--compare baseline.json]
+
+The database must be migrated; when it has no plans yet it is seeded first
+(see seed_data.py, sizes via --users / --years / --audit-rows). Each
+scenario runs --repeat times after one warm-up call. Results are written as
+JSON (commit, database, dataset size, latency per scenario) so runs of two
+commits can be compared: with --compare the script exits with status 1 when
+a scenario got slower than the baseline by more than --threshold percent.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from database import SessionLocal, engine
+from models import User, NotfallPlan, AuditLog
+from routers.audit import encode_cursor
+from seed_data import BENCH_ADMIN, BENCH_PASSWORD, seed
+import main as app_module
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _dataset():
+    db = SessionLocal()
+    try:
+        return {
+            "users": db.query(User).count(),
+            "plans": db.query(NotfallPlan).count(),
+            "audit_log": db.query(AuditLog).count(),
+        }
+    finally:
+        db.close()
+
+
+def _deep_audit_cursor(depth: int):
+    """Cursor of the audit page `depth` entries below the newest one (as if paged there)."""
+    db = SessionLocal()
+    try:
+        log = db.query(AuditLog).order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).offset(depth).first()
+        return encode_cursor(log) if log else None
+    finally:
+        db.close()
+
+
+def measure(call, repeat: int):
+    """Latency statistics in ms of `repeat` calls of `call` (returns a response), after one warm-up."""
+    response = call()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = call()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "status": response.status_code,
+        "bytes": len(response.content),
+        "wire_bytes": response.num_bytes_downloaded,  # As sent, i.e. compressed
+        "runs": repeat,
+        "min_ms": round(timings[0], 2),
+        "p50_ms": round(timings[len(timings) // 2], 2),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        "mean_ms": round(sum(timings) / len(timings), 2),
+    }
+
+
+def scenarios(client: TestClient, headers: dict, audit_depth: int):
+    """(name, callable) pairs; every callable performs one request and returns the response."""
+    now = datetime.now()
+    this_monday = datetime.combine(now.date(), datetime.min.time()) - timedelta(days=now.weekday())
+    window = {"start": (this_monday - timedelta(weeks=1)).isoformat(), "end": (this_monday + timedelta(weeks=5)).isoformat()}
+    last_month = (now.replace(day=1) - timedelta(days=1))
+    user_id = client.get("/users/duty-eligible", headers=headers).json()[0]["id"]
+    deep_cursor = _deep_audit_cursor(audit_depth)
+
+    # Free weeks far behind the seeded range; the created plans are deleted after measuring
+    free_weeks = iter(range(10_000))
+    created = []
+
+    def create_free_week():
+        start = datetime(1950, 1, 2) + timedelta(weeks=next(free_weeks))
+        response = client.post("/plans/", json={
+            "start_date": start.isoformat(), "end_date": (start + timedelta(days=7)).isoformat(), "user_id": user_id,
+        }, headers=headers)
+        if response.status_code == 200:
+            created.append(response.json()["id"])
+        return response
+
+    occupied = {"start_date": this_monday.isoformat(), "end_date": (this_monday + timedelta(days=7)).isoformat(), "user_id": user_id}
+    month = {"month": last_month.month, "year": last_month.year}
+    next_year = {"start_date": (this_monday + timedelta(weeks=1)).date().isoformat(), "end_date": (this_monday + timedelta(weeks=53)).date().isoformat()}
+
+    yield "plans_all", lambda: client.get("/plans/", headers=headers)
+    yield "plans_range", lambda: client.get("/plans/", params=window, headers=headers)
+    yield "create_plan_overlap", lambda: client.post("/plans/", json=occupied, headers=headers)
+    yield "create_plan", create_free_week
+    yield "auto_plan_year", lambda: client.post("/plans/auto-plan", json=next_year, headers=headers)
+    yield "stats_overview", lambda: client.get("/stats/overview", headers=headers)
+    yield "export_plans_csv", lambda: client.get("/export/plans", headers=headers)
+    yield "export_plans_csv_month", lambda: client.get("/export/plans", params=month, headers=headers)
+    yield "export_plans_pdf_month", lambda: client.get("/export/plans/pdf", params=month, headers=headers)
+    yield "users_first_page", lambda: client.get("/users/", headers=headers)
+    yield "users_search", lambda: client.get("/users/", params={"q": "schul"}, headers=headers)
+    yield "users_duty_eligible", lambda: client.get("/users/duty-eligible", headers=headers)
+    yield "audit_first_page", lambda: client.get("/audit/", headers=headers)
+    yield "audit_max_page", lambda: client.get("/audit/", params={"limit": 500}, headers=headers)
+    yield "audit_deep_page", lambda: client.get("/audit/", params={"cursor": deep_cursor}, headers=headers)
+    yield "audit_filtered_page", lambda: client.get("/audit/", params={"action": "CONFIRM", "cursor": deep_cursor}, headers=headers)
+
+    for plan_id in created:
+        client.delete(f"/plans/{plan_id}", headers=headers)
+
+
+def compare(results: dict, baseline_path: str, threshold: float) -> bool:
+    """Print p50 changes against a previous result file; True if nothing regressed beyond threshold percent."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"--- compared to {baseline.get('commit')} ({baseline_path}) ---", file=sys.stderr)
+    ok = True
+    for name, result in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            print(f"  {name:<24} new", file=sys.stderr)
+            continue
+        change = (result["p50_ms"] - before["p50_ms"]) / max(before["p50_ms"], 0.01) * 100
+        regressed = change > threshold
+        ok = ok and not regressed
+        print(f"  {name:<24} {before['p50_ms']:9.2f} -> {result['p50_ms']:9.2f} ms  {change:+6.1f}%{'  REGRESSION' if regressed else ''}", file=sys.stderr)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API against the database in DATABASE_URL")
+    parser.add_argument("--output", help="Write the JSON results to this file (default: stdout)")
+    parser.add_argument("--compare", help="Previous JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Allowed p50 slowdown in percent")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--only", help="Comma separated scenario names")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--audit-rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        empty = db.query(NotfallPlan.id).first() is None
+    finally:
+        db.close()
+    if empty:
+        print("Database is empty, seeding...", file=sys.stderr)
+        seed(args.users, args.years, args.audit_rows)
+
+    only = set(args.only.split(",")) if args.only else None
+    results = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "database": engine.dialect.name,
+        "python": platform.python_version(),
+        "dataset": _dataset(),
+        "scenarios": {},
+    }
+    with TestClient(app_module.app) as client:
+        token = client.post("/auth/token", data={"username": BENCH_ADMIN, "password": BENCH_PASSWORD}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        # Deep pages start halfway through the audit log
+        for name, call in scenarios(client, headers, results["dataset"]["audit_log"] // 2):
+            if only and name not in only:
+                continue
+            result = measure(call, args.repeat)
+            results["scenarios"][name] = result
+            print(f"  {name:<24} p50 {result['p50_ms']:9.2f} ms   p95 {result['p95_ms']:9.2f} ms   {result['status']}  {result['bytes']} bytes ({result['wire_bytes']} sent)", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare and not compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
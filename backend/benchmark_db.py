@@ -0,0 +1,128 @@
+"""
+Compare database backends under concurrent API-like load.
+
+Usage: python benchmark_db.py <database_url> [<database_url> ...]
+e.g.   python benchmark_db.py sqlite:////tmp/bench.db postgresql://postgres:password@db:5432/bench_db
+
+Each URL must point at an EMPTY database; the schema is created and filled
+with generated plans. Thread count and operations per thread are set with
+BENCH_THREADS / BENCH_OPS.
+"""
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import and_
+from sqlalchemy.orm import sessionmaker
+from database import Base, make_engine, lock_for_write
+from models import User, NotfallPlan
+from routers.plans import PLAN_SCHEDULE_LOCK
+
+THREADS = int(os.getenv("BENCH_THREADS", "8"))
+OPS = int(os.getenv("BENCH_OPS", "100"))
+FIRST_MONDAY = datetime(2000, 1, 3)
+
+
+def create_plan(Session, user_ids, week):
+    """Same steps as POST /plans: locked overlap check, then insert."""
+    start = FIRST_MONDAY + timedelta(weeks=week)
+    end = start + timedelta(days=7)
+    db = Session()
+    try:
+        lock_for_write(db, PLAN_SCHEDULE_LOCK)
+        overlap = db.query(NotfallPlan.id).filter(
+            and_(NotfallPlan.start_date < end, NotfallPlan.end_date > start)
+        ).first()
+        if overlap is None:
+            db.add(NotfallPlan(start_date=start, end_date=end, user_id=random.choice(user_ids), confirmed=week % 2 == 0))
+        db.commit()
+    finally:
+        db.close()
+
+
+def read_window(Session, weeks):
+    start = FIRST_MONDAY + timedelta(weeks=random.randrange(weeks))
+    db = Session()
+    try:
+        db.query(NotfallPlan).filter(
+            NotfallPlan.end_date >= start, NotfallPlan.start_date <= start + timedelta(weeks=5)
+        ).all()
+    finally:
+        db.close()
+
+
+def on_duty(Session, weeks):
+    at = FIRST_MONDAY + timedelta(hours=random.randrange(weeks * 7 * 24))
+    db = Session()
+    try:
+        db.query(NotfallPlan).filter(
+            NotfallPlan.confirmed == True, NotfallPlan.start_date <= at, NotfallPlan.end_date > at
+        ).first()
+    finally:
+        db.close()
+
+
+def run(name, operations):
+    """Run the callables on THREADS threads; print throughput, latency percentiles and errors."""
+    timings, errors = [], []
+
+    def timed(operation):
+        started = time.perf_counter()
+        try:
+            operation()
+        except Exception as e:
+            errors.append(type(e).__name__)
+        timings.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        list(pool.map(timed, operations))
+    elapsed = time.perf_counter() - started
+
+    timings.sort()
+    p50 = timings[len(timings) // 2] * 1000
+    p95 = timings[int(len(timings) * 0.95)] * 1000
+    print(f"  {name:<12} {len(timings) / elapsed:8.0f} ops/s   p50 {p50:7.2f} ms   p95 {p95:7.2f} ms   errors {len(errors)}")
+
+
+def benchmark(url):
+    engine = make_engine(url, workers=1)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    print(f"--- {engine.dialect.name} ({engine.url.render_as_string(hide_password=True)}) ---")
+
+    Base.metadata.create_all(bind=engine)
+    db = Session()
+    try:
+        if db.query(NotfallPlan.id).first() is not None:
+            print("Database is not empty, skipped.")
+            return
+        users = [
+            User(username=f"bench{i}", email=f"bench{i}@example.com", password_hash="-", first_name="Bench", last_name=str(i))
+            for i in range(20)
+        ]
+        db.add_all(users)
+        db.commit()
+        user_ids = [user.id for user in users]
+    finally:
+        db.close()
+
+    weeks = THREADS * OPS
+    run("create", [lambda week=week: create_plan(Session, user_ids, week) for week in range(weeks)])
+    run("read_window", [lambda: read_window(Session, weeks)] * weeks)
+    run("on_duty", [lambda: on_duty(Session, weeks)] * weeks)
+    # 1 write per 4 reads, writes re-check already booked weeks (overlap found, no insert)
+    mixed = []
+    for week in range(weeks):
+        mixed.append(lambda week=week: create_plan(Session, user_ids, week) if week % 5 == 0 else read_window(Session, weeks))
+    run("mixed", mixed)
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    for url in sys.argv[1:]:
+        benchmark(url)
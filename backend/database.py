@@ -1,17 +1,244 @@
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, NullPool
 import os
+import time
+import itertools
+import threading
+from services.metrics import Counter, Gauge, Histogram
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
 
-engine = create_engine(DATABASE_URL)
+# Pool sizing: every uvicorn/gunicorn worker has its own pool, so the
+# connection budget is split across WEB_CONCURRENCY workers.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or "1")
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "40"))  # Budget for the whole backend
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "10"))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_IDLE_IN_TRANSACTION_TIMEOUT_MS = int(os.getenv("DB_IDLE_IN_TRANSACTION_TIMEOUT_MS", "60000"))
+# PgBouncer in transaction pooling mode: no session state, timeouts are set per transaction
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+# Embedded SQLite mode (small single-node deployments)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))  # Wait this long for the write lock
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # NORMAL is durable across app crashes in WAL mode
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))  # Page cache per connection
+
+# Read replicas for GET endpoints (comma separated URLs, optional)
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))  # Reads stay on the primary this long after a client's write
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "2"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "1"))
+
+POOL_CHECKOUT_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection")
+POOL_TIMEOUTS = Counter("db_pool_checkout_errors_total", "Pool checkouts that failed (e.g. pool timeout)")
+
+
+def pool_limits(workers: int = WEB_CONCURRENCY, budget: int = DB_MAX_CONNECTIONS):
+    """(pool_size, max_overflow) per worker; DB_POOL_SIZE / DB_MAX_OVERFLOW override."""
+    per_worker = max(2, budget // max(1, workers))
+    pool_size = int(os.getenv("DB_POOL_SIZE", max(1, per_worker // 2)))
+    max_overflow = int(os.getenv("DB_MAX_OVERFLOW", max(0, per_worker - pool_size)))
+    return pool_size, max_overflow
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long checkouts wait for a free connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+
+def make_sqlite_engine(url: str, workers: int = WEB_CONCURRENCY):
+    """
+    SQLite engine for the embedded mode.
+
+    WAL lets readers run alongside the single writer, and the busy timeout
+    makes concurrent writers queue for the lock instead of failing with
+    "database is locked". Connections are pooled and may be used by any
+    thread of FastAPI's threadpool, but only by one thread at a time.
+    """
+    pool_size, max_overflow = pool_limits(workers)
+    engine = create_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=DB_POOL_TIMEOUT,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+    )
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}")
+        cursor.execute(f"PRAGMA cache_size={-int(SQLITE_CACHE_SIZE_KB)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+    return engine
+
+
+# scheduler/database.py has a copy of this factory (its image has no backend
+# code); keep the pool and timeout settings of both files in sync.
+def make_engine(url: str = DATABASE_URL, workers: int = WEB_CONCURRENCY):
+    """Engine with pool and timeout settings tuned for the backend."""
+    if url.startswith("sqlite") and ":memory:" not in url:
+        return make_sqlite_engine(url, workers)
+    if not url.startswith("postgresql"):
+        return create_engine(url)
+
+    timeouts = {
+        "statement_timeout": DB_STATEMENT_TIMEOUT_MS,
+        "idle_in_transaction_session_timeout": DB_IDLE_IN_TRANSACTION_TIMEOUT_MS,
+    }
+
+    if DB_PGBOUNCER:
+        # PgBouncer owns the pooling; startup options and session SETs would leak between clients
+        engine = create_engine(url, poolclass=NullPool)
+
+        @event.listens_for(engine, "begin")
+        def set_transaction_timeouts(conn):
+            for name, value in timeouts.items():
+                conn.exec_driver_sql(f"SET LOCAL {name} = {int(value)}")
+
+        return engine
+
+    pool_size, max_overflow = pool_limits(workers)
+    options = " ".join(f"-c {name}={int(value)}" for name, value in timeouts.items())
+    return create_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        connect_args={"options": options},
+    )
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+Gauge("db_pool_size", "Configured pool size", lambda: getattr(engine.pool, "size", lambda: 0)())
+Gauge("db_pool_checked_out", "Connections currently checked out", lambda: getattr(engine.pool, "checkedout", lambda: 0)())
+Gauge("db_pool_overflow", "Connections open beyond pool_size", lambda: max(0, getattr(engine.pool, "overflow", lambda: 0)()))
 
 Base = declarative_base()
 
-def get_db():
+# --- Read replica routing ---
+
+replica_engines = [make_engine(url) for url in DATABASE_REPLICA_URLS]
+_replica_cycle = itertools.cycle(replica_engines) if replica_engines else None
+_replica_lag = {}  # engine -> (checked_at, lag_seconds)
+_last_write = {}  # client key -> monotonic time of its last write
+_routing_lock = threading.Lock()
+
+REPLICA_READS = Counter("db_replica_reads_total", "Read sessions by target", labels=("target",))
+
+REPLICA_LAG_SQL = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+def _client_key(request: Request):
+    # The bearer token identifies the client across its requests
+    return request.headers.get("authorization")
+
+
+def _replica_lag_seconds(replica) -> float:
+    """Replication lag of a replica, checked at most every REPLICA_LAG_CHECK_INTERVAL seconds."""
+    now = time.monotonic()
+    checked_at, lag = _replica_lag.get(replica, (None, None))
+    if checked_at is not None and now - checked_at < REPLICA_LAG_CHECK_INTERVAL:
+        return lag
+    try:
+        with replica.connect() as conn:
+            lag = conn.exec_driver_sql(REPLICA_LAG_SQL).scalar()
+            lag = float(lag) if lag is not None else float("inf")
+    except Exception as e:
+        print(f"[DB] Replica {replica.url.host} unavailable: {e}")
+        lag = float("inf")
+    _replica_lag[replica] = (now, lag)
+    return lag
+
+
+def choose_read_engine(client_key=None):
+    """Next healthy replica, or the primary for recent writers and when every replica lags."""
+    if not replica_engines:
+        return engine
+    with _routing_lock:
+        last_write = _last_write.get(client_key)
+    if last_write is not None and time.monotonic() - last_write < READ_YOUR_WRITES_SECONDS:
+        return engine
+    for _ in range(len(replica_engines)):
+        with _routing_lock:
+            replica = next(_replica_cycle)
+        if _replica_lag_seconds(replica) <= REPLICA_MAX_LAG_SECONDS:
+            return replica
+    return engine
+
+
+def lock_for_write(db, key: int):
+    """
+    Serialize check-then-write sequences (e.g. the plan overlap check) across
+    workers until the end of the transaction.
+
+    Postgres takes a transaction-level advisory lock on `key`. SQLite has a
+    single writer anyway, so the transaction is started with BEGIN IMMEDIATE
+    to hold the write lock from the check onwards instead of taking it at
+    the first INSERT.
+    """
+    conn = db.connection()
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql(f"SELECT pg_advisory_xact_lock({int(key)})")
+    elif conn.dialect.name == "sqlite":
+        dbapi_connection = conn.connection.dbapi_connection
+        if not dbapi_connection.in_transaction:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def get_db(request: Request):
     db = SessionLocal()
+    try:
+        yield db
+    finally:
+        if db.info.get("wrote") and replica_engines:
+            now = time.monotonic()
+            with _routing_lock:
+                _last_write[_client_key(request)] = now
+                if len(_last_write) > 10000:
+                    for key, written_at in list(_last_write.items()):
+                        if now - written_at >= READ_YOUR_WRITES_SECONDS:
+                            del _last_write[key]
+        db.close()
+
+def get_read_db(request: Request):
+    """Session for read-only endpoints; routed to a replica when one is configured and fresh."""
+    bind = choose_read_engine(_client_key(request))
+    REPLICA_READS.inc(target="primary" if bind is engine else "replica")
+    db = ReadSessionLocal(bind=bind)
     try:
         yield db
     finally:
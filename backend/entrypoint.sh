@@ -27,5 +27,16 @@ else
     echo "Note: If you changed the HOST/IP, delete /app/certs content and restart."
 fi
 
+# Apply database migrations once, before any worker starts
+if [ "${RUN_MIGRATIONS:-true}" = "true" ]; then
+    echo "Applying database migrations..."
+    alembic upgrade head
+fi
+
+# Default data (admin user, ledger/history backfills, audit partitions) - once, not per worker
+if [ "${RUN_INIT_DB:-true}" = "true" ]; then
+    python init_db.py
+fi
+
 # Execute the CMD passed to docker run
 exec "$@"
@@ -0,0 +1,50 @@
+# Production server: gunicorn master with uvicorn workers.
+# The app is imported once in the master (preload) and forked into the workers.
+import multiprocessing
+import os
+import shutil
+import time
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY") or multiprocessing.cpu_count())
+# database.py splits the connection budget across this many workers
+os.environ["WEB_CONCURRENCY"] = str(workers)
+# Workers share their metrics through this directory, see services/metrics.py
+os.environ.setdefault("METRICS_DIR", "/tmp/notfallplan-metrics")
+
+preload_app = True
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "20"))
+keepalive = 5
+forwarded_allow_ips = "*"
+accesslog = "-"
+
+_fork_times = {}
+
+
+def on_starting(server):
+    # Totals of a previous run would be added to this one's
+    shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
+
+
+def post_fork(server, worker):
+    _fork_times[worker.pid] = time.perf_counter()
+    # Connections opened in the master must not be shared with the workers
+    from database import engine, replica_engines
+    for db_engine in [engine, *replica_engines]:
+        db_engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    from services.metrics import Gauge, start_snapshots
+    start_snapshots()
+
+    started = _fork_times.pop(worker.pid, None)
+    if started is None:
+        return
+    ready_seconds = time.perf_counter() - started
+    worker.log.info(f"[STARTUP] Worker {worker.pid} ready in {ready_seconds * 1000:.0f} ms")
+
+    Gauge("app_worker_startup_seconds", "Time from fork until this worker was ready", lambda: ready_seconds)
+
@@ -0,0 +1,56 @@
+"""
+Import users from a CSV file or directory export (see services/user_import.py).
+
+Usage: python import_users.py users.csv [--default-password ...] [--actor admin] [--dry-run]
+
+The default password can also be given as IMPORT_DEFAULT_PASSWORD, which
+keeps it out of the shell history. Audit entries are attributed to
+--actor (a username) or, without it, to no user.
+"""
+import argparse
+import os
+import sys
+import time
+from database import SessionLocal
+from models import User
+from services.user_import import import_users
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file")
+    parser.add_argument("--format", choices=("csv", "json"), help="Detected from the content when omitted")
+    parser.add_argument("--default-password", default=os.getenv("IMPORT_DEFAULT_PASSWORD"))
+    parser.add_argument("--actor", help="Username the audit entries are attributed to")
+    parser.add_argument("--dry-run", action="store_true", help="Validate and count only")
+    args = parser.parse_args()
+
+    with open(args.file, encoding="utf-8-sig") as f:
+        content = f.read()
+
+    db = SessionLocal()
+    try:
+        actor = None
+        if args.actor:
+            actor = db.query(User).filter(User.username == args.actor).first()
+            if actor is None:
+                sys.exit(f"Unknown actor: {args.actor}")
+
+        started = time.perf_counter()
+        result = import_users(db, actor, content, args.format, default_password=args.default_password, dry_run=args.dry_run)
+        if result["errors"]:
+            db.rollback()
+            for error in result["errors"]:
+                print(f"Line {error['line']}: {error['error']}" if error["line"] else error["error"], file=sys.stderr)
+            sys.exit(f"Import rejected: {len(result['errors'])} error(s), no user was written")
+        db.commit()
+        print(
+            f"{'DRY RUN: ' if args.dry_run else 'SUCCESS: '}{result['created']} created, {result['updated']} updated, "
+            f"{result['unchanged']} unchanged in {time.perf_counter() - started:.1f} s"
+        )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from database import SessionLocal
-from models import User
+from models import User, NotfallPlan, DutyDay, NotfallPlanHistory
 from routers.auth import get_password_hash
+from services.duty_service import rebuild_duty_days
+from services.plan_history import backfill_history
+from services.audit_archive import partition_audit_log, ensure_audit_partitions, apply_audit_retention
 
 def init_db():
     db = SessionLocal()
@@ -26,6 +30,34 @@ def init_db():
             print("Default admin created: admin / admin123")
         else:
             print("Admin user already exists.")
+
+        # Backfill the duty day ledger for deployments that predate it
+        if db.query(DutyDay.id).first() is None and db.query(NotfallPlan.id).first() is not None:
+            print("Building duty day ledger...")
+            count = rebuild_duty_days(db)
+            print(f"Duty day ledger built from {count} plans.")
+
+        # Initial history versions for plans that predate it
+        if db.query(NotfallPlanHistory.id).first() is None and db.query(NotfallPlan.id).first() is not None:
+            count = backfill_history(db)
+            print(f"Plan history initialized for {count} plans.")
+
+        # Monthly audit_log partitions (Postgres) and retention; one failing must not skip the other
+        try:
+            partition_audit_log()
+            ensure_audit_partitions()
+        except Exception as e:
+            print(f"Error preparing audit_log partitions: {e}")
+        try:
+            for month, count in apply_audit_retention(db).items():
+                print(f"Archived {count} audit entries from {month:%Y-%m}.")
+        except Exception as e:
+            db.rollback()
+            print(f"Error archiving audit log: {e}")
+
+        # Planner statistics for the SQLite range indexes (no-op when up to date)
+        if db.get_bind().dialect.name == "sqlite":
+            db.execute(text("PRAGMA optimize"))
     except Exception as e:
         print(f"Error initializing DB: {e}")
     finally:
@@ -1,15 +1,31 @@
+import time
+_import_started = time.perf_counter()
+
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base
 from routers import auth, plans, audit, users, export
-from init_db import init_db
+from services.metrics import Gauge, flush_snapshot
+from services.compression import CompressionMiddleware
+from services.concurrency import VersionConflict, version_conflict_handler
+from services.idempotency import IdempotentReplay, idempotent_replay_handler
+from services.request_metrics import RequestMetricsMiddleware
+from services.tracing import TracingMiddleware, setup_tracing
+
+# Tables are managed by Alembic migrations and default data by init_db.py;
+# entrypoint.sh runs both once before the server starts, so importing this
+# module has no database side effects.
+
+setup_tracing()
 
-# Create tables
-Base.metadata.create_all(bind=engine)
-# Initialize Data
-init_db()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Workers are stopped by a signal, which skips atexit handlers
+    flush_snapshot()
 
-app = FastAPI(title="Emergency Service Manager API")
+app = FastAPI(title="Emergency Service Manager API", root_path=os.getenv("ROOT_PATH", ""), lifespan=lifespan)
 
 # CORS
 origins = ["*"]
@@ -20,12 +36,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Idempotent-Replayed", "X-Trace-Id"],
 )
 
+app.add_exception_handler(VersionConflict, version_conflict_handler)
+app.add_exception_handler(IdempotentReplay, idempotent_replay_handler)
+
 # Trust Forwarded headers from Nginx (important for https redirects)
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 app.add_middleware(ProxyHeadersMiddleware, trusted_hosts=["*"])
 
+# gzip/brotli for JSON and CSV; inside the metrics so they record the bytes actually sent
+app.add_middleware(CompressionMiddleware)
+# Per-route latency, SQL count/time, Graph time and response size (see /metrics)
+app.add_middleware(RequestMetricsMiddleware)
+# Outermost: the server span covers everything below (trace id in X-Trace-Id)
+app.add_middleware(TracingMiddleware)
+
 @app.get("/")
 def read_root():
     return {"message": "Emergency Service Manager API is running"}
@@ -37,3 +64,11 @@ app.include_router(audit.router)
 app.include_router(export.router)
 from routers import stats
 app.include_router(stats.router)
+from routers import metrics
+app.include_router(metrics.router)
+from routers import cx
+app.include_router(cx.router)
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
+Gauge("app_import_seconds", "Time to import the application module", lambda: IMPORT_SECONDS)
+print(f"[STARTUP] Application imported in {IMPORT_SECONDS * 1000:.0f} ms")
@@ -0,0 +1,91 @@
+"""Baseline schema (users, notfallplan, calendar_events, audit_log)
+
+Databases created by the old Base.metadata.create_all() at startup already
+have these tables; only missing ones are created so they can be stamped
+onto the migration history without data loss.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    if not _has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("email", sa.String(), nullable=False),
+            sa.Column("password_hash", sa.String(), nullable=False),
+            sa.Column("first_name", sa.String(), nullable=False),
+            sa.Column("last_name", sa.String(), nullable=False),
+            sa.Column("phone_number", sa.String(), nullable=True),
+            sa.Column("role", sa.String(), nullable=True),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("can_take_duty", sa.Boolean(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("last_login", sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_username", "users", ["username"], unique=True)
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    if not _has_table("notfallplan"):
+        op.create_table(
+            "notfallplan",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("start_date", sa.DateTime(), nullable=False),
+            sa.Column("end_date", sa.DateTime(), nullable=False),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("confirmed", sa.Boolean(), nullable=True),
+            sa.Column("created_by", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+            sqlite_autoincrement=True,
+        )
+        op.create_index("ix_notfallplan_id", "notfallplan", ["id"])
+
+    if not _has_table("calendar_events"):
+        op.create_table(
+            "calendar_events",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("notfallplan_id", sa.Integer(), sa.ForeignKey("notfallplan.id"), nullable=False),
+            sa.Column("ms_event_id", sa.String(), nullable=False, unique=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index("ix_calendar_events_id", "calendar_events", ["id"])
+
+    if not _has_table("audit_log"):
+        op.create_table(
+            "audit_log",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), nullable=True),
+            sa.Column("username", sa.String(), nullable=True),
+            sa.Column("action", sa.String(), nullable=False),
+            sa.Column("target_table", sa.String(), nullable=False),
+            sa.Column("target_id", sa.Integer(), nullable=True),
+            sa.Column("old_value", sa.JSON(), nullable=True),
+            sa.Column("new_value", sa.JSON(), nullable=True),
+            sa.Column("timestamp", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_audit_log_id", "audit_log", ["id"])
+
+
+def downgrade():
+    op.drop_table("audit_log")
+    op.drop_table("calendar_events")
+    op.drop_table("notfallplan")
+    op.drop_table("users")
@@ -0,0 +1,86 @@
+"""Duty day ledger, plan history and audit log keyset indexes
+
+These were created by create_all() before migrations existed, so every
+step checks for existing objects first.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    is_postgres = op.get_bind().dialect.name == "postgresql"
+
+    if not _has_table("duty_days"):
+        op.create_table(
+            "duty_days",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("date", sa.Date(), nullable=False),
+            sa.Column("fraction", sa.Float(), nullable=False),
+            sa.Column("plan_id", sa.Integer(), sa.ForeignKey("notfallplan.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("confirmed", sa.Boolean(), nullable=True),
+            sa.UniqueConstraint("plan_id", "date", name="uq_duty_days_plan_date"),
+        )
+    op.create_index("ix_duty_days_id", "duty_days", ["id"], if_not_exists=True)
+    op.create_index("ix_duty_days_date_user", "duty_days", ["date", "user_id"], if_not_exists=True)
+    op.create_index("ix_duty_days_user_date", "duty_days", ["user_id", "date"], if_not_exists=True)
+
+    if not _has_table("notfallplan_history"):
+        op.create_table(
+            "notfallplan_history",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("plan_id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("start_date", sa.DateTime(), nullable=False),
+            sa.Column("end_date", sa.DateTime(), nullable=False),
+            sa.Column("confirmed", sa.Boolean(), nullable=True),
+            sa.Column("changed_by", sa.String(), nullable=True),
+            sa.Column("sys_from", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("sys_to", sa.DateTime(timezone=True), nullable=True),
+        )
+    op.create_index("ix_notfallplan_history_id", "notfallplan_history", ["id"], if_not_exists=True)
+    op.create_index("ix_notfallplan_history_plan_id", "notfallplan_history", ["plan_id"], if_not_exists=True)
+    if is_postgres:
+        op.create_index(
+            "ix_notfallplan_history_ranges", "notfallplan_history",
+            [sa.text("tsrange(start_date, end_date)"), sa.text("tstzrange(sys_from, sys_to)")],
+            postgresql_using="gist", if_not_exists=True,
+        )
+    else:
+        op.create_index(
+            "ix_notfallplan_history_valid", "notfallplan_history",
+            ["start_date", "end_date", "sys_from"], if_not_exists=True,
+        )
+
+    op.create_index("ix_audit_log_timestamp_id", "audit_log", ["timestamp", "id"], if_not_exists=True)
+    op.create_index("ix_audit_log_user_timestamp", "audit_log", ["user_id", "timestamp", "id"], if_not_exists=True)
+    op.create_index("ix_audit_log_action_timestamp", "audit_log", ["action", "timestamp", "id"], if_not_exists=True)
+    op.create_index(
+        "ix_audit_log_target_timestamp", "audit_log",
+        ["target_table", "target_id", "timestamp", "id"], if_not_exists=True,
+    )
+
+
+def downgrade():
+    for name in (
+        "ix_audit_log_target_timestamp",
+        "ix_audit_log_action_timestamp",
+        "ix_audit_log_user_timestamp",
+        "ix_audit_log_timestamp_id",
+    ):
+        op.drop_index(name, table_name="audit_log")
+    op.drop_table("notfallplan_history")
+    op.drop_table("duty_days")
@@ -0,0 +1,40 @@
+"""Indexes for plan range lookups, the scheduler and calendar events
+
+- ix_notfallplan_end_start: read_plans window and create_plan overlap check
+  (end_date > S AND start_date < E)
+- ix_notfallplan_confirmed_range: partial index for the scheduler's
+  "confirmed plan covering now" lookup
+- ix_notfallplan_user_start: per-user plan lists and FK joins
+- ix_calendar_events_notfallplan_id: event lookup on update/delete/confirm
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_notfallplan_end_start", "notfallplan", ["end_date", "start_date"], if_not_exists=True)
+    op.create_index(
+        "ix_notfallplan_confirmed_range", "notfallplan", ["start_date", "end_date"],
+        postgresql_where=sa.text("confirmed"), sqlite_where=sa.text("confirmed = 1"),
+        if_not_exists=True,
+    )
+    op.create_index("ix_notfallplan_user_start", "notfallplan", ["user_id", "start_date"], if_not_exists=True)
+    op.create_index(
+        "ix_calendar_events_notfallplan_id", "calendar_events", ["notfallplan_id"], if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_calendar_events_notfallplan_id", table_name="calendar_events")
+    op.drop_index("ix_notfallplan_user_start", table_name="notfallplan")
+    op.drop_index("ix_notfallplan_confirmed_range", table_name="notfallplan")
+    op.drop_index("ix_notfallplan_end_start", table_name="notfallplan")
@@ -0,0 +1,31 @@
+"""Row version columns for optimistic concurrency on users and notfallplan
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+TABLES = ("users", "notfallplan")
+
+
+def _has_column(table, column):
+    return any(col["name"] == column for col in sa.inspect(op.get_bind()).get_columns(table))
+
+
+def upgrade():
+    for table in TABLES:
+        if not _has_column(table, "version"):
+            op.add_column(table, sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column("version")
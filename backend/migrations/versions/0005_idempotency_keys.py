@@ -0,0 +1,32 @@
+"""Idempotency keys for plan and user mutations
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table("idempotency_keys"):
+        op.create_table(
+            "idempotency_keys",
+            sa.Column("key", sa.String(255), primary_key=True),
+            sa.Column("user_id", sa.Integer(), primary_key=True),
+            sa.Column("request_hash", sa.String(64), nullable=False),
+            sa.Column("status_code", sa.Integer(), nullable=True),
+            sa.Column("response_body", sa.Text(), nullable=True),
+            sa.Column("expires_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index("ix_idempotency_keys_expires_at", "idempotency_keys", ["expires_at"])
+
+
+def downgrade():
+    op.drop_index("ix_idempotency_keys_expires_at", table_name="idempotency_keys")
+    op.drop_table("idempotency_keys")
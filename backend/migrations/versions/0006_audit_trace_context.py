@@ -0,0 +1,31 @@
+"""Trace context (OpenTelemetry trace/span id) on audit rows
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    return any(col["name"] == column for col in sa.inspect(op.get_bind()).get_columns(table))
+
+
+def upgrade():
+    # On a partitioned audit_log the columns are added to every partition
+    if not _has_column("audit_log", "trace_id"):
+        op.add_column("audit_log", sa.Column("trace_id", sa.String(32), nullable=True))
+    if not _has_column("audit_log", "span_id"):
+        op.add_column("audit_log", sa.Column("span_id", sa.String(16), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("audit_log") as batch_op:
+        batch_op.drop_column("span_id")
+        batch_op.drop_column("trace_id")
@@ -0,0 +1,40 @@
+"""Indexes for the user directory (GET /users/ search and pagination)
+
+- ix_users_name: order and keyset pagination on (last_name, first_name, id)
+- ix_users_search_trgm (PostgreSQL): pg_trgm GIN index on the search text
+  of services/user_directory.py, so substring search on name, username and
+  email does not scan the table. Skipped when the server lacks the contrib
+  extensions; search then scans the users table.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+# Must stay identical to user_directory.SEARCH_TEXT, or the planner ignores the index
+SEARCH_TEXT = "lower(username || ' ' || first_name || ' ' || last_name || ' ' || email)"
+
+
+def upgrade():
+    op.create_index("ix_users_name", "users", ["last_name", "first_name", "id"], if_not_exists=True)
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+    if bind.execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).first() is None:
+        print("pg_trgm is not available, user search runs without a trigram index")
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(f"CREATE INDEX IF NOT EXISTS ix_users_search_trgm ON users USING gin (({SEARCH_TEXT}) gin_trgm_ops)")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_users_search_trgm")
+    op.drop_index("ix_users_name", table_name="users")
@@ -0,0 +1,73 @@
+"""Normalize users.phone_number to E.164 and index it
+
+Existing numbers are rewritten with the rules services/phone.py applied
+on write at this revision, copied here so later changes to that module
+do not change what this migration does. Numbers that cannot be read,
+such as bare extensions, are kept as they are and logged, so they can be
+corrected by hand; the scheduler does not forward calls to them.
+
+ix_users_phone_number serves the 3CX caller lookup (GET /3cx/lookup).
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+import logging
+import os
+import re
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+log = logging.getLogger("alembic.runtime.migration")
+
+COUNTRY_CODE = os.getenv("PHONE_DEFAULT_COUNTRY_CODE", "49")
+E164 = re.compile(r"^\+[1-9]\d{6,14}$")
+SEPARATORS = re.compile(r"[\s\-./()]")
+
+
+def normalize(raw):
+    text = raw.strip().replace("(0)", "")
+    digits = SEPARATORS.sub("", text)
+    if digits.startswith("+"):
+        number = digits
+    elif digits.startswith("00"):
+        number = "+" + digits[2:]
+    elif digits.startswith("0"):
+        number = f"+{COUNTRY_CODE}{digits[1:]}"
+    else:
+        return None
+    if number.startswith(f"+{COUNTRY_CODE}0"):
+        number = f"+{COUNTRY_CODE}{number[len(COUNTRY_CODE) + 2:]}"
+    return number if E164.match(number) else None
+
+
+def upgrade():
+    bind = op.get_bind()
+    rows = bind.execute(sa.text("SELECT id, username, phone_number FROM users WHERE phone_number IS NOT NULL")).all()
+    changes, unreadable = [], []
+    for user_id, username, number in rows:
+        if not number.strip():
+            changes.append({"id": user_id, "phone_number": None})
+            continue
+        normalized = normalize(number)
+        if normalized is None:
+            unreadable.append(f"{username} ({number})")
+        elif normalized != number:
+            changes.append({"id": user_id, "phone_number": normalized})
+    if changes:
+        bind.execute(sa.text("UPDATE users SET phone_number = :phone_number WHERE id = :id"), changes)
+    log.info("Normalized %d phone numbers", len(changes))
+    if unreadable:
+        log.warning("Phone numbers left unchanged, please correct: %s", ", ".join(unreadable))
+
+    op.create_index("ix_users_phone_number", "users", ["phone_number"], if_not_exists=True)
+
+
+def downgrade():
+    # The original spelling of the numbers is not kept
+    op.drop_index("ix_users_phone_number", table_name="users")
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Date, Float, Boolean, ForeignKey, JSON, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from database import Base
 
 class User(Base):
@@ -12,12 +12,20 @@ class User(Base):
     password_hash = Column(String, nullable=False)
     first_name = Column(String, nullable=False)
     last_name = Column(String, nullable=False)
-    phone_number = Column(String, nullable=True)  # For call routing
+    phone_number = Column(String, nullable=True, index=True)  # E.164 (services/phone.py); call routing and 3CX caller lookup
     role = Column(String, default="planner")  # admin, planner, buchhaltung
     is_active = Column(Boolean, default=True)
     can_take_duty = Column(Boolean, default=True)  # Eligible for emergency service
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     last_login = Column(DateTime(timezone=True), nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Optimistic concurrency, see services/concurrency.py
+
+    __mapper_args__ = {"version_id_col": version, "version_id_generator": False}
+
+    __table_args__ = (
+        # Directory order and keyset pagination (GET /users/); search uses a trigram index, see migration 0007
+        Index("ix_users_name", "last_name", "first_name", "id"),
+    )
 
     # Relationship to plans (user can be assigned to emergency duty)
     plans = relationship("NotfallPlan", back_populates="user")
@@ -34,21 +42,89 @@ class NotfallPlan(Base):
     created_by = Column(String, nullable=True)  # Username or ID
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Optimistic concurrency, see services/concurrency.py
+
+    __mapper_args__ = {"version_id_col": version, "version_id_generator": False}
+
+    __table_args__ = (
+        # Range lookups (read_plans, overlap check): end_date bound first, it is the selective side for current windows
+        Index("ix_notfallplan_end_start", "end_date", "start_date"),
+        # Scheduler / stats: confirmed plans only
+        Index(
+            "ix_notfallplan_confirmed_range", "start_date", "end_date",
+            postgresql_where=text("confirmed"), sqlite_where=text("confirmed = 1"),
+        ),
+        Index("ix_notfallplan_user_start", "user_id", "start_date"),
+        # Plan ids are referenced by notfallplan_history, so SQLite must not reuse them
+        {"sqlite_autoincrement": True},
+    )
 
     user = relationship("User", back_populates="plans")  # Changed from person
     calendar_events = relationship("CalendarEvent", back_populates="plan", cascade="all, delete-orphan")
+    duty_days = relationship("DutyDay", back_populates="plan", cascade="all, delete-orphan")
 
 class CalendarEvent(Base):
     __tablename__ = "calendar_events"
 
     id = Column(Integer, primary_key=True, index=True)
-    notfallplan_id = Column(Integer, ForeignKey("notfallplan.id"), nullable=False)
+    notfallplan_id = Column(Integer, ForeignKey("notfallplan.id"), nullable=False, index=True)
     ms_event_id = Column(String, nullable=False, unique=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     plan = relationship("NotfallPlan", back_populates="calendar_events")
 
+class DutyDay(Base):
+    """Per-user, per-day duty ledger derived from notfallplan (for billing)"""
+    __tablename__ = "duty_days"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    date = Column(Date, nullable=False)
+    fraction = Column(Float, nullable=False)  # Share of the day covered by the plan (0-1]
+    plan_id = Column(Integer, ForeignKey("notfallplan.id", ondelete="CASCADE"), nullable=False)
+    confirmed = Column(Boolean, default=False)
+
+    plan = relationship("NotfallPlan", back_populates="duty_days")
+
+    __table_args__ = (
+        UniqueConstraint("plan_id", "date", name="uq_duty_days_plan_date"),
+        Index("ix_duty_days_date_user", "date", "user_id"),
+        Index("ix_duty_days_user_date", "user_id", "date"),
+    )
+
+class NotfallPlanHistory(Base):
+    """
+    System-versioned copy of notfallplan.
+
+    Every create/update/confirm closes the open version of a plan (sys_to)
+    and adds a new one; delete only closes it. A row therefore says: from
+    sys_from until sys_to the system believed this plan covered
+    [start_date, end_date).
+    """
+    __tablename__ = "notfallplan_history"
+
+    id = Column(Integer, primary_key=True, index=True)
+    plan_id = Column(Integer, nullable=False, index=True)  # No FK: history outlives deleted plans
+    user_id = Column(Integer, nullable=False)
+    start_date = Column(DateTime, nullable=False)
+    end_date = Column(DateTime, nullable=False)
+    confirmed = Column(Boolean, default=False)
+    changed_by = Column(String, nullable=True)
+    sys_from = Column(DateTime(timezone=True), nullable=False)
+    sys_to = Column(DateTime(timezone=True), nullable=True)  # NULL = current version
+
+    __table_args__ = (
+        # One GiST lookup for "valid at T and known at K" on Postgres
+        Index(
+            "ix_notfallplan_history_ranges",
+            func.tsrange(start_date, end_date),
+            func.tstzrange(sys_from, sys_to),
+            postgresql_using="gist",
+        ).ddl_if(dialect="postgresql"),
+        Index("ix_notfallplan_history_valid", "start_date", "end_date", "sys_from").ddl_if(dialect="sqlite"),
+    )
+
 class AuditLog(Base):
     __tablename__ = "audit_log"
 
@@ -61,3 +137,24 @@ class AuditLog(Base):
     old_value = Column(JSON, nullable=True)
     new_value = Column(JSON, nullable=True)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    trace_id = Column(String(32), nullable=True)  # OpenTelemetry trace of the request that wrote the row
+    span_id = Column(String(16), nullable=True)
+
+    # Keyset pagination runs on (timestamp, id); the filter indexes end in the same columns
+    __table_args__ = (
+        Index("ix_audit_log_timestamp_id", "timestamp", "id"),
+        Index("ix_audit_log_user_timestamp", "user_id", "timestamp", "id"),
+        Index("ix_audit_log_action_timestamp", "action", "timestamp", "id"),
+        Index("ix_audit_log_target_timestamp", "target_table", "target_id", "timestamp", "id"),
+    )
+
+class IdempotencyKey(Base):
+    """Outcome of a mutation sent with an Idempotency-Key header, replayed on retries until expires_at"""
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(255), primary_key=True)
+    user_id = Column(Integer, primary_key=True)  # Keys are scoped to the client that sent them
+    request_hash = Column(String(64), nullable=False)  # sha256 of method, path and body
+    status_code = Column(Integer, nullable=True)  # NULL while the first request is still running
+    response_body = Column(Text, nullable=True)  # Compact JSON
+    expires_at = Column(DateTime, nullable=False, index=True)
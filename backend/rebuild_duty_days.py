@@ -0,0 +1,17 @@
+from database import SessionLocal
+from services.duty_service import rebuild_duty_days
+
+def main():
+    db = SessionLocal()
+    try:
+        print("--- REBUILD DUTY DAY LEDGER ---")
+        count = rebuild_duty_days(db)
+        print(f"SUCCESS: Ledger rebuilt from {count} plans.")
+    except Exception as e:
+        db.rollback()
+        print(f"Error rebuilding ledger: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,18 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from typing import List
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.orm import Session, defer
+from sqlalchemy import tuple_, type_coerce, String
+from typing import Any, List, Optional
+from database import get_read_db
 from models import AuditLog
 from pydantic import BaseModel
 from datetime import datetime
 from routers.auth import get_current_user
+import base64
 
 router = APIRouter(prefix="/audit", tags=["audit"])
 
+MAX_PAGE_SIZE = 500
+
 class AuditLogSchema(BaseModel):
     id: int
     user_id: int | None
@@ -17,14 +21,89 @@ class AuditLogSchema(BaseModel):
     target_table: str
     target_id: int | None
     timestamp: datetime
-    # old_value: dict | None
-    # new_value: dict | None # simplifying output for now
+    old_value: Any = None  # Only filled with include_values=true
+    new_value: Any = None
+    trace_id: str | None = None
 
     class Config:
         from_attributes = True
 
+def encode_cursor(log: AuditLog) -> str:
+    """Opaque cursor pointing just past the given row in (timestamp, id) order"""
+    raw = f"{log.timestamp.isoformat()}|{log.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def cursor_filter(db: Session, cursor: str):
+    """(timestamp, id) < cursor, as a row-value comparison the composite index can seek on"""
+    timestamp, log_id = decode_cursor(cursor)
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite keeps server_default timestamps as text without microseconds;
+        # compare against the same text form so ties on the second resolve by id
+        text = timestamp.strftime("%Y-%m-%d %H:%M:%S")
+        if timestamp.microsecond:
+            text += f".{timestamp.microsecond:06d}"
+        return tuple_(type_coerce(AuditLog.timestamp, String), AuditLog.id) < (text, log_id)
+    return tuple_(AuditLog.timestamp, AuditLog.id) < (timestamp, log_id)
+
 @router.get("/", response_model=List[AuditLogSchema])
-def read_audit_logs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)): #, current_user = Depends(get_current_user)):
-    # Temporarily removed auth depend for easier testing if needed, but for prod uncomment
-    logs = db.query(AuditLog).order_by(AuditLog.timestamp.desc()).offset(skip).limit(limit).all()
-    return logs
+def read_audit_logs(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    user_id: Optional[int] = None,
+    action: Optional[str] = None,
+    target_table: Optional[str] = None,
+    target_id: Optional[int] = None,
+    include_values: bool = False,
+    db: Session = Depends(get_read_db),
+    current_user = Depends(get_current_user)
+):
+    """
+    Newest audit entries first, keyset-paginated on (timestamp, id).
+
+    Pass the X-Next-Cursor header of a page as ?cursor= to fetch the next one.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    query = db.query(AuditLog)
+    if user_id is not None:
+        query = query.filter(AuditLog.user_id == user_id)
+    if action:
+        query = query.filter(AuditLog.action == action)
+    if target_table:
+        query = query.filter(AuditLog.target_table == target_table)
+    if target_id is not None:
+        query = query.filter(AuditLog.target_id == target_id)
+    if cursor:
+        query = query.filter(cursor_filter(db, cursor))
+    if not include_values:
+        query = query.options(defer(AuditLog.old_value), defer(AuditLog.new_value))
+
+    # Fetch one extra row to know whether another page exists
+    logs = query.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).limit(limit + 1).all()
+    if len(logs) > limit:
+        logs = logs[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(logs[-1])
+
+    if include_values:
+        return logs
+    return [
+        AuditLogSchema(
+            id=log.id,
+            user_id=log.user_id,
+            username=log.username,
+            action=log.action,
+            target_table=log.target_table,
+            target_id=log.target_id,
+            timestamp=log.timestamp,
+            trace_id=log.trace_id,
+        )
+        for log in logs
+    ]
@@ -0,0 +1,33 @@
+import hmac
+import os
+from fastapi import APIRouter, Depends, Header, HTTPException
+from sqlalchemy.orm import Session
+from typing import Optional
+from database import get_read_db
+from services import user_directory
+from services.metrics import Counter
+
+router = APIRouter(prefix="/3cx", tags=["3cx"])
+
+# Shared secret 3CX sends as X-Api-Key (CRM integration template); lookup is disabled without it
+CX_LOOKUP_API_KEY = os.getenv("CX_LOOKUP_API_KEY")
+
+CALLER_LOOKUPS = Counter("caller_lookups_total", "3CX caller lookups by result", labels=("result",))
+
+def require_api_key(x_api_key: Optional[str] = Header(None)):
+    if not CX_LOOKUP_API_KEY:
+        raise HTTPException(status_code=503, detail="Caller lookup is not configured (CX_LOOKUP_API_KEY)")
+    if not x_api_key or not hmac.compare_digest(x_api_key.encode(), CX_LOOKUP_API_KEY.encode()):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+
+@router.get("/lookup", dependencies=[Depends(require_api_key)])
+def lookup_caller(number: str, db: Session = Depends(get_read_db)):
+    """
+    Contacts for an incoming caller id, for the 3CX CRM integration.
+
+    `number` may be in any spelling 3CX delivers (+49..., 0049..., 0171...).
+    Answers {"contacts": [...]}, empty when no active user has the number.
+    """
+    contacts = user_directory.lookup_caller(db, number)
+    CALLER_LOOKUPS.inc(result="match" if contacts else "none")
+    return {"contacts": contacts}
@@ -1,13 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from typing import List
-from database import get_db
+from database import get_read_db
 from models import User, NotfallPlan, AuditLog
 from routers.auth import get_current_user
+from services.duty_service import ledger_duty_days, month_bounds
+from services.audit_archive import list_archives, read_archive
 import csv
 import io
 from datetime import datetime
+from types import SimpleNamespace
 
 router = APIRouter(prefix="/export", tags=["export"])
 
@@ -24,48 +27,27 @@ def require_export_access(current_user: User = Depends(get_current_user)):
 async def export_plans(
     month: int = None,
     year: int = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(require_export_access)
 ):
     """Export plans as CSV, optionally filtered by month/year"""
-    query = db.query(NotfallPlan)
+    query = db.query(NotfallPlan).options(joinedload(NotfallPlan.user))
     
-    start_of_period = None
-    end_of_period = None
+    # Days per user if filtered
+    user_totals = []
 
     if month and year:
-        # Create date range for the selected month
-        import calendar
-        _, last_day = calendar.monthrange(year, month)
-        start_of_period = datetime(year, month, 1)
-        end_of_period = datetime(year, month, last_day, 23, 59, 59)
+        # Half-open date range for the selected month
+        start_of_period, end_of_period = month_bounds(year, month)
         
         # Filter plans that overlap with the selected month
         query = query.filter(
-            NotfallPlan.start_date <= end_of_period,
-            NotfallPlan.end_date >= start_of_period
+            NotfallPlan.start_date < end_of_period,
+            NotfallPlan.end_date > start_of_period
         )
+        user_totals = ledger_duty_days(db, start_of_period.date(), end_of_period.date())
         
     plans = query.all()
-    
-    # Calculate days per user if filtered
-    user_totals = {}
-    if start_of_period and end_of_period:
-        for plan in plans:
-            if not plan.user_id:
-                continue
-            
-            p_start = max(plan.start_date, start_of_period)
-            p_end = min(plan.end_date, end_of_period)
-            
-            if p_start < p_end:
-                days = (p_end - p_start).total_seconds() / (24 * 3600)
-                if plan.user_id not in user_totals:
-                    user_totals[plan.user_id] = {
-                        "name": f"{plan.user.first_name} {plan.user.last_name}",
-                        "days": 0
-                    }
-                user_totals[plan.user_id]["days"] += days
 
     output = io.StringIO()
     # Add BOM for Excel compatibility
@@ -105,8 +87,8 @@ async def export_plans(
         writer.writerow([])
         writer.writerow(["Mitarbeiter Auswertung"])
         writer.writerow(["Name", "Gesamt Tage"])
-        for user_id, data in user_totals.items():
-            writer.writerow([data["name"], f"{data['days']:.2f}"])
+        for data in user_totals:
+            writer.writerow([f"{data['first_name']} {data['last_name']}", f"{data['total_days']:.2f}"])
     
     output.seek(0)
     filename_part = f"_{year}_{month}" if month and year else ""
@@ -122,7 +104,7 @@ async def export_plans(
 async def export_plans_pdf(
     month: int = None,
     year: int = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(require_export_access)
 ):
     """Export plans as PDF, optionally filtered"""
@@ -131,39 +113,20 @@ async def export_plans_pdf(
     from reportlab.lib import colors
     from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
     
-    query = db.query(NotfallPlan)
+    query = db.query(NotfallPlan).options(joinedload(NotfallPlan.user))
     
-    start_of_period = None
-    end_of_period = None
+    # Days per user if filtered
+    user_totals = []
 
     if month and year:
-        import calendar
-        _, last_day = calendar.monthrange(year, month)
-        start_of_period = datetime(year, month, 1)
-        end_of_period = datetime(year, month, last_day, 23, 59, 59)
+        start_of_period, end_of_period = month_bounds(year, month)
         query = query.filter(
-            NotfallPlan.start_date <= end_of_period,
-            NotfallPlan.end_date >= start_of_period
+            NotfallPlan.start_date < end_of_period,
+            NotfallPlan.end_date > start_of_period
         )
+        user_totals = ledger_duty_days(db, start_of_period.date(), end_of_period.date())
 
     plans = query.order_by(NotfallPlan.start_date.desc()).all()
-    
-    # Calculate days per user if filtered
-    user_totals = {}
-    if start_of_period and end_of_period:
-        for plan in plans:
-            if not plan.user_id:
-                continue
-            p_start = max(plan.start_date, start_of_period)
-            p_end = min(plan.end_date, end_of_period)
-            if p_start < p_end:
-                days = (p_end - p_start).total_seconds() / (24 * 3600)
-                if plan.user_id not in user_totals:
-                    user_totals[plan.user_id] = {
-                        "name": f"{plan.user.first_name} {plan.user.last_name}",
-                        "days": 0
-                    }
-                user_totals[plan.user_id]["days"] += days
 
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), topMargin=30, bottomMargin=30)
@@ -227,8 +190,8 @@ async def export_plans_pdf(
         summary_header = ["Mitarbeiter", "Gesamt Tage"]
         summary_data = [summary_header]
         
-        for user_id, data in user_totals.items():
-            summary_data.append([data["name"], f"{data['days']:.2f}"])
+        for data in user_totals:
+            summary_data.append([f"{data['first_name']} {data['last_name']}", f"{data['total_days']:.2f}"])
             
         summary_table = Table(summary_data, colWidths=[200, 100], hAlign='LEFT')
         summary_table.setStyle(TableStyle([
@@ -256,11 +219,28 @@ async def export_plans_pdf(
 
 @router.get("/audit")
 async def export_audit_log(
-    db: Session = Depends(get_db),
+    month: int = None,
+    year: int = None,
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(require_export_access)
 ):
-    """Export audit log as CSV"""
-    logs = db.query(AuditLog).order_by(AuditLog.timestamp.desc()).all()
+    """Export audit log as CSV, optionally for one month (archived and live rows of the month)"""
+    if month and year:
+        start_of_period, end_of_period = month_bounds(year, month)
+        logs = db.query(AuditLog).filter(
+            AuditLog.timestamp >= start_of_period,
+            AuditLog.timestamp < end_of_period
+        ).order_by(AuditLog.timestamp.desc()).all()
+        if start_of_period.date() in list_archives():
+            # Rows may still be live next to the archive (written after archiving, or an interrupted run)
+            live = {(log.id, log.timestamp) for log in logs}
+            archived = [
+                SimpleNamespace(**entry) for entry in read_archive(start_of_period.date())
+                if (entry["id"], entry["timestamp"]) not in live
+            ]
+            logs = sorted(logs + archived, key=lambda log: (log.timestamp, log.id), reverse=True)
+    else:
+        logs = db.query(AuditLog).order_by(AuditLog.timestamp.desc()).all()
     
     output = io.StringIO()
     writer = csv.writer(output, delimiter=';')
@@ -282,10 +262,16 @@ async def export_audit_log(
         ])
     
     output.seek(0)
-    filename = f"audit_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    filename_part = f"_{year}_{month}" if month and year else ""
+    filename = f"audit_export{filename_part}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
     
     return StreamingResponse(
         iter([output.getvalue()]),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
+
+@router.get("/audit/archives")
+async def list_audit_archives(current_user: User = Depends(require_export_access)):
+    """Months whose audit entries were moved to the archive"""
+    return [{"year": month.year, "month": month.month} for month in list_archives()]
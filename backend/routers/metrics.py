@@ -0,0 +1,26 @@
+import hmac
+import os
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+from database import get_db
+from models import User
+from routers.auth import get_current_user, oauth2_scheme
+from services.metrics import render_all
+
+router = APIRouter(tags=["metrics"])
+
+# Bearer token for Prometheus (bearer_token in the scrape config); admins can read the metrics with their login
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+async def require_metrics_access(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    if METRICS_TOKEN and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        return
+    current_user: User = await get_current_user(token, db)
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False, dependencies=[Depends(require_metrics_access)])
+def read_metrics():
+    """Prometheus text format metrics, summed over all workers when METRICS_DIR is set (scrape token or admin)"""
+    return render_all()
@@ -1,16 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from typing import List
-from database import get_db
-from models import NotfallPlan, AuditLog, CalendarEvent, User
-from schemas import Plan as PlanSchema, PlanCreate, PlanUpdate
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, func, insert, tuple_
+from typing import List, Optional
+from database import get_db, get_read_db, lock_for_write
+from models import NotfallPlan, CalendarEvent, User
+from schemas import Plan as PlanSchema, PlanCreate, PlanUpdate, PlanBulkConfirm, PlanVersion, UserSimple, AutoPlanRequest, AutoPlanResult
 from routers.auth import get_current_user
 from services.graph_service import create_event, delete_event
-import json
+from services.duty_service import sync_plan_days, insert_plan_days
+from services import audit_service
+from services.audit_service import PLAN_FIELDS
+from services import plan_history
+from services import concurrency
+from services import idempotency
+from services import plan_events
+from services import phone
+from services import auto_plan as auto_plan_service
+from services.idempotency import IdempotencyContext, get_idempotency
+from services.responses import compact_json_response
+from datetime import datetime, timezone
 
 router = APIRouter(prefix="/plans", tags=["plans"])
 
+# Advisory lock key serializing the overlap check with the insert
+PLAN_SCHEDULE_LOCK = 7301
+STREAM_HEARTBEAT_SECONDS = 15
+
 def require_planner_or_admin(current_user: User = Depends(get_current_user)):
     """Only admin and planner can modify plans"""
     if current_user.role not in ["admin", "planner"]:
@@ -24,22 +41,149 @@ def require_planner_or_admin(current_user: User = Depends(get_current_user)):
 def read_plans(
     start: str = None, 
     end: str = None, 
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)  # All roles can view
 ):
     """Get plans (all authenticated users can view)"""
-    query = db.query(NotfallPlan)
+    query = db.query(NotfallPlan).options(joinedload(NotfallPlan.user))
     if start:
         query = query.filter(NotfallPlan.end_date >= start)
     if end:
         query = query.filter(NotfallPlan.start_date <= end)
     return query.all()
 
+def _local_naive(value: datetime) -> datetime:
+    """Plan times are stored as naive local times; convert offset-aware query bounds to that"""
+    return value.astimezone().replace(tzinfo=None) if value.tzinfo is not None else value
+
+@router.get("/feed")
+def read_plan_feed(
+    request: Request,
+    start: datetime = None,
+    end: datetime = None,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Compact plan list for the calendar's visible window.
+
+    {"users": [[id, username, first_name, last_name], ...],
+     "plans": [[id, user_id, start_date, end_date, confirmed, version], ...]}
+
+    Each user is listed once, however many plans they have. Served with an
+    ETag (304 on If-None-Match) and compressed.
+    """
+    query = db.query(
+        NotfallPlan.id, NotfallPlan.user_id, NotfallPlan.start_date, NotfallPlan.end_date,
+        NotfallPlan.confirmed, NotfallPlan.version,
+    )
+    if start:
+        query = query.filter(NotfallPlan.end_date >= _local_naive(start))
+    if end:
+        query = query.filter(NotfallPlan.start_date <= _local_naive(end))
+    plans = query.order_by(NotfallPlan.start_date).all()
+
+    user_ids = {plan.user_id for plan in plans}
+    users = db.query(User.id, User.username, User.first_name, User.last_name).filter(User.id.in_(user_ids)).all() if user_ids else []
+
+    return compact_json_response(request, {
+        "users": [tuple(user) for user in users],
+        "plans": [(plan.id, plan.user_id, plan.start_date, plan.end_date, bool(plan.confirmed), plan.version) for plan in plans],
+    })
+
+@router.get("/stream")
+async def stream_plan_events(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Server-Sent Events with every committed plan change (see services/plan_events.py).
+
+    The stream opens with a `ready` event; clients reload the feed then, so
+    nothing between two connections is lost. Comment lines keep proxies
+    from closing idle streams.
+    """
+    db.close()  # Authenticated; do not hold a pooled connection for the life of the stream
+
+    async def events():
+        with plan_events.subscribe() as subscriber:
+            yield "retry: 5000\nevent: ready\ndata: {}\n\n"
+            while not subscriber.overflowed or not subscriber.queue.empty():
+                try:
+                    payload = await asyncio.wait_for(subscriber.queue.get(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: plan\ndata: {payload.decode()}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/on-duty", response_model=List[PlanVersion])
+def read_on_duty(
+    at: datetime,
+    as_of: datetime = None,
+    include_unconfirmed: bool = False,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Who was on duty at time `at`, according to what the system knew at `as_of` (default: now).
+
+    Answers billing disputes after plans were edited or deleted.
+    """
+    if as_of is not None:
+        # Naive knowledge times are taken as server local time
+        as_of = as_of.astimezone(timezone.utc)
+    at = _local_naive(at)
+
+    versions = plan_history.versions_at(db, at, as_of, confirmed_only=not include_unconfirmed)
+    return _with_users(db, versions)
+
+@router.get("/{plan_id}/history", response_model=List[PlanVersion])
+def read_plan_history(
+    plan_id: int,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """All recorded versions of a plan, including deleted ones"""
+    return _with_users(db, plan_history.plan_versions(db, plan_id))
+
+def _with_users(db: Session, versions):
+    user_ids = {version.user_id for version in versions}
+    users = {user.id: user for user in db.query(User).filter(User.id.in_(user_ids))} if user_ids else {}
+    return [
+        PlanVersion(
+            plan_id=version.plan_id,
+            user_id=version.user_id,
+            start_date=version.start_date,
+            end_date=version.end_date,
+            confirmed=bool(version.confirmed),
+            changed_by=version.changed_by,
+            sys_from=version.sys_from,
+            sys_to=version.sys_to,
+            user=UserSimple.model_validate(users[version.user_id]) if version.user_id in users else None,
+        )
+        for version in versions
+    ]
+
+def check_routable_phone(user: User):
+    """The scheduler forwards the hotline to the user's number, so it must be valid E.164 (or absent: central number)"""
+    if user.phone_number and not phone.is_e164(user.phone_number):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Phone number of {user.username} ('{user.phone_number}') is not valid for call forwarding, please correct it first"
+        )
+
 @router.post("/", response_model=PlanSchema)
 def create_plan(
     plan: PlanCreate, 
     db: Session = Depends(get_db), 
-    current_user: User = Depends(require_planner_or_admin)
+    current_user: User = Depends(require_planner_or_admin),
+    idem: Optional[IdempotencyContext] = Depends(get_idempotency)
 ):
     """Create plan (admin: anyone, planner: self only)"""
     
@@ -69,7 +213,8 @@ def create_plan(
         if total_seconds < 604799: # Allow 1 sec tolerance
              raise HTTPException(status_code=400, detail="Planners must book full weeks (Mon-Sun)")
     
-    # Validation: Overlap check
+    # Validation: Overlap check (under the lock, so concurrent requests cannot both pass it)
+    lock_for_write(db, PLAN_SCHEDULE_LOCK)
     overlap = db.query(NotfallPlan).filter(
         and_(
             NotfallPlan.start_date < plan.end_date,
@@ -88,19 +233,21 @@ def create_plan(
     # Allow if can_take_duty is True OR if role is planner (consistent with get_duty_eligible_users)
     if not assigned_user.can_take_duty and assigned_user.role != "planner":
         raise HTTPException(status_code=400, detail="User cannot take emergency duty")
+    check_routable_phone(assigned_user)
 
     db_plan = NotfallPlan(**plan.dict(), created_by=current_user.username)
     db.add(db_plan)
+    sync_plan_days(db_plan)
+    db.flush()  # Assigns the plan id for the audit entry and history
+    plan_history.record_version(db, db_plan, current_user.username)
+    plan_events.publish(db, "created", db_plan)
     
     # Audit Log
-    log = AuditLog(
-        user_id=current_user.id,
-        username=current_user.username,
-        action="CREATE",
-        target_table="notfallplan",
-        new_value=str(plan.dict())
+    audit_service.record(
+        db, current_user, "CREATE", "notfallplan", db_plan.id,
+        new_value=audit_service.snapshot(db_plan, PLAN_FIELDS)
     )
-    db.add(log)
+    idempotency.save(db, idem, PlanSchema.model_validate(db_plan))
     
     db.commit()
     db.refresh(db_plan)
@@ -110,10 +257,12 @@ def create_plan(
 def update_plan(
     plan_id: int, 
     plan_update: PlanUpdate, 
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db), 
     current_user: User = Depends(require_planner_or_admin)
 ):
-    """Update plan (admin: all, planner: own only)"""
+    """Update plan (admin: all, planner: own only); If-Match or `version` guards against concurrent edits"""
     db_plan = db.query(NotfallPlan).filter(NotfallPlan.id == plan_id).first()
     if not db_plan:
         raise HTTPException(status_code=404, detail="Plan not found")
@@ -125,45 +274,53 @@ def update_plan(
         # Planner cannot reassign plan to someone else
         if plan_update.user_id and plan_update.user_id != current_user.id:
              raise HTTPException(status_code=403, detail="Planners cannot reassign plans")
+
+    concurrency.check_version(db_plan, concurrency.expected_version(if_match, plan_update.version), PlanSchema)
+    if plan_update.user_id and plan_update.user_id != db_plan.user_id:
+        new_user = db.query(User).filter(User.id == plan_update.user_id).first()
+        if not new_user:
+            raise HTTPException(status_code=404, detail="User not found")
+        check_routable_phone(new_user)
+    old_values = audit_service.snapshot(db_plan, PLAN_FIELDS)
+    was_confirmed = db_plan.confirmed
     
-    # Check if confirmed -> Delete old event
-    if db_plan.confirmed:
+    # Update fields
+    for key, value in plan_update.dict(exclude_unset=True, exclude={"version"}).items():
+        setattr(db_plan, key, value)
+    sync_plan_days(db_plan)
+    concurrency.bump(db_plan)
+    # Compare-and-set before touching the calendar, so a lost race leaves no Graph changes behind
+    concurrency.flush_or_conflict(db, NotfallPlan, [plan_id], PlanSchema, "Plan not found")
+
+    # Was confirmed -> Delete old event
+    if was_confirmed:
         cal_event = db.query(CalendarEvent).filter(CalendarEvent.notfallplan_id == db_plan.id).first()
         if cal_event:
             delete_event(cal_event.ms_event_id)
             db.delete(cal_event)
     
-    # Update fields
-    for key, value in plan_update.dict(exclude_unset=True).items():
-        setattr(db_plan, key, value)
-    
     # If it is still confirmed, create new event
     if db_plan.confirmed:
-        assigned_user = db.query(User).filter(User.id == db_plan.user_id).first()
-        if assigned_user:
-            subject = f"{assigned_user.first_name} {assigned_user.last_name}: IT-Notfallservice"
-            attendee_email = assigned_user.email
-            new_id = create_event(subject, db_plan.start_date, db_plan.end_date, attendee_email)
-            if new_id:
-                new_cal_event = CalendarEvent(notfallplan_id=db_plan.id, ms_event_id=new_id)
-                db.add(new_cal_event)
-
-    db.add(AuditLog(
-        user_id=current_user.id,
-        username=current_user.username,
-        action="UPDATE",
-        target_table="notfallplan",
-        target_id=db_plan.id,
-        new_value=str(plan_update.dict())
-    ))
+        db.expire(db_plan, ["user"])  # user_id may have changed
+        _create_calendar_event(db, db_plan)
+
+    plan_history.record_version(db, db_plan, current_user.username)
+    plan_events.publish(db, "updated", db_plan)
+    old_changed, new_changed = audit_service.diff(old_values, audit_service.snapshot(db_plan, PLAN_FIELDS))
+    audit_service.record(
+        db, current_user, "UPDATE", "notfallplan", db_plan.id,
+        old_value=old_changed, new_value=new_changed
+    )
 
     db.commit()
     db.refresh(db_plan)
+    concurrency.set_etag(response, db_plan)
     return db_plan
 
 @router.delete("/{plan_id}")
 def delete_plan(
     plan_id: int,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_planner_or_admin)
 ):
@@ -178,23 +335,26 @@ def delete_plan(
              raise HTTPException(status_code=403, detail="Planners can only delete their own plans")
         if db_plan.confirmed:
              raise HTTPException(status_code=403, detail="Cannot delete confirmed plans")
+
+    concurrency.check_version(db_plan, concurrency.expected_version(if_match), PlanSchema)
     
-    # Delete associated calendar event
+    # Audit log
+    audit_service.record(
+        db, current_user, "DELETE", "notfallplan", db_plan.id,
+        old_value=audit_service.snapshot(db_plan, PLAN_FIELDS)
+    )
+    
+    plan_history.record_deletion(db, db_plan.id)
+    plan_events.publish(db, "deleted", db_plan)
     cal_event = db.query(CalendarEvent).filter(CalendarEvent.notfallplan_id == db_plan.id).first()
     if cal_event:
-        delete_event(cal_event.ms_event_id)
         db.delete(cal_event)
-    
-    # Audit log
-    db.add(AuditLog(
-        user_id=current_user.id,
-        username=current_user.username,
-        action="DELETE",
-        target_table="notfallplan",
-        target_id=db_plan.id
-    ))
-    
     db.delete(db_plan)
+    concurrency.flush_or_conflict(db, NotfallPlan, [plan_id], PlanSchema, "Plan not found")
+
+    # Delete associated calendar event once the row is gone
+    if cal_event:
+        delete_event(cal_event.ms_event_id)
     db.commit()
     return {"status": "deleted"}
 
@@ -202,7 +362,8 @@ def delete_plan(
 def confirm_plan(
     plan_id: int, 
     db: Session = Depends(get_db), 
-    current_user: User = Depends(require_planner_or_admin)
+    current_user: User = Depends(require_planner_or_admin),
+    idem: Optional[IdempotencyContext] = Depends(get_idempotency)
 ):
     """Confirm plan (admin: all, planner: own only)"""
     db_plan = db.query(NotfallPlan).filter(NotfallPlan.id == plan_id).first()
@@ -216,10 +377,120 @@ def confirm_plan(
     if db_plan.confirmed:
         return {"status": "already_confirmed"}
 
+    _mark_confirmed(db_plan)
+    concurrency.flush_or_conflict(db, NotfallPlan, [plan_id], PlanSchema, "Plan not found")
+    _create_calendar_event(db, db_plan)
+    plan_history.record_version(db, db_plan, current_user.username)
+    plan_events.publish(db, "confirmed", db_plan)
+
+    audit_service.record(
+        db, current_user, "CONFIRM", "notfallplan", db_plan.id,
+        old_value={"confirmed": False}, new_value={"confirmed": True}
+    )
+    idempotency.save(db, idem, {"status": "confirmed"})
+
+    db.commit()
+    return {"status": "confirmed"}
+
+@router.post("/confirm")
+def confirm_plans(
+    data: PlanBulkConfirm,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_planner_or_admin),
+    idem: Optional[IdempotencyContext] = Depends(get_idempotency)
+):
+    """Confirm several plans at once (admin only)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can confirm plans")
+
+    plans = db.query(NotfallPlan).options(joinedload(NotfallPlan.user)).filter(
+        NotfallPlan.id.in_(data.plan_ids),
+        NotfallPlan.confirmed == False
+    ).all()
+
+    for db_plan in plans:
+        _mark_confirmed(db_plan)
+    concurrency.flush_or_conflict(db, NotfallPlan, [plan.id for plan in plans], PlanSchema, "Plan not found")
+
+    with audit_service.AuditBatch(db, current_user) as audit:
+        for db_plan in plans:
+            _create_calendar_event(db, db_plan)
+            plan_history.record_version(db, db_plan, current_user.username)
+            plan_events.publish(db, "confirmed", db_plan)
+            audit.record(
+                "CONFIRM", "notfallplan", db_plan.id,
+                old_value={"confirmed": False}, new_value={"confirmed": True}
+            )
+
+    result = {"status": "confirmed", "confirmed": [plan.id for plan in plans]}
+    idempotency.save(db, idem, result)
+
+    db.commit()
+    return result
+
+@router.post("/auto-plan", response_model=AutoPlanResult)
+def auto_plan(
+    data: AutoPlanRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_planner_or_admin),
+    idem: Optional[IdempotencyContext] = Depends(get_idempotency)
+):
+    """
+    Fair rota for a period (admin only): a draft, or with `create` the
+    draft inserted as unconfirmed plans. Slots overlapping existing plans
+    are kept as they are.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can plan for others")
+
+    if data.create:
+        lock_for_write(db, PLAN_SCHEDULE_LOCK)  # The draft must not race with manual bookings
+    try:
+        result = auto_plan_service.propose(
+            db, data.start_date, data.end_date, slot_days=data.slot_days, user_ids=data.user_ids,
+            blackouts=[(b.user_id, b.start_date, b.end_date) for b in data.blackouts],
+            targets=data.targets, history_days=data.history_days,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not data.create:
+        return result
+
+    plans = []
+    if result["plans"]:
+        last_id = db.query(func.max(NotfallPlan.id)).scalar() or 0
+        db.execute(insert(NotfallPlan), [{**slot, "confirmed": False, "created_by": current_user.username} for slot in result["plans"]])
+        # Read back in one query (RETURNING with executemany falls back to single-row INSERTs on SQLite):
+        # rows newer than last_id with exactly the slot's times, user and creator
+        plans = db.query(NotfallPlan).options(joinedload(NotfallPlan.user)).filter(
+            NotfallPlan.id > last_id,
+            NotfallPlan.created_by == current_user.username,
+            tuple_(NotfallPlan.start_date, NotfallPlan.end_date, NotfallPlan.user_id).in_(
+                [(slot["start_date"], slot["end_date"], slot["user_id"]) for slot in result["plans"]]
+            ),
+        ).order_by(NotfallPlan.start_date).all()
+    insert_plan_days(db, plans)
+    plan_history.record_new_plans(db, plans, current_user.username)
+    plan_events.publish_many(db, "created", plans)
+    with audit_service.AuditBatch(db, current_user) as audit:
+        for db_plan in plans:
+            audit.record("CREATE", "notfallplan", db_plan.id, new_value=audit_service.snapshot(db_plan, PLAN_FIELDS))
+
+    result["created"] = [plan.id for plan in plans]
+    response = AutoPlanResult.model_validate(result)
+    idempotency.save(db, idem, response)
+    db.commit()
+    return response
+
+def _mark_confirmed(db_plan: NotfallPlan):
+    """Mark a plan confirmed (caller flushes, then creates the calendar event)"""
     db_plan.confirmed = True
-    
-    # Create MS Graph Event with attendee
-    assigned_user = db.query(User).filter(User.id == db_plan.user_id).first()
+    sync_plan_days(db_plan)
+    concurrency.bump(db_plan)
+
+def _create_calendar_event(db: Session, db_plan: NotfallPlan):
+    """Create the MS Graph event with attendee for a confirmed plan (caller commits)"""
+    assigned_user = db_plan.user
     if assigned_user:
         subject = f"{assigned_user.first_name} {assigned_user.last_name}: IT-Notfallservice"
         attendee_email = assigned_user.email
@@ -228,14 +499,3 @@ def confirm_plan(
         if event_id:
             cal_event = CalendarEvent(notfallplan_id=db_plan.id, ms_event_id=event_id)
             db.add(cal_event)
-
-    db.add(AuditLog(
-        user_id=current_user.id,
-        username=current_user.username,
-        action="CONFIRM",
-        target_table="notfallplan",
-        target_id=db_plan.id
-    ))
-
-    db.commit()
-    return {"status": "confirmed"}
@@ -1,13 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Header, Response, status
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
-from typing import List
-from database import get_db
-from models import User, AuditLog
-from schemas import User as UserSchema, UserCreate, UserUpdate, UserSimple
+from typing import List, Optional
+from database import get_db, get_read_db
+from models import User
+from schemas import User as UserSchema, UserCreate, UserUpdate, UserSimple, UserImport, UserImportResult
 from routers.auth import get_current_user, get_password_hash
+from services import audit_service
+from services.audit_service import USER_FIELDS
+from services import concurrency
+from services import idempotency
+from services.idempotency import IdempotencyContext, get_idempotency
+from services import user_directory, user_import
+import base64
+import json
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+MAX_PAGE_SIZE = 500
+
 def require_admin(current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(
@@ -26,42 +37,80 @@ def require_role(allowed_roles: List[str]):
         return current_user
     return role_checker
 
+def encode_cursor(user: User) -> str:
+    """Opaque cursor pointing just past the given user in (last_name, first_name, id) order"""
+    raw = json.dumps([user.last_name, user.first_name, user.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        last_name, first_name, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(last_name), str(first_name), int(user_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @router.get("/", response_model=List[UserSchema])
 async def get_users(
-    db: Session = Depends(get_db),
+    response: Response,
+    q: Optional[str] = None,
+    role: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(require_admin)
 ):
-    """Get all users (admin only)"""
-    return db.query(User).all()
+    """
+    Users by last name, first name; keyset-paginated (admin only).
+
+    `q` matches each word against username, name and email (substring,
+    case-insensitive). Pass the X-Next-Cursor header of a page as ?cursor=
+    to fetch the next one.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    query = db.query(User)
+    if q:
+        query = query.filter(*user_directory.search_filters(q))
+    if role:
+        query = query.filter(User.role == role)
+    if cursor:
+        query = query.filter(tuple_(User.last_name, User.first_name, User.id) > decode_cursor(cursor))
+
+    # Fetch one extra row to know whether another page exists
+    users = query.order_by(User.last_name, User.first_name, User.id).limit(limit + 1).all()
+    if len(users) > limit:
+        users = users[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(users[-1])
+    return users
 
 @router.get("/duty-eligible", response_model=List[UserSimple])
 async def get_duty_eligible_users(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get users who can take emergency duty (for plan creation)"""
-    return db.query(User).filter(
-        User.is_active == True,
-        (User.can_take_duty == True) | (User.role == "planner")
-    ).all()
+    """Get users who can take emergency duty (for plan creation); cached until a user changes"""
+    return user_directory.duty_eligible_users(db)
 
 @router.get("/{user_id}", response_model=UserSchema)
 async def get_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(require_admin)
 ):
     """Get single user by ID (admin only)"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    concurrency.set_etag(response, user)
     return user
 
 @router.post("/", response_model=UserSchema)
 async def create_user(
     user_data: UserCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin)
+    current_user: User = Depends(require_admin),
+    idem: Optional[IdempotencyContext] = Depends(get_idempotency)
 ):
     """Create new user (admin only)"""
     try:
@@ -84,20 +133,16 @@ async def create_user(
             can_take_duty=user_data.can_take_duty
         )
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        db.flush()  # Assigns the user id for the audit entry
         
-        # Audit log
-        audit = AuditLog(
-            user_id=current_user.id,
-            username=current_user.username,
-            action="CREATE",
-            target_table="users",
-            target_id=new_user.id,
-            new_value={"username": new_user.username, "email": new_user.email, "role": new_user.role}
+        # Audit log (same transaction as the user)
+        audit_service.record(
+            db, current_user, "CREATE", "users", new_user.id,
+            new_value=audit_service.snapshot(new_user, USER_FIELDS)
         )
-        db.add(audit)
+        idempotency.save(db, idem, UserSchema.model_validate(new_user))
         db.commit()
+        db.refresh(new_user)
         
         return new_user
     except HTTPException:
@@ -107,19 +152,50 @@ async def create_user(
         db.rollback()
         raise HTTPException(status_code=400, detail=f"Internal Error: {str(e)}")
 
+@router.post("/import", response_model=UserImportResult)
+def import_users(
+    data: UserImport,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin),
+    idem: Optional[IdempotencyContext] = Depends(get_idempotency)
+):
+    """
+    Create or update users from a CSV file or directory export (admin only).
+
+    All or nothing: invalid rows are answered with 422 and a list of
+    {"line", "error"}, and no user is written. `dry_run` only validates
+    and counts.
+    """
+    result = user_import.import_users(
+        db, current_user, data.content, data.format,
+        default_password=data.default_password, dry_run=data.dry_run,
+    )
+    errors = result.pop("errors")
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+    if data.dry_run:
+        return result
+
+    idempotency.save(db, idem, result)
+    db.commit()
+    return result
+
 @router.put("/{user_id}", response_model=UserSchema)
 async def update_user(
     user_id: int,
     user_data: UserUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
-    """Update user (admin only)"""
+    """Update user (admin only); If-Match or `version` guards against concurrent edits"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    old_values = {"email": user.email, "role": user.role}
+    concurrency.check_version(user, concurrency.expected_version(if_match, user_data.version), UserSchema)
+    old_values = audit_service.snapshot(user, USER_FIELDS)
     
     if user_data.email is not None:
         user.email = user_data.email
@@ -137,28 +213,27 @@ async def update_user(
         user.can_take_duty = user_data.can_take_duty
     if user_data.password is not None:
         user.password_hash = get_password_hash(user_data.password)
+    concurrency.bump(user)
+    concurrency.flush_or_conflict(db, User, [user_id], UserSchema, "User not found")
     
-    db.commit()
-    db.refresh(user)
-    
-    # Audit log
-    audit = AuditLog(
-        user_id=current_user.id,
-        username=current_user.username,
-        action="UPDATE",
-        target_table="users",
-        target_id=user.id,
-        old_value=old_values,
-        new_value={"email": user.email, "role": user.role}
+    # Audit log (changed fields only; password changes are flagged, never stored)
+    old_changed, new_changed = audit_service.diff(old_values, audit_service.snapshot(user, USER_FIELDS))
+    if user_data.password is not None:
+        new_changed["password"] = "changed"
+    audit_service.record(
+        db, current_user, "UPDATE", "users", user.id,
+        old_value=old_changed, new_value=new_changed
     )
-    db.add(audit)
     db.commit()
+    db.refresh(user)
+    concurrency.set_etag(response, user)
     
     return user
 
 @router.delete("/{user_id}")
 async def delete_user(
     user_id: int,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
@@ -170,18 +245,16 @@ async def delete_user(
     if user.id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
     
+    concurrency.check_version(user, concurrency.expected_version(if_match), UserSchema)
+    
     # Audit log before deletion
-    audit = AuditLog(
-        user_id=current_user.id,
-        username=current_user.username,
-        action="DELETE",
-        target_table="users",
-        target_id=user.id,
-        old_value={"username": user.username, "email": user.email}
+    audit_service.record(
+        db, current_user, "DELETE", "users", user.id,
+        old_value=audit_service.snapshot(user, USER_FIELDS)
     )
-    db.add(audit)
     
     db.delete(user)
+    concurrency.flush_or_conflict(db, User, [user_id], UserSchema, "User not found")
     db.commit()
     
     return {"status": "deleted"}
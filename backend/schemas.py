@@ -1,6 +1,10 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
-from datetime import datetime
+from pydantic import AfterValidator, BaseModel, EmailStr
+from typing import Annotated, Dict, Optional, List
+from datetime import date, datetime
+from services import phone
+
+# Stored as E.164 (+491711234567); accepts the usual spellings, see services/phone.py
+PhoneNumber = Annotated[Optional[str], AfterValidator(phone.validate)]
 
 # User Schemas
 class UserBase(BaseModel):
@@ -8,7 +12,7 @@ class UserBase(BaseModel):
     email: EmailStr
     first_name: str
     last_name: str
-    phone_number: Optional[str] = None
+    phone_number: PhoneNumber = None
     role: str = "planner"  # admin, planner, buchhaltung
     is_active: bool = True
     can_take_duty: bool = True
@@ -20,16 +24,20 @@ class UserUpdate(BaseModel):
     email: Optional[EmailStr] = None
     first_name: Optional[str] = None
     last_name: Optional[str] = None
-    phone_number: Optional[str] = None
+    phone_number: PhoneNumber = None
     role: Optional[str] = None
     is_active: Optional[bool] = None
     can_take_duty: Optional[bool] = None
     password: Optional[str] = None  # Only if changing password
+    version: Optional[int] = None  # Version being edited (alternative to If-Match)
 
 class User(UserBase):
     id: int
+    email: str  # Validated on input (UserCreate/UserUpdate); EmailStr here re-checks every listed user (~0.1 ms each)
+    phone_number: Optional[str] = None  # Likewise; older numbers that could not be normalized are shown as stored
     created_at: datetime
     last_login: Optional[datetime] = None
+    version: int = 1
 
     class Config:
         from_attributes = True
@@ -46,6 +54,19 @@ class UserSimple(BaseModel):
     class Config:
         from_attributes = True
 
+class UserImport(BaseModel):
+    """Bulk import (POST /users/import), see services/user_import.py"""
+    content: str  # Text of the CSV file or directory export
+    format: Optional[str] = None  # "csv" or "json"; detected when omitted
+    default_password: Optional[str] = None  # Initial password of new users without a password column
+    dry_run: bool = False
+
+class UserImportResult(BaseModel):
+    created: int
+    updated: int
+    unchanged: int
+    dry_run: bool = False
+
 # Plan Schemas
 class PlanBase(BaseModel):
     start_date: datetime
@@ -61,16 +82,74 @@ class PlanUpdate(BaseModel):
     end_date: Optional[datetime] = None
     user_id: Optional[int] = None  # Changed from person_id
     confirmed: Optional[bool] = None
+    version: Optional[int] = None  # Version being edited (alternative to If-Match)
+
+class PlanBulkConfirm(BaseModel):
+    plan_ids: List[int]
 
 class Plan(PlanBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
+    version: int = 1
     user: Optional[UserSimple] = None  # Changed from person
 
     class Config:
         from_attributes = True
 
+class AutoPlanBlackout(BaseModel):
+    start_date: date
+    end_date: date  # Exclusive, like the period
+    user_id: Optional[int] = None  # None: nobody is planned (e.g. company holidays)
+
+class AutoPlanRequest(BaseModel):
+    """Rota proposal for [start_date, end_date), see services/auto_plan.py"""
+    start_date: date
+    end_date: date
+    slot_days: int = 7
+    user_ids: Optional[List[int]] = None  # Default: all duty-eligible users
+    blackouts: List[AutoPlanBlackout] = []
+    targets: Dict[int, float] = {}  # user_id -> share weight (default 1.0)
+    history_days: int = 365  # Past duty days counted for fairness
+    create: bool = False  # Insert the draft as unconfirmed plans
+
+class AutoPlanSlot(BaseModel):
+    start_date: datetime
+    end_date: datetime
+    user_id: Optional[int] = None
+
+class AutoPlanUser(BaseModel):
+    user: UserSimple
+    weight: float
+    history_days: float  # Ledger days in the history window and existing plans of the period
+    planned_days: float
+
+class AutoPlanExcluded(BaseModel):
+    user_id: int
+    reason: str
+
+class AutoPlanResult(BaseModel):
+    plans: List[AutoPlanSlot]
+    unassigned: List[AutoPlanSlot]
+    users: List[AutoPlanUser]
+    excluded: List[AutoPlanExcluded]
+    created: List[int] = []  # Ids of the inserted plans (create=true)
+
+class PlanVersion(BaseModel):
+    """One system-time version of a plan"""
+    plan_id: int
+    user_id: int
+    start_date: datetime
+    end_date: datetime
+    confirmed: bool
+    changed_by: Optional[str] = None
+    sys_from: datetime
+    sys_to: Optional[datetime] = None
+    user: Optional[UserSimple] = None
+
+    class Config:
+        from_attributes = True
+
 # Auth Schemas
 class Token(BaseModel):
     access_token: str
@@ -0,0 +1,164 @@
+"""
+Fill an empty database with realistic synthetic data for benchmarks.
+
+Usage: DATABASE_URL=... python seed_data.py [--users 1000] [--years 10] [--audit-rows 1000000] [--seed 42]
+
+The database must be migrated (alembic upgrade head) and contain no plans.
+The data is deterministic for a given --seed, so results from different
+commits are comparable. Everything is written with bulk inserts; the duty
+day ledger, plan history and (on Postgres) audit_log partitions are then
+built the same way init_db does for an existing deployment.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import insert, text
+from database import SessionLocal
+from models import User, NotfallPlan, AuditLog
+from routers.auth import get_password_hash
+from services.duty_service import rebuild_duty_days
+from services.plan_history import backfill_history
+from services.audit_archive import partition_audit_log, ensure_audit_partitions
+
+BENCH_ADMIN = "bench_admin"
+BENCH_PASSWORD = "bench123"
+
+FIRST_NAMES = ["Anna", "Ben", "Clara", "David", "Eva", "Felix", "Greta", "Hannes", "Ida", "Jonas", "Katharina", "Lukas", "Marie", "Noah", "Paula", "Tim"]
+LAST_NAMES = ["Müller", "Schmidt", "Schneider", "Fischer", "Weber", "Meyer", "Wagner", "Becker", "Schulz", "Hoffmann", "Koch", "Richter", "Wolf", "Neumann"]
+AUDIT_ACTIONS = ["CREATE", "UPDATE", "CONFIRM", "DELETE", "LOGIN"]
+CHUNK_SIZE = 10000
+
+
+def _bulk_insert(db, model, rows):
+    for i in range(0, len(rows), CHUNK_SIZE):
+        db.execute(insert(model), rows[i:i + CHUNK_SIZE])
+
+
+def seed_users(db, rng: random.Random, count: int):
+    """bench_admin plus `count` users with a realistic role mix; returns their ids and usernames."""
+    # One bcrypt hash for everybody, hashing 1000 passwords would dominate the seeding time
+    password_hash = get_password_hash(BENCH_PASSWORD)
+    rows = [dict(
+        username=BENCH_ADMIN, email="bench_admin@example.com", password_hash=password_hash,
+        first_name="Bench", last_name="Admin", role="admin", is_active=True, can_take_duty=False,
+    )]
+    for i in range(count):
+        role = "admin" if i % 200 == 0 else "buchhaltung" if i % 50 == 1 else "planner"
+        rows.append(dict(
+            username=f"user{i:05d}",
+            email=f"user{i:05d}@example.com",
+            password_hash=password_hash,
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            phone_number=f"+49171{rng.randrange(1000000, 9999999)}" if rng.random() < 0.9 else None,
+            role=role,
+            is_active=rng.random() < 0.95,
+            can_take_duty=role == "planner" and rng.random() < 0.8,
+        ))
+    _bulk_insert(db, User, rows)
+    db.commit()
+    return db.query(User.id, User.username, User.can_take_duty).all()
+
+
+def seed_plans(db, rng: random.Random, users, years: int):
+    """Back-to-back weekly plans (Monday to Monday) for `years` years up to 12 weeks ahead."""
+    this_monday = datetime.combine(datetime.now().date(), datetime.min.time())
+    this_monday -= timedelta(days=this_monday.weekday())
+    first = this_monday - timedelta(weeks=52 * years)
+    last = this_monday + timedelta(weeks=12)
+    confirmed_until = this_monday + timedelta(weeks=4)
+    eligible = [user for user in users if user.can_take_duty]
+
+    rows = []
+    start = first
+    while start < last:
+        user = rng.choice(eligible)
+        rows.append(dict(
+            start_date=start,
+            end_date=start + timedelta(days=7),
+            user_id=user.id,
+            confirmed=start < confirmed_until,
+            created_by=user.username,
+            created_at=start - timedelta(days=rng.randrange(7, 60)),
+            version=1,
+        ))
+        start += timedelta(days=7)
+    _bulk_insert(db, NotfallPlan, rows)
+    db.commit()
+    return first, len(rows)
+
+
+def seed_audit_log(db, rng: random.Random, users, count: int, since: datetime):
+    """`count` audit entries spread evenly (oldest first) between `since` and now."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    step = (now - since) / max(1, count)
+    actors = [user for user in users if user.username != BENCH_ADMIN]
+    rows = []
+    for i in range(count):
+        actor = rng.choice(actors)
+        action = rng.choice(AUDIT_ACTIONS)
+        target_table = "users" if action == "LOGIN" or rng.random() < 0.1 else "notfallplan"
+        rows.append(dict(
+            user_id=actor.id,
+            username=actor.username,
+            action=action,
+            target_table=target_table,
+            target_id=rng.randrange(1, 1000),
+            old_value={"confirmed": False} if action in ("UPDATE", "CONFIRM") else None,
+            new_value={"confirmed": True} if action in ("UPDATE", "CONFIRM") else None,
+            timestamp=since + step * i,
+        ))
+        if len(rows) == CHUNK_SIZE:
+            db.execute(insert(AuditLog), rows)
+            rows = []
+    if rows:
+        db.execute(insert(AuditLog), rows)
+    db.commit()
+
+
+def seed(users: int = 1000, years: int = 10, audit_rows: int = 1_000_000, seed_value: int = 42):
+    """Seed the database behind DATABASE_URL; returns the row counts."""
+    rng = random.Random(seed_value)
+    db = SessionLocal()
+    try:
+        if db.query(NotfallPlan.id).first() is not None:
+            raise RuntimeError("Database already contains plans, seed an empty database")
+
+        started = time.perf_counter()
+        user_rows = seed_users(db, rng, users)
+        first, plan_count = seed_plans(db, rng, user_rows, years)
+        print(f"{len(user_rows)} users, {plan_count} plans ({time.perf_counter() - started:.1f} s)")
+
+        rebuild_duty_days(db)
+        backfill_history(db)
+
+        seed_audit_log(db, rng, user_rows, audit_rows, first)
+        print(f"{audit_rows} audit entries ({time.perf_counter() - started:.1f} s)")
+
+        # Same layout as a long-running Postgres deployment: monthly audit_log partitions
+        partition_audit_log()
+        ensure_audit_partitions()
+
+        # Planner statistics, otherwise the first queries run against an unanalyzed schema
+        db.execute(text("ANALYZE"))
+        db.commit()
+        print(f"Seeding finished in {time.perf_counter() - started:.1f} s")
+        return {"users": len(user_rows), "plans": plan_count, "audit_log": audit_rows}
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed synthetic benchmark data into DATABASE_URL")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--audit-rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print("--- SEED BENCHMARK DATA ---")
+    seed(args.users, args.years, args.audit_rows, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import os
+import gzip
+import json
+import shutil
+from datetime import date, datetime
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from database import engine
+from models import AuditLog
+
+# Months of audit log kept in the live table; 0 keeps everything
+AUDIT_RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", "0"))
+# Where detached months are written as gzip-compressed JSON lines
+AUDIT_ARCHIVE_DIR = os.getenv("AUDIT_ARCHIVE_DIR", "./audit_archive")
+# Monthly partitions created ahead of time on Postgres
+AUDIT_PARTITIONS_AHEAD = int(os.getenv("AUDIT_PARTITIONS_AHEAD", "3"))
+
+
+def add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"audit_log_p{month.year}_{month.month:02d}"
+
+
+def archive_path(month: date) -> str:
+    return os.path.join(AUDIT_ARCHIVE_DIR, f"audit_log_{month.year}_{month.month:02d}.jsonl.gz")
+
+
+# --- Postgres partitioning ---
+
+def _is_partitioned(conn) -> bool:
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p "
+        "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = 'audit_log')"
+    )).scalar()
+
+
+_COLUMNS = "id, user_id, username, action, target_table, target_id, old_value, new_value, timestamp, trace_id, span_id"
+
+
+def _create_partition(conn, month: date):
+    """
+    Create the partition of a month. Rows that already landed in
+    audit_log_default for that month (partition maintenance did not run in
+    time) would make the CREATE fail, so they are moved over: the default
+    partition is detached while the partition is created and filled, then
+    attached again. The lock on audit_log makes concurrent writers wait.
+    """
+    name = partition_name(month)
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+        return
+    bounds = {"start": month, "end": add_months(month, 1)}
+    create = text(
+        f"CREATE TABLE {name} PARTITION OF audit_log "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+    in_default = conn.execute(text(
+        "SELECT count(*) FROM audit_log_default WHERE timestamp >= :start AND timestamp < :end"
+    ), bounds).scalar()
+    if not in_default:
+        conn.execute(create)
+        return
+
+    conn.execute(text("ALTER TABLE audit_log DETACH PARTITION audit_log_default"))
+    conn.execute(create)
+    conn.execute(text(
+        f"INSERT INTO {name} ({_COLUMNS}) SELECT {_COLUMNS} FROM audit_log_default "
+        "WHERE timestamp >= :start AND timestamp < :end"
+    ), bounds)
+    conn.execute(text("DELETE FROM audit_log_default WHERE timestamp >= :start AND timestamp < :end"), bounds)
+    conn.execute(text("ALTER TABLE audit_log ATTACH PARTITION audit_log_default DEFAULT"))
+    print(f"Moved {in_default} audit entries from audit_log_default to {name}.")
+
+
+def partition_audit_log():
+    """
+    Convert audit_log into a table range-partitioned by month (Postgres only).
+
+    Runs once: the existing heap table is renamed, its rows are copied into
+    monthly partitions and it is dropped, all in one transaction. The id
+    sequence is kept so ids stay unique. No-op on other databases or when
+    the table is already partitioned.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+
+    with engine.begin() as conn:
+        if _is_partitioned(conn):
+            return
+
+        print("Partitioning audit_log by month...")
+        sequence = conn.execute(text("SELECT pg_get_serial_sequence('audit_log', 'id')")).scalar()
+        first = conn.execute(text("SELECT min(timestamp) FROM audit_log")).scalar()
+
+        conn.execute(text("ALTER TABLE audit_log RENAME TO audit_log_heap"))
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+        conn.execute(text(
+            "CREATE TABLE audit_log ("
+            f" id INTEGER NOT NULL DEFAULT nextval('{sequence}'),"
+            " user_id INTEGER,"
+            " username VARCHAR,"
+            " action VARCHAR NOT NULL,"
+            " target_table VARCHAR NOT NULL,"
+            " target_id INTEGER,"
+            " old_value JSON,"
+            " new_value JSON,"
+            " timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),"
+            " trace_id VARCHAR(32),"
+            " span_id VARCHAR(16),"
+            " PRIMARY KEY (id, timestamp)"
+            ") PARTITION BY RANGE (timestamp)"
+        ))
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY audit_log.id"))
+        # Catches rows outside the prepared months instead of failing the insert
+        conn.execute(text("CREATE TABLE audit_log_default PARTITION OF audit_log DEFAULT"))
+
+        month = (first.date() if first else date.today()).replace(day=1)
+        last = add_months(date.today().replace(day=1), AUDIT_PARTITIONS_AHEAD)
+        while month <= last:
+            _create_partition(conn, month)
+            month = add_months(month, 1)
+
+        conn.execute(text(
+            "INSERT INTO audit_log (id, user_id, username, action, target_table, target_id, old_value, new_value, timestamp, trace_id, span_id) "
+            "SELECT id, user_id, username, action, target_table, target_id, old_value, new_value, coalesce(timestamp, now()), trace_id, span_id "
+            "FROM audit_log_heap"
+        ))
+        conn.execute(text("DROP TABLE audit_log_heap"))
+
+        # Indexes on the parent are created on every partition as well
+        for index in AuditLog.__table__.indexes:
+            index.create(conn, checkfirst=True)
+        print("audit_log partitioned.")
+
+
+def ensure_audit_partitions():
+    """Create the partitions for the current month and the next AUDIT_PARTITIONS_AHEAD months."""
+    if engine.dialect.name != "postgresql":
+        return
+
+    with engine.begin() as conn:
+        if not _is_partitioned(conn):
+            return
+        month = date.today().replace(day=1)
+        for _ in range(AUDIT_PARTITIONS_AHEAD + 1):
+            _create_partition(conn, month)
+            month = add_months(month, 1)
+
+
+# --- Retention and archival ---
+
+def _serialize(log: AuditLog) -> str:
+    return json.dumps({
+        "id": log.id,
+        "user_id": log.user_id,
+        "username": log.username,
+        "action": log.action,
+        "target_table": log.target_table,
+        "target_id": log.target_id,
+        "old_value": log.old_value,
+        "new_value": log.new_value,
+        "timestamp": log.timestamp.isoformat() if log.timestamp else None,
+        "trace_id": log.trace_id,
+        "span_id": log.span_id,
+    }, default=str)
+
+
+def archive_month(db: Session, month: date) -> int:
+    """
+    Write one month of audit rows to its archive file and remove them from the live table.
+
+    On a partitioned Postgres table the partition is detached and dropped;
+    elsewhere the rows are deleted. The new archive is written next to the
+    old one and moved into place before the rows are removed, so a crash
+    or failed commit never loses rows; rows already in the archive (from
+    such an interrupted run) are not written again. Rows are identified by
+    id and timestamp, since SQLite may reuse the ids of deleted rows.
+    """
+    start, end = month, add_months(month, 1)
+    rows = db.query(AuditLog).filter(AuditLog.timestamp >= start, AuditLog.timestamp < end)
+    path = archive_path(month)
+    archived = {(entry["id"], entry["timestamp"]) for entry in read_archive(month)} if os.path.exists(path) else set()
+
+    count = 0
+    partial = path + ".partial"
+    archive = None
+    try:
+        for log in rows.order_by(AuditLog.timestamp, AuditLog.id).yield_per(1000):
+            if (log.id, log.timestamp) in archived:
+                continue
+            if archive is None:
+                # Empty months get no file
+                os.makedirs(AUDIT_ARCHIVE_DIR, exist_ok=True)
+                if archived:
+                    shutil.copyfile(path, partial)  # gzip files may hold several members
+                archive = gzip.open(partial, "at" if archived else "wt", encoding="utf-8")
+            archive.write(_serialize(log) + "\n")
+            count += 1
+        if archive is not None:
+            archive.close()
+            archive = None
+            os.replace(partial, path)
+    finally:
+        if archive is not None:
+            archive.close()
+            os.remove(partial)
+
+    bind = db.get_bind()
+    if bind.dialect.name == "postgresql" and _is_partitioned(db.connection()):
+        name = partition_name(month)
+        if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+            db.execute(text(f"ALTER TABLE audit_log DETACH PARTITION {name}"))
+            db.execute(text(f"DROP TABLE {name}"))
+        else:
+            rows.delete(synchronize_session=False)
+    else:
+        rows.delete(synchronize_session=False)
+    db.commit()
+    return count
+
+
+def apply_audit_retention(db: Session, retention_months: int = None):
+    """Archive every month older than the retention window. Returns {month: rows archived}."""
+    retention_months = AUDIT_RETENTION_MONTHS if retention_months is None else retention_months
+    if retention_months <= 0:
+        return {}
+
+    cutoff = add_months(date.today().replace(day=1), -retention_months)
+    first = db.query(AuditLog.timestamp).order_by(AuditLog.timestamp).first()
+    if not first or not first[0]:
+        return {}
+
+    archived = {}
+    month = first[0].date().replace(day=1)
+    while month < cutoff:
+        archived[month] = archive_month(db, month)
+        month = add_months(month, 1)
+    return archived
+
+
+def list_archives():
+    """Archived months, oldest first."""
+    if not os.path.isdir(AUDIT_ARCHIVE_DIR):
+        return []
+    months = []
+    for name in sorted(os.listdir(AUDIT_ARCHIVE_DIR)):
+        if name.startswith("audit_log_") and name.endswith(".jsonl.gz"):
+            year, month = name[len("audit_log_"):-len(".jsonl.gz")].split("_")
+            months.append(date(int(year), int(month), 1))
+    return months
+
+
+def read_archive(month: date):
+    """Yield the archived audit rows of a month as dicts."""
+    with gzip.open(archive_path(month), "rt", encoding="utf-8") as archive:
+        for line in archive:
+            entry = json.loads(line)
+            if entry["timestamp"]:
+                entry["timestamp"] = datetime.fromisoformat(entry["timestamp"])
+            yield entry
@@ -0,0 +1,86 @@
+from datetime import date, datetime
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from models import AuditLog
+from services.tracing import current_trace_ids
+
+# Columns captured in audit snapshots (never password hashes)
+PLAN_FIELDS = ("start_date", "end_date", "user_id", "confirmed")
+USER_FIELDS = ("username", "email", "first_name", "last_name", "phone_number", "role", "is_active", "can_take_duty")
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def snapshot(obj, fields) -> dict:
+    """JSON-safe dict of the given attributes of a model instance."""
+    return {field: _json_value(getattr(obj, field)) for field in fields}
+
+
+def diff(old: dict, new: dict):
+    """Field-level diff of two snapshots: (old values, new values) of the changed fields only."""
+    changed = [key for key in new if old.get(key) != new[key]]
+    return {key: old.get(key) for key in changed}, {key: new[key] for key in changed}
+
+
+def _entry(actor, action: str, target_table: str, target_id=None, old_value=None, new_value=None) -> dict:
+    trace_id, span_id = current_trace_ids()
+    return {
+        "user_id": actor.id if actor else None,
+        "username": actor.username if actor else None,
+        "action": action,
+        "target_table": target_table,
+        "target_id": target_id,
+        "old_value": old_value,
+        "new_value": new_value,
+        "trace_id": trace_id,
+        "span_id": span_id,
+    }
+
+
+def record(db: Session, actor, action: str, target_table: str, target_id=None, old_value=None, new_value=None) -> AuditLog:
+    """
+    Add an audit row to the current transaction.
+
+    Nothing is flushed here: the row is written with the business change by
+    the caller's commit, so either both persist or neither does.
+    """
+    log = AuditLog(**_entry(actor, action, target_table, target_id, old_value, new_value))
+    db.add(log)
+    return log
+
+
+class AuditBatch:
+    """
+    Buffered audit writer for bulk operations.
+
+    Entries are collected in memory and written as one multi-row INSERT on
+    flush() (or when the `with` block exits without error), inside the
+    caller's transaction.
+    """
+
+    def __init__(self, db: Session, actor):
+        self.db = db
+        self.actor = actor
+        self.entries = []
+
+    def record(self, action: str, target_table: str, target_id=None, old_value=None, new_value=None):
+        self.entries.append(_entry(self.actor, action, target_table, target_id, old_value, new_value))
+
+    def flush(self):
+        if self.entries:
+            self.db.execute(insert(AuditLog), self.entries)
+            self.entries = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.entries = []
+        return False
@@ -0,0 +1,165 @@
+"""
+Fair rota proposals (POST /plans/auto-plan).
+
+The period [start, end) is cut into slots of `slot_days` days from its
+first day on (Monday to Monday by default, the way planners book weeks).
+Slots that overlap an existing plan are left as they are. Every other
+slot goes to the available user whose duty load, relative to their fair
+share, is lowest after taking it:
+
+    (duty days + slot days) / (target weight * days eligible)
+
+Duty days are read from the duty_days ledger, from `history_days` before
+the period up to its end, so past duties and plans already inside the
+period both count. Days eligible run from the start of that window, or
+from the user's creation if later, so a newcomer is not handed every slot
+until they have caught up with colleagues who served for years. Nobody
+gets two slots in a row while someone else is available.
+
+Users sit in a heap ordered by that key: a slot costs O(log n) plus the
+users skipped for blackouts, and a year of weekly or daily slots for a
+few hundred users is planned in milliseconds. The result is a draft; the
+endpoint inserts it as unconfirmed plans on request.
+"""
+import heapq
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import DutyDay, NotfallPlan, User
+from services import phone, user_directory
+
+MAX_PERIOD_DAYS = 2 * 366
+DEFAULT_HISTORY_DAYS = 365
+
+
+def _slots(start_day: date, end_day: date, slot_days: int):
+    start = datetime.combine(start_day, time())
+    end = datetime.combine(end_day, time())
+    while start < end:
+        slot_end = min(start + timedelta(days=slot_days), end)
+        yield start, slot_end
+        start = slot_end
+
+
+def _overlaps(intervals, start: datetime, end: datetime) -> bool:
+    return any(other_start < end and other_end > start for other_start, other_end in intervals)
+
+
+def propose(db: Session, start_day: date, end_day: date, slot_days: int = 7, user_ids=None,
+            blackouts=(), targets=None, history_days: int = DEFAULT_HISTORY_DAYS) -> dict:
+    """
+    Draft rota for [start_day, end_day).
+
+    `blackouts` are (user_id or None for everyone, first day, end day
+    exclusive); `targets` maps user ids to share weights (default 1.0,
+    0.5 = half as many duty days, 0 = none). Returns {"plans",
+    "unassigned", "users", "excluded"}; raises ValueError for invalid input.
+    """
+    if end_day <= start_day:
+        raise ValueError("end_date must be after start_date")
+    if (end_day - start_day).days > MAX_PERIOD_DAYS:
+        raise ValueError(f"Period is limited to {MAX_PERIOD_DAYS} days")
+    if slot_days < 1:
+        raise ValueError("slot_days must be at least 1")
+    targets = targets or {}
+    if any(weight < 0 for weight in targets.values()):
+        raise ValueError("Targets must not be negative")
+
+    eligible = {user.id: user for user in user_directory.duty_eligible_users(db)}
+    if user_ids is not None:
+        not_eligible = sorted(set(user_ids) - set(eligible))
+        if not_eligible:
+            raise ValueError(f"Users cannot take duty: {', '.join(map(str, not_eligible))}")
+        eligible = {user_id: eligible[user_id] for user_id in user_ids}
+
+    excluded = []
+    candidates = {}
+    for user_id, user in eligible.items():
+        if user.phone_number and not phone.is_e164(user.phone_number):
+            excluded.append({"user_id": user_id, "reason": "Phone number is not valid for call forwarding"})
+        elif targets.get(user_id, 1.0) == 0:
+            excluded.append({"user_id": user_id, "reason": "Target is 0"})
+        else:
+            candidates[user_id] = user
+
+    window_start = start_day - timedelta(days=history_days)
+    period_start = datetime.combine(start_day, time())
+    period_end = datetime.combine(end_day, time())
+
+    duty_days = dict(db.query(DutyDay.user_id, func.sum(DutyDay.fraction)).filter(
+        DutyDay.date >= window_start,
+        DutyDay.date < end_day,
+    ).group_by(DutyDay.user_id).all())
+    created = dict(db.query(User.id, User.created_at).filter(User.id.in_(list(candidates))).all()) if candidates else {}
+    existing = db.query(NotfallPlan.start_date, NotfallPlan.end_date, NotfallPlan.user_id).filter(
+        NotfallPlan.start_date < period_end,
+        NotfallPlan.end_date > period_start,
+    ).order_by(NotfallPlan.start_date).all()
+
+    unavailable = {}  # user id (None: everyone) -> [(start, end)]
+    for user_id, first_day, until_day in blackouts:
+        unavailable.setdefault(user_id, []).append((datetime.combine(first_day, time()), datetime.combine(until_day, time())))
+    closed = unavailable.pop(None, [])
+
+    load = {user_id: float(duty_days.get(user_id) or 0) for user_id in candidates}
+    share = {}
+    for user_id in candidates:
+        eligible_from = window_start
+        if created.get(user_id) is not None:
+            eligible_from = max(window_start, created[user_id].date())
+        share[user_id] = targets.get(user_id, 1.0) * max((end_day - eligible_from).days, 1)
+    planned = dict.fromkeys(candidates, 0.0)
+
+    def key(user_id):
+        return ((load[user_id] + slot_days) / share[user_id], load[user_id], user_id)
+
+    heap = [key(user_id) for user_id in candidates]
+    heapq.heapify(heap)
+
+    plans, unassigned = [], []
+    previous_user = None
+    for slot_start, slot_end in _slots(start_day, end_day, slot_days):
+        taken = [plan for plan in existing if plan.start_date < slot_end and plan.end_date > slot_start]
+        if taken:
+            previous_user = taken[-1].user_id
+            continue
+        if _overlaps(closed, slot_start, slot_end):
+            unassigned.append({"start_date": slot_start, "end_date": slot_end})
+            previous_user = None
+            continue
+
+        skipped, fallback, chosen = [], None, None
+        while heap:
+            entry = heapq.heappop(heap)
+            user_id = entry[2]
+            if _overlaps(unavailable.get(user_id, ()), slot_start, slot_end):
+                skipped.append(entry)
+            elif user_id == previous_user and fallback is None:
+                fallback = entry
+            else:
+                chosen = entry
+                break
+        if chosen is None:
+            chosen, fallback = fallback, None
+        for entry in skipped + ([fallback] if fallback else []):
+            heapq.heappush(heap, entry)
+        if chosen is None:
+            unassigned.append({"start_date": slot_start, "end_date": slot_end})
+            previous_user = None
+            continue
+
+        user_id = chosen[2]
+        days = (slot_end - slot_start).total_seconds() / (24 * 3600)
+        load[user_id] += days
+        planned[user_id] += days
+        heapq.heappush(heap, key(user_id))
+        plans.append({"start_date": slot_start, "end_date": slot_end, "user_id": user_id})
+        previous_user = user_id
+
+    users = [{
+        "user": candidates[user_id],
+        "weight": targets.get(user_id, 1.0),
+        "history_days": round(load[user_id] - planned[user_id], 2),
+        "planned_days": round(planned[user_id], 2),
+    } for user_id in sorted(candidates, key=lambda user_id: (candidates[user_id].last_name, candidates[user_id].first_name, user_id))]
+    return {"plans": plans, "unassigned": unassigned, "users": users, "excluded": excluded}
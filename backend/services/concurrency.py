@@ -0,0 +1,85 @@
+"""
+Optimistic concurrency for plans and users.
+
+Both tables carry a `version` column that SQLAlchemy uses as version_id_col:
+every UPDATE/DELETE of a loaded row is issued as
+`... WHERE id = :id AND version = :loaded_version`, so a concurrent change
+makes the statement match no row and raises StaleDataError at flush.
+Versions are bumped explicitly (bump()) for user-visible edits only, so
+bookkeeping writes like last_login do not invalidate open edit forms.
+"""
+from typing import Optional
+from fastapi import HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+
+class VersionConflict(Exception):
+    """The client edited an outdated version; carries the current row(s) for the 409 response."""
+
+    def __init__(self, current, schema):
+        # Serialized right away, the session is closed before the handler runs
+        if isinstance(current, list):
+            self.current = jsonable_encoder([schema.model_validate(row) for row in current])
+            self.etag = None
+        else:
+            self.current = jsonable_encoder(schema.model_validate(current))
+            self.etag = etag(current)
+
+
+async def version_conflict_handler(request: Request, exc: VersionConflict):
+    return JSONResponse(
+        status_code=409,
+        content={"detail": "Record was changed by someone else, please reload", "current": exc.current},
+        headers={"ETag": exc.etag} if exc.etag else None,
+    )
+
+
+def etag(obj) -> str:
+    return f'"{obj.version}"'
+
+
+def set_etag(response: Response, obj):
+    response.headers["ETag"] = etag(obj)
+
+
+def expected_version(if_match: Optional[str], body_version: Optional[int] = None) -> Optional[int]:
+    """Version the client based its change on: If-Match header ("3", W/"3") or the body's `version`."""
+    if if_match is None or if_match.strip() == "*":
+        return body_version
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid If-Match header")
+
+
+def check_version(obj, expected: Optional[int], schema):
+    """409 unless the loaded row still has the version the client saw (no expectation: last writer wins)."""
+    if expected is not None and obj.version != expected:
+        raise VersionConflict(obj, schema)
+
+
+def bump(obj):
+    obj.version = (obj.version or 0) + 1
+
+
+def flush_or_conflict(db: Session, model, ids, schema, not_found: str = "Not found"):
+    """
+    Flush pending changes; the compare-and-set happens here.
+
+    Call it before side effects outside the database (Graph events): on
+    success the rows stay locked by this transaction until commit.
+    """
+    try:
+        db.flush()
+    except StaleDataError:
+        db.rollback()
+        current = db.query(model).filter(model.id.in_(ids)).all()
+        if not current:
+            raise HTTPException(status_code=404, detail=not_found)
+        raise VersionConflict(current if len(ids) > 1 else current[0], schema)
@@ -0,0 +1,242 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, case, cast, insert, Integer
+from sqlalchemy.orm import Session
+from models import User, NotfallPlan, DutyDay
+
+SECONDS_PER_DAY = 24 * 3600
+
+
+def _totals_row(row):
+    return {
+        "user_id": row.id,
+        "username": row.username,
+        "first_name": row.first_name,
+        "last_name": row.last_name,
+        "total_days": round(float(row.total_days or 0), 2),
+        "total_entries": row.total_entries,
+    }
+
+
+def month_bounds(year: int, month: int):
+    """Half-open [first of month, first of next month) bounds."""
+    start = datetime(year, month, 1)
+    if month == 12:
+        end = datetime(year + 1, 1, 1)
+    else:
+        end = datetime(year, month + 1, 1)
+    return start, end
+
+
+# --- Duty day ledger ---
+
+def split_into_days(start: datetime, end: datetime):
+    """Yield (date, fraction) for every calendar day touched by [start, end)."""
+    current = datetime(start.year, start.month, start.day)
+    while current < end:
+        next_day = current + timedelta(days=1)
+        covered = (min(end, next_day) - max(start, current)).total_seconds()
+        if covered > 0:
+            yield current.date(), covered / SECONDS_PER_DAY
+        current = next_day
+
+
+def sync_plan_days(plan: NotfallPlan):
+    """
+    Replace the ledger rows of a plan with its current interval.
+
+    Call inside the transaction that changes the plan. Rows for days that are
+    still covered are updated in place; rows for days that dropped out are
+    removed by the delete-orphan cascade on NotfallPlan.duty_days at flush.
+    """
+    existing = {row.date: row for row in plan.duty_days}
+    rows = []
+    for day, fraction in split_into_days(plan.start_date, plan.end_date):
+        row = existing.pop(day, None) or DutyDay(date=day)
+        row.user_id = plan.user_id
+        row.fraction = fraction
+        row.confirmed = bool(plan.confirmed)
+        rows.append(row)
+    plan.duty_days = rows
+
+
+def insert_plan_days(db: Session, plans):
+    """
+    Ledger rows for newly inserted plans (ids assigned), in one multi-row
+    INSERT instead of one ORM row per day; for bulk creation.
+    """
+    rows = [
+        {"plan_id": plan.id, "user_id": plan.user_id, "date": day, "fraction": fraction, "confirmed": bool(plan.confirmed)}
+        for plan in plans
+        for day, fraction in split_into_days(plan.start_date, plan.end_date)
+    ]
+    if rows:
+        db.execute(insert(DutyDay), rows)
+
+
+def rebuild_duty_days(db: Session) -> int:
+    """Recompute the whole ledger from notfallplan. Returns the number of plans processed."""
+    db.query(DutyDay).delete(synchronize_session=False)
+    count = 0
+    for plan in db.query(NotfallPlan).yield_per(500):
+        db.add_all(
+            DutyDay(plan_id=plan.id, user_id=plan.user_id, date=day, fraction=fraction, confirmed=bool(plan.confirmed))
+            for day, fraction in split_into_days(plan.start_date, plan.end_date)
+        )
+        count += 1
+    db.commit()
+    return count
+
+
+def ledger_duty_days(db: Session, start_day: date, end_day: date, confirmed_only: bool = False):
+    """
+    Per-user duty totals for the days in [start_day, end_day), read from the ledger.
+
+    Rows of user_id, username, first_name, last_name, total_days (fractional,
+    a Monday-to-Monday plan is 7.0) and total_entries (plans), ordered by
+    name; backed by the (date, user_id) index.
+    """
+    query = db.query(
+        User.id,
+        User.username,
+        User.first_name,
+        User.last_name,
+        func.sum(DutyDay.fraction).label("total_days"),
+        func.count(func.distinct(DutyDay.plan_id)).label("total_entries"),
+    ).join(DutyDay, DutyDay.user_id == User.id).filter(
+        DutyDay.date >= start_day,
+        DutyDay.date < end_day,
+    )
+    if confirmed_only:
+        query = query.filter(DutyDay.confirmed == True)
+
+    rows = query.group_by(
+        User.id, User.username, User.first_name, User.last_name
+    ).order_by(User.last_name, User.first_name).all()
+
+    return [_totals_row(row) for row in rows]
+
+
+# --- Grouped ledger totals ---
+
+DUTY_GROUPS = ("week", "month", "quarter", "year")
+
+# Totals for ranges that lie completely in the past, keyed by
+# (from, to, group, user_id), each stored with the ledger fingerprint it
+# was computed at. Any plan change (from any worker or script) changes the
+# fingerprint, so a stale entry is never served; at most DUTY_CACHE_SIZE
+# entries are kept, least recently used dropped first.
+DUTY_CACHE_SIZE = int(os.getenv("DUTY_CACHE_SIZE", "256"))
+_duty_cache = OrderedDict()
+_duty_cache_lock = threading.Lock()
+
+
+def _period_start(db: Session, group: str):
+    """SQL expression for the first day of the week/month/quarter/year of DutyDay.date."""
+    if db.get_bind().dialect.name == "sqlite":
+        if group == "week":
+            return func.date(DutyDay.date, "weekday 0", "-6 days")
+        if group == "month":
+            return func.strftime("%Y-%m-01", DutyDay.date)
+        if group == "quarter":
+            month = cast(func.strftime("%m", DutyDay.date), Integer)
+            return func.printf("%s-%02d-01", func.strftime("%Y", DutyDay.date), ((month - 1) // 3) * 3 + 1)
+        return func.strftime("%Y-01-01", DutyDay.date)
+
+    return func.date(func.date_trunc(group, DutyDay.date))
+
+
+def grouped_duty_days(db: Session, start_day: date, end_day: date, group: str = "month", user_id: int = None):
+    """
+    Per-user, per-period ledger totals for the days in [start_day, end_day).
+
+    One grouped query for the whole range. For ranges that ended before
+    today the totals are cached until plans or the ledger change; names
+    are read on every call, so renamed users show up at once.
+    """
+    key = (start_day, end_day, group, user_id)
+    cacheable = end_day <= date.today()
+    totals = None
+    if cacheable:
+        # Read before the totals: a write committing in between leaves an
+        # entry that is already outdated, never one that is served stale
+        fingerprint = _ledger_fingerprint(db)
+        with _duty_cache_lock:
+            cached = _duty_cache.get(key)
+            if cached is not None and cached[0] == fingerprint:
+                _duty_cache.move_to_end(key)
+                totals = cached[1]
+
+    if totals is None:
+        totals = _grouped_totals(db, start_day, end_day, group, user_id)
+        if cacheable:
+            with _duty_cache_lock:
+                _duty_cache[key] = (fingerprint, totals)
+                _duty_cache.move_to_end(key)
+                while len(_duty_cache) > DUTY_CACHE_SIZE:
+                    _duty_cache.popitem(last=False)
+
+    user_ids = {row[1] for row in totals}
+    users = {
+        user.id: user
+        for user in db.query(User.id, User.username, User.first_name, User.last_name).filter(User.id.in_(user_ids))
+    } if user_ids else {}
+    result = [
+        {
+            "period": period,
+            "user_id": row_user_id,
+            "username": users[row_user_id].username,
+            "first_name": users[row_user_id].first_name,
+            "last_name": users[row_user_id].last_name,
+            "total_days": total_days,
+            "total_entries": total_entries,
+        }
+        for period, row_user_id, total_days, total_entries in totals
+        if row_user_id in users
+    ]
+    result.sort(key=lambda row: (row["period"], row["last_name"], row["first_name"]))
+    return result
+
+
+def _grouped_totals(db: Session, start_day: date, end_day: date, group: str, user_id: int = None):
+    """(period, user_id, total_days, total_entries) tuples; the cached part of grouped_duty_days()."""
+    period = _period_start(db, group).label("period")
+    query = db.query(
+        period,
+        DutyDay.user_id,
+        func.sum(DutyDay.fraction).label("total_days"),
+        func.count(func.distinct(DutyDay.plan_id)).label("total_entries"),
+    ).filter(
+        DutyDay.date >= start_day,
+        DutyDay.date < end_day,
+        DutyDay.confirmed == True,
+    )
+    if user_id is not None:
+        query = query.filter(DutyDay.user_id == user_id)
+
+    rows = query.group_by(period, DutyDay.user_id).all()
+    return [
+        (str(row.period)[:10], row.user_id, round(float(row.total_days or 0), 2), row.total_entries)
+        for row in rows
+    ]
+
+
+def _ledger_fingerprint(db: Session):
+    """
+    Changes whenever plans or ledger rows change: plan updates and
+    confirmations bump the plan version, inserts raise the highest id and
+    deletes lower the count. Ids are not enough for rebuild_duty_days():
+    SQLite hands out the same ids again after the delete-all, so the sums
+    of fractions, owners and confirmed fractions are part of it too.
+    """
+    plans = db.query(func.count(NotfallPlan.id), func.max(NotfallPlan.id), func.sum(NotfallPlan.version)).one()
+    days = db.query(
+        func.count(DutyDay.id),
+        func.max(DutyDay.id),
+        func.sum(DutyDay.fraction),
+        func.sum(DutyDay.user_id),
+        func.sum(case((DutyDay.confirmed == True, DutyDay.fraction), else_=0)),
+    ).one()
+    return tuple(plans) + tuple(days)
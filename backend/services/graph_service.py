@@ -1,14 +1,42 @@
 import os
 import requests
+import time
 import uuid
 from datetime import datetime
-from azure.identity import ClientSecretCredential
+from opentelemetry.trace import SpanKind
+from services.request_metrics import track_graph_call
+from services.tracing import tracer
 
 # Environment Variables
 TENANT_ID = os.getenv("MS_TENANT_ID")
 CLIENT_ID = os.getenv("MS_CLIENT_ID")
 CLIENT_SECRET = os.getenv("MS_CLIENT_SECRET")
 TARGET_FILE_EMAIL = os.getenv("MS_CALENDAR_EMAIL") # The email of the shared mailbox/calendar
+GRAPH_BASE_URL = os.getenv("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0")
+# Plain client-credentials token endpoint instead of azure-identity (load tests against a Graph stand-in)
+GRAPH_TOKEN_URL = os.getenv("GRAPH_TOKEN_URL")
+
+# Created on first use; azure-identity is slow to import and caches tokens per credential
+_credential = None
+_token = None
+_token_expiry = 0
+
+def _token_from_url():
+    """Client-credentials token from GRAPH_TOKEN_URL, cached until shortly before it expires."""
+    global _token, _token_expiry
+    if _token and time.time() < _token_expiry - 60:
+        return _token
+    response = requests.post(GRAPH_TOKEN_URL, data={
+        "grant_type": "client_credentials",
+        "client_id": CLIENT_ID,
+        "client_secret": CLIENT_SECRET,
+        "scope": "https://graph.microsoft.com/.default",
+    }, timeout=10)
+    response.raise_for_status()
+    data = response.json()
+    _token = data["access_token"]
+    _token_expiry = time.time() + data.get("expires_in", 3600)
+    return _token
 
 def get_access_token():
     print(f"[GRAPH DEBUG] Checking credentials... Tenant: {TENANT_ID}, ClientID: {CLIENT_ID}")
@@ -17,11 +45,18 @@ def get_access_token():
         print("[GRAPH DEBUG] MS Graph Credentials missing in environment variables.")
         return None
     
+    global _credential
     try:
-        print("[GRAPH DEBUG] Attempting to acquire token via ClientSecretCredential...")
-        credential = ClientSecretCredential(TENANT_ID, CLIENT_ID, CLIENT_SECRET)
-        # Request a token for Graph API
-        token = credential.get_token("https://graph.microsoft.com/.default")
+        if GRAPH_TOKEN_URL:
+            with track_graph_call("token"), tracer.start_as_current_span("graph.token", kind=SpanKind.CLIENT):
+                return _token_from_url()
+        if _credential is None:
+            from azure.identity import ClientSecretCredential
+            print("[GRAPH DEBUG] Creating ClientSecretCredential...")
+            _credential = ClientSecretCredential(TENANT_ID, CLIENT_ID, CLIENT_SECRET)
+        # Request a token for Graph API (served from the credential's cache until it expires)
+        with track_graph_call("token"), tracer.start_as_current_span("graph.token", kind=SpanKind.CLIENT):
+            token = _credential.get_token("https://graph.microsoft.com/.default")
         print("[GRAPH DEBUG] Token acquired successfully.")
         return token.token
     except Exception as e:
@@ -62,7 +97,7 @@ def create_event(subject: str, start: datetime, end: datetime, attendee_email: s
         ]
 
     # Construct URL
-    base_url = "https://graph.microsoft.com/v1.0"
+    base_url = GRAPH_BASE_URL
     endpoint = f"/users/{TARGET_FILE_EMAIL}/calendar/events" if TARGET_FILE_EMAIL else "/me/calendar/events"
     url = base_url + endpoint
     
@@ -72,7 +107,8 @@ def create_event(subject: str, start: datetime, end: datetime, attendee_email: s
     }
 
     try:
-        response = requests.post(url, json=event_body, headers=headers)
+        with track_graph_call("create_event"), tracer.start_as_current_span("graph.create_event", kind=SpanKind.CLIENT):
+            response = requests.post(url, json=event_body, headers=headers)
         if response.status_code == 201:
             return response.json().get("id")
         else:
@@ -88,7 +124,7 @@ def delete_event(event_id: str):
         print(f"Mock deleting event {event_id}")
         return True
 
-    base_url = "https://graph.microsoft.com/v1.0"
+    base_url = GRAPH_BASE_URL
     endpoint = f"/users/{TARGET_FILE_EMAIL}/calendar/events/{event_id}" if TARGET_FILE_EMAIL else f"/me/calendar/events/{event_id}"
     url = base_url + endpoint
 
@@ -98,7 +134,8 @@ def delete_event(event_id: str):
     }
     
     try:
-        response = requests.delete(url, headers=headers)
+        with track_graph_call("delete_event"), tracer.start_as_current_span("graph.delete_event", kind=SpanKind.CLIENT):
+            response = requests.delete(url, headers=headers)
         if response.status_code == 204:
             return True
         else:
@@ -0,0 +1,154 @@
+"""
+Idempotency-Key support for mutations.
+
+The first request with a key reserves it (committed right away, so
+concurrent retries see it), runs, and stores its response in the same
+transaction as its business change. Retries with the same key replay that
+response without running the endpoint again (no overlap checks, bcrypt or
+Graph calls). Requests that fail release the key so they can be retried.
+"""
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi import Depends, Header, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database import get_db
+from models import IdempotencyKey, User
+from routers.auth import get_current_user
+
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+PURGE_INTERVAL_SECONDS = 600
+
+_last_purge = 0.0
+
+
+class IdempotentReplay(Exception):
+    """Raised by the dependency to answer with the stored response of the first request."""
+
+    def __init__(self, status_code: int, body: str):
+        self.status_code = status_code
+        self.body = body
+
+
+async def idempotent_replay_handler(request: Request, exc: IdempotentReplay):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content=json.loads(exc.body) if exc.body else None,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+class IdempotencyContext:
+    def __init__(self, key: str, user_id: int):
+        self.key = key
+        self.user_id = user_id
+        self.saved = False
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _purge_expired(db: Session):
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge < PURGE_INTERVAL_SECONDS:
+        return
+    _last_purge = now
+    db.query(IdempotencyKey).filter(IdempotencyKey.expires_at < _utcnow()).delete(synchronize_session=False)
+    db.commit()
+
+
+def _reserve(db: Session, key: str, user_id: int, request_hash: str):
+    """Insert and commit the in-progress row, or raise the replay/conflict for an existing one."""
+    _purge_expired(db)
+    existing = db.get(IdempotencyKey, (key, user_id))
+    if existing is not None and existing.expires_at < _utcnow():
+        db.delete(existing)
+        db.flush()
+        existing = None
+    if existing is None:
+        db.add(IdempotencyKey(
+            key=key, user_id=user_id, request_hash=request_hash,
+            expires_at=_utcnow() + timedelta(hours=IDEMPOTENCY_TTL_HOURS),
+        ))
+        try:
+            db.commit()
+            return
+        except IntegrityError:
+            # A concurrent request with the same key won the insert
+            db.rollback()
+            existing = db.get(IdempotencyKey, (key, user_id))
+            if existing is None:
+                raise HTTPException(status_code=409, detail="Idempotency-Key is in use, retry later")
+
+    if existing.request_hash != request_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    if existing.status_code is None:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+    raise IdempotentReplay(existing.status_code, existing.response_body)
+
+
+def _release(db: Session, key: str, user_id: int):
+    """Drop the reservation of a request that did not complete (after discarding its changes)."""
+    db.rollback()
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.key == key,
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.status_code == None,
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+async def get_idempotency(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Dependency for POST endpoints; yields None when the client sent no Idempotency-Key.
+
+    Uses the request's own session: the reservation is committed before the
+    endpoint runs, and a release first rolls back whatever the endpoint left
+    open (on SQLite it may still hold the write lock).
+    """
+    if not idempotency_key:
+        yield None
+        return
+    if len(idempotency_key) > 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+
+    body = await request.body()
+    request_hash = hashlib.sha256(f"{request.method} {request.url.path}\n".encode() + body).hexdigest()
+    await run_in_threadpool(_reserve, db, idempotency_key, current_user.id, request_hash)
+
+    context = IdempotencyContext(idempotency_key, current_user.id)
+    try:
+        yield context
+    except Exception:
+        await run_in_threadpool(_release, db, idempotency_key, current_user.id)
+        raise
+    if not context.saved:
+        await run_in_threadpool(_release, db, idempotency_key, current_user.id)
+
+
+def save(db: Session, context: Optional[IdempotencyContext], response, status_code: int = 200):
+    """Store the response for replays; call before the endpoint's commit so both persist together."""
+    if context is None:
+        return
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.key == context.key,
+        IdempotencyKey.user_id == context.user_id,
+    ).update(
+        {"status_code": status_code, "response_body": json.dumps(jsonable_encoder(response), separators=(",", ":"))},
+        synchronize_session=False,
+    )
+    context.saved = True
@@ -0,0 +1,226 @@
+"""
+Minimal in-process metrics in the Prometheus text format.
+
+With several worker processes (gunicorn), a scrape lands on whichever
+worker accepts it. When METRICS_DIR is set (gunicorn.conf.py does), every
+worker writes a snapshot of its values to a file there every
+METRICS_FLUSH_SECONDS, and the scraped worker adds up the snapshots of
+all workers: counters and histograms are summed (including those of
+workers that have exited, so totals never go backwards on a restart),
+gauges are reported per live worker with a `worker` label. Other
+workers' values lag by up to METRICS_FLUSH_SECONDS.
+"""
+import glob
+import json
+import os
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+_registry = []
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, total, values):
+        for key, value in values.items():
+            total[key] = total.get(key, 0) + value
+
+    def render(self, values=None):
+        values = self.snapshot() if values is None else values
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Gauge:
+    """Gauge read from a callback at scrape time."""
+
+    def __init__(self, name: str, help_text: str, callback):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+        _registry.append(self)
+
+    def snapshot(self):
+        return self.callback()
+
+    def render(self, workers=None):
+        """`workers` maps worker pids to values (multi-process); without it, this process's value."""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        if workers is None:
+            lines.append(f"{self.name} {self.callback()}")
+        for pid, value in sorted(workers.items()) if workers else ():
+            lines.append(f"{self.name}{_labels(('worker',), (pid,))} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(series) for key, series in self._series.items()}
+
+    def merge(self, total, values):
+        for key, series in values.items():
+            if key not in total:
+                total[key] = list(series)
+            else:
+                total[key] = [a + b for a, b in zip(total[key], series)]
+
+    def render(self, values=None):
+        values = self.snapshot() if values is None else values
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(values.items()):
+            for bound, count in zip(self.buckets, series):
+                bucket_labels = _labels(self.label_names + ("le",), key + (bound,))
+                lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), key + ('+Inf',))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {series[-1]}")
+        return lines
+
+
+# --- Several worker processes (METRICS_DIR) ---
+
+# One file per worker lifetime: a new worker that gets a recycled pid must
+# not overwrite the totals of the one that exited
+_snapshot_name = None
+_snapshots_started = False
+
+
+def write_snapshot():
+    """Write this process's values to METRICS_DIR (atomically, readers never see half a file)."""
+    global _snapshot_name
+    if _snapshot_name is None:
+        _snapshot_name = f"{os.getpid()}-{time.time_ns()}.json"
+    data = {"pid": os.getpid(), "counters": {}, "histograms": {}, "gauges": {}}
+    for metric in _registry:
+        if isinstance(metric, Gauge):
+            data["gauges"][metric.name] = metric.snapshot()
+        else:
+            section = "counters" if isinstance(metric, Counter) else "histograms"
+            data[section][metric.name] = [[list(key), value] for key, value in metric.snapshot().items()]
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, _snapshot_name)
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+
+def start_snapshots():
+    """Flush this worker's values every METRICS_FLUSH_SECONDS (call once per worker, after the fork)."""
+    global _snapshots_started
+    if not METRICS_DIR:
+        return
+
+    def loop():
+        while True:
+            try:
+                write_snapshot()
+            except Exception as e:
+                print(f"[WARNING] Could not write metrics snapshot: {e}")
+            time.sleep(METRICS_FLUSH_SECONDS)
+
+    _snapshots_started = True
+    threading.Thread(target=loop, name="metrics-snapshot", daemon=True).start()
+
+
+def flush_snapshot():
+    """Final snapshot on application shutdown, so a stopped or recycled worker's last requests are kept."""
+    if _snapshots_started:
+        write_snapshot()
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _render_workers():
+    write_snapshot()
+    snapshots = []
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # Removed while reading
+
+    lines = []
+    for metric in _registry:
+        if isinstance(metric, Gauge):
+            workers = {
+                snapshot["pid"]: snapshot["gauges"][metric.name]
+                for snapshot in snapshots
+                if metric.name in snapshot["gauges"] and _alive(snapshot["pid"])
+            }
+            lines.extend(metric.render(workers))
+            continue
+        section = "counters" if isinstance(metric, Counter) else "histograms"
+        total = {}
+        for snapshot in snapshots:
+            metric.merge(total, {tuple(key): value for key, value in snapshot[section].get(metric.name, ())})
+        lines.extend(metric.render(total))
+    return lines
+
+
+def render_all() -> str:
+    if METRICS_DIR:
+        lines = _render_workers()
+    else:
+        lines = []
+        for metric in _registry:
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
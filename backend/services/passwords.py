@@ -0,0 +1,33 @@
+"""
+Password hashing for bulk operations.
+
+One bcrypt hash takes about 0.3 s of CPU time (cost 12), so hashing the
+initial passwords of a few hundred imported users one after another
+would take minutes. hash_many() spreads them over a process pool
+(PASSWORD_HASH_WORKERS processes, default: CPU count). Every password
+gets its own salt, also when several users start with the same one.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from passlib.context import CryptContext
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "0")) or os.cpu_count() or 1
+POOL_MIN_PASSWORDS = 4  # Below this, starting the pool costs more than it saves
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def hash_many(passwords) -> list:
+    """bcrypt hashes of the given passwords, in order."""
+    passwords = list(passwords)
+    workers = min(PASSWORD_HASH_WORKERS, len(passwords))
+    if workers < 2 or len(passwords) < POOL_MIN_PASSWORDS:
+        return [_hash(password) for password in passwords]
+    # spawn: the API process runs threads (tracing, plan event listener) that must not be forked
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(_hash, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
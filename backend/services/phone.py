@@ -0,0 +1,55 @@
+"""
+Phone numbers in E.164 form (+491711234567).
+
+Users' numbers are pushed to 3CX as call forwarding targets and matched
+against incoming caller ids, so they are stored normalized. Numbers are
+accepted as typed: international ("+49 171 123 45-67", "0049 171 ...")
+or national with trunk prefix ("0171 1234567", country code
+PHONE_DEFAULT_COUNTRY_CODE). Extensions and numbers without either
+prefix are rejected, because it is unclear which country they belong to.
+"""
+import os
+import re
+from typing import Optional
+
+PHONE_DEFAULT_COUNTRY_CODE = os.getenv("PHONE_DEFAULT_COUNTRY_CODE", "49")
+
+E164 = re.compile(r"^\+[1-9]\d{6,14}$")
+_SEPARATORS = re.compile(r"[\s\-./()]")
+
+
+def is_e164(number: Optional[str]) -> bool:
+    return bool(number) and E164.match(number) is not None
+
+
+def normalize(raw: Optional[str]) -> Optional[str]:
+    """E.164 form of `raw`, or None if it cannot be read as a phone number."""
+    if raw is None:
+        return None
+    text = raw.strip().replace("(0)", "")  # "+49 (0)171 ..."
+    digits = _SEPARATORS.sub("", text)
+    if digits.startswith("+"):
+        number = digits
+    elif digits.startswith("00"):
+        number = "+" + digits[2:]
+    elif digits.startswith("0"):
+        number = f"+{PHONE_DEFAULT_COUNTRY_CODE}{digits[1:]}"
+    else:
+        return None
+    # The trunk prefix is not dialled after the country code ("+49 0171 ...")
+    if number.startswith(f"+{PHONE_DEFAULT_COUNTRY_CODE}0"):
+        number = f"+{PHONE_DEFAULT_COUNTRY_CODE}{number[len(PHONE_DEFAULT_COUNTRY_CODE) + 2:]}"
+    return number if is_e164(number) else None
+
+
+def validate(raw: Optional[str]) -> Optional[str]:
+    """Normalized number for schemas; empty means no number, anything unreadable is a ValueError."""
+    if raw is None or not raw.strip():
+        return None
+    number = normalize(raw)
+    if number is None:
+        raise ValueError(
+            f"Invalid phone number '{raw}': use the international format (+49 171 1234567) "
+            "or a national number with leading 0"
+        )
+    return number
@@ -0,0 +1,179 @@
+"""
+Live plan changes for open calendars (GET /plans/stream).
+
+Endpoints publish a delta next to their change. It is delivered only if
+the transaction commits:
+- PostgreSQL: pg_notify() inside the transaction. Every worker LISTENs on
+  one dedicated connection and fans the notifications out to its own
+  subscribers, so planners on different gunicorn workers see each other's
+  changes.
+- Other databases (embedded SQLite, single process): handed to the local
+  subscribers after commit.
+
+Deltas use the tuple format of GET /plans/feed:
+    {"type": "created" | "updated" | "confirmed", "plan": [...], "user": [...]}
+    {"type": "deleted", "id": 12}
+Subscribers that fall behind are disconnected. Clients reload the feed
+after every (re)connect, so no delta is lost to them.
+"""
+import asyncio
+import os
+import select
+import threading
+import time
+from contextlib import contextmanager
+import orjson
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from database import engine
+from models import NotfallPlan, User
+from services.metrics import Counter, Gauge
+
+PLAN_EVENTS_CHANNEL = "plan_events"
+# LISTEN needs a session-level connection; set a direct URL when DATABASE_URL points at PgBouncer in transaction mode
+PLAN_EVENTS_LISTEN_URL = os.getenv("PLAN_EVENTS_LISTEN_URL")
+SUBSCRIBER_QUEUE_SIZE = 100
+
+_subscribers = set()
+_subscribers_lock = threading.Lock()
+_listener = None
+
+PUBLISHED = Counter("plan_events_published_total", "Plan deltas published", labels=("type",))
+DROPPED = Counter("plan_events_dropped_subscribers_total", "Stream subscribers disconnected for falling behind")
+Gauge("plan_events_subscribers", "Open plan streams in this worker", lambda: len(_subscribers))
+
+
+def _delta(db: Session, kind: str, plan: NotfallPlan) -> bytes:
+    if kind == "deleted":
+        return orjson.dumps({"type": kind, "id": plan.id})
+    user = plan.user
+    if user is None or user.id != plan.user_id:
+        user = db.get(User, plan.user_id)  # Reassigned in this transaction
+    return orjson.dumps({
+        "type": kind,
+        "plan": (plan.id, plan.user_id, plan.start_date, plan.end_date, bool(plan.confirmed), plan.version),
+        "user": (user.id, user.username, user.first_name, user.last_name) if user else None,
+    })
+
+
+def publish(db: Session, kind: str, plan: NotfallPlan):
+    """Queue a delta for `plan` (call after flush, before commit); it is sent once the transaction commits."""
+    payload = _delta(db, kind, plan)
+    PUBLISHED.inc(type=kind)
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": PLAN_EVENTS_CHANNEL, "payload": payload.decode()})
+    else:
+        db.info.setdefault("plan_events", []).append(payload)
+
+
+def publish_many(db: Session, kind: str, plans):
+    """publish() for several plans with a single notification statement."""
+    payloads = [_delta(db, kind, plan) for plan in plans]
+    if not payloads:
+        return
+    PUBLISHED.inc(len(payloads), type=kind)
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(
+            text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+            {"channel": PLAN_EVENTS_CHANNEL, "payloads": [payload.decode() for payload in payloads]},
+        )
+    else:
+        db.info.setdefault("plan_events", []).extend(payloads)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_committed(session):
+    for payload in session.info.pop("plan_events", ()):
+        _dispatch(payload)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop("plan_events", None)
+
+
+# --- Subscribers (one per open stream, living on the worker's event loop) ---
+
+class Subscriber:
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def offer(self, payload):
+        """Runs on the subscriber's loop."""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            # The stream closes after the queued deltas, the client reconnects and reloads
+            DROPPED.inc()
+            self.overflowed = True
+
+
+def _dispatch(payload: bytes):
+    """Hand a delta to every subscriber of this worker (thread-safe)."""
+    with _subscribers_lock:
+        subscribers = list(_subscribers)
+    for subscriber in subscribers:
+        try:
+            subscriber.loop.call_soon_threadsafe(subscriber.offer, payload)
+        except RuntimeError:
+            pass  # Loop already closed (worker shutting down)
+
+
+@contextmanager
+def subscribe():
+    """Register the calling coroutine's stream; yields the Subscriber whose queue receives the deltas."""
+    _ensure_listener()
+    subscriber = Subscriber(asyncio.get_running_loop())
+    with _subscribers_lock:
+        _subscribers.add(subscriber)
+    try:
+        yield subscriber
+    finally:
+        with _subscribers_lock:
+            _subscribers.discard(subscriber)
+
+
+# --- PostgreSQL LISTEN ---
+
+def _listen_forever():
+    """Forward notifications on PLAN_EVENTS_CHANNEL to the local subscribers; reconnects on errors."""
+    url = make_url(PLAN_EVENTS_LISTEN_URL) if PLAN_EVENTS_LISTEN_URL else engine.url
+    cargs, cparams = engine.dialect.create_connect_args(url)
+    while True:
+        conn = None
+        try:
+            conn = engine.dialect.loaded_dbapi.connect(*cargs, **cparams)
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {PLAN_EVENTS_CHANNEL}")
+            print(f"[EVENTS] Listening on {PLAN_EVENTS_CHANNEL}")
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    _dispatch(conn.notifies.pop(0).payload.encode())
+        except Exception as e:
+            print(f"[EVENTS] Listener failed, reconnecting: {e}")
+            time.sleep(5)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+
+def _ensure_listener():
+    """Start this worker's LISTEN thread with its first subscriber (after the gunicorn fork)."""
+    global _listener
+    if engine.dialect.name != "postgresql":
+        return
+    with _subscribers_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(target=_listen_forever, name="plan-events-listener", daemon=True)
+            _listener.start()
@@ -0,0 +1,104 @@
+from datetime import datetime, timezone
+from sqlalchemy import func, insert, or_, literal
+from sqlalchemy.orm import Session
+from models import NotfallPlan, NotfallPlanHistory
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _close_open_version(db: Session, plan_id: int, now: datetime):
+    db.query(NotfallPlanHistory).filter(
+        NotfallPlanHistory.plan_id == plan_id,
+        NotfallPlanHistory.sys_to == None
+    ).update({NotfallPlanHistory.sys_to: now}, synchronize_session=False)
+
+
+def record_version(db: Session, plan: NotfallPlan, changed_by: str = None):
+    """Close the current version of the plan and add its new state (plan must have an id)."""
+    now = _now()
+    _close_open_version(db, plan.id, now)
+    db.add(NotfallPlanHistory(
+        plan_id=plan.id,
+        user_id=plan.user_id,
+        start_date=plan.start_date,
+        end_date=plan.end_date,
+        confirmed=bool(plan.confirmed),
+        changed_by=changed_by,
+        sys_from=now,
+    ))
+
+
+def record_new_plans(db: Session, plans, changed_by: str = None):
+    """First versions of newly inserted plans, in one multi-row INSERT (plans must have ids)."""
+    now = _now()
+    rows = [{
+        "plan_id": plan.id,
+        "user_id": plan.user_id,
+        "start_date": plan.start_date,
+        "end_date": plan.end_date,
+        "confirmed": bool(plan.confirmed),
+        "changed_by": changed_by,
+        "sys_from": now,
+    } for plan in plans]
+    if rows:
+        db.execute(insert(NotfallPlanHistory), rows)
+
+
+def record_deletion(db: Session, plan_id: int):
+    """Close the current version of a deleted plan."""
+    _close_open_version(db, plan_id, _now())
+
+
+def backfill_history(db: Session) -> int:
+    """Give every existing plan an open version starting at its creation time."""
+    count = 0
+    for plan in db.query(NotfallPlan).all():
+        db.add(NotfallPlanHistory(
+            plan_id=plan.id,
+            user_id=plan.user_id,
+            start_date=plan.start_date,
+            end_date=plan.end_date,
+            confirmed=bool(plan.confirmed),
+            changed_by=plan.created_by,
+            sys_from=plan.created_at or _now(),
+        ))
+        count += 1
+    db.commit()
+    return count
+
+
+def versions_at(db: Session, at: datetime, as_of: datetime = None, confirmed_only: bool = True):
+    """
+    Plan versions covering duty time `at`, as recorded at knowledge time `as_of` (default now).
+
+    On Postgres the range containment predicates match the GiST index on
+    (tsrange(start_date, end_date), tstzrange(sys_from, sys_to)).
+    """
+    as_of = as_of or _now()
+    query = db.query(NotfallPlanHistory)
+
+    if db.get_bind().dialect.name == "postgresql":
+        query = query.filter(
+            func.tsrange(NotfallPlanHistory.start_date, NotfallPlanHistory.end_date).op("@>")(literal(at)),
+            func.tstzrange(NotfallPlanHistory.sys_from, NotfallPlanHistory.sys_to).op("@>")(literal(as_of)),
+        )
+    else:
+        query = query.filter(
+            NotfallPlanHistory.start_date <= at,
+            NotfallPlanHistory.end_date > at,
+            NotfallPlanHistory.sys_from <= as_of,
+            or_(NotfallPlanHistory.sys_to == None, NotfallPlanHistory.sys_to > as_of),
+        )
+    if confirmed_only:
+        query = query.filter(NotfallPlanHistory.confirmed == True)
+
+    return query.order_by(NotfallPlanHistory.start_date).all()
+
+
+def plan_versions(db: Session, plan_id: int):
+    """All versions of one plan, oldest first."""
+    return db.query(NotfallPlanHistory).filter(
+        NotfallPlanHistory.plan_id == plan_id
+    ).order_by(NotfallPlanHistory.sys_from, NotfallPlanHistory.id).all()
@@ -0,0 +1,134 @@
+"""
+Per-request timing: latency, SQL statements and DB time, outbound Graph
+time and response size, recorded per route on /metrics.
+
+SQL is counted with engine events on every Engine (primary and replicas);
+sync endpoints run in the threadpool with a copy of the request context,
+so they add to the same RequestStats object as the middleware sees.
+"""
+import os
+import time
+from collections import Counter as StatementCounter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from services.metrics import Counter, Histogram
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))  # Same statement this often in one request
+
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+REQUESTS = Counter("http_requests_total", "Requests by route and status", labels=("method", "route", "status"))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency", labels=("method", "route"))
+REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements", "SQL statements per request", labels=("method", "route"), buckets=COUNT_BUCKETS
+)
+REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "Time in SQL statements per request", labels=("method", "route"))
+REQUEST_GRAPH_SECONDS = Histogram("http_request_graph_seconds", "Time in MS Graph calls per request", labels=("method", "route"))
+RESPONSE_BYTES = Histogram("http_response_size_bytes", "Response body size", labels=("method", "route"), buckets=SIZE_BUCKETS)
+GRAPH_SECONDS = Histogram("graph_call_duration_seconds", "MS Graph calls", labels=("operation",))
+SLOW_REQUESTS = Counter("http_slow_requests_total", "Requests above SLOW_REQUEST_MS", labels=("method", "route"))
+N_PLUS_ONE = Counter("http_n_plus_one_total", "Requests repeating one statement N_PLUS_ONE_THRESHOLD+ times", labels=("method", "route"))
+
+
+class RequestStats:
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.graph_calls = 0
+        self.graph_seconds = 0.0
+        self.statements = StatementCounter()
+
+
+_current = ContextVar("request_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.pop("query_started", None)
+    if stats is None or started is None:
+        return
+    stats.sql_count += 1
+    stats.sql_seconds += time.perf_counter() - started
+    stats.statements[statement] += 1
+
+
+@contextmanager
+def track_graph_call(operation: str):
+    """Time an outbound MS Graph call (token, create_event, ...)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        GRAPH_SECONDS.observe(elapsed, operation=operation)
+        stats = _current.get()
+        if stats is not None:
+            stats.graph_calls += 1
+            stats.graph_seconds += elapsed
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording the measurements of each HTTP request under its route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        response = {"status": 500, "bytes": 0, "streaming": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["streaming"] = any(
+                    name == b"content-type" and value.startswith(b"text/event-stream") for name, value in message.get("headers", [])
+                )
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            self._record(scope, stats, time.perf_counter() - started, response)
+
+    def _record(self, scope, stats: RequestStats, elapsed: float, response: dict):
+        method = scope["method"]
+        route = getattr(scope.get("route"), "path", None) or "unmatched"
+        REQUESTS.inc(method=method, route=route, status=response["status"])
+        REQUEST_SECONDS.observe(elapsed, method=method, route=route)
+        REQUEST_SQL_STATEMENTS.observe(stats.sql_count, method=method, route=route)
+        REQUEST_DB_SECONDS.observe(stats.sql_seconds, method=method, route=route)
+        REQUEST_GRAPH_SECONDS.observe(stats.graph_seconds, method=method, route=route)
+        RESPONSE_BYTES.observe(response["bytes"], method=method, route=route)
+
+        # Event streams stay open by design
+        if elapsed * 1000 >= SLOW_REQUEST_MS and not response["streaming"]:
+            SLOW_REQUESTS.inc(method=method, route=route)
+            print(
+                f"[PERF] Slow request {method} {route}: {elapsed * 1000:.0f} ms "
+                f"(sql {stats.sql_count}x / {stats.sql_seconds * 1000:.0f} ms, "
+                f"graph {stats.graph_calls}x / {stats.graph_seconds * 1000:.0f} ms, {response['bytes']} bytes)"
+            )
+        if stats.statements:
+            statement, count = stats.statements.most_common(1)[0]
+            if count >= N_PLUS_ONE_THRESHOLD:
+                N_PLUS_ONE.inc(method=method, route=route)
+                print(f"[PERF] Possible N+1 in {method} {route}: {count}x {' '.join(statement.split())[:200]}")
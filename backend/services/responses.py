@@ -0,0 +1,21 @@
+"""
+Compact JSON responses for large, frequently polled payloads.
+
+The body is serialized with orjson and tagged with a content-hash ETag (a
+matching If-None-Match gets an empty 304). Compression is left to
+services/compression.py like for every other response.
+"""
+import hashlib
+import orjson
+from fastapi import Request, Response
+
+
+def compact_json_response(request: Request, payload) -> Response:
+    body = orjson.dumps(payload)
+    etag = f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+    # Browsers revalidate on every fetch and reuse their cached copy on 304
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+
+    if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
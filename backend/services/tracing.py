@@ -0,0 +1,175 @@
+"""
+OpenTelemetry tracing for the API.
+
+One server span per HTTP request (continuing a W3C `traceparent` from the
+caller; FastAPI's native telemetry adds dependency/endpoint spans where
+available), child spans for every SQL statement and MS Graph call. The trace
+id is returned as X-Trace-Id and stored on audit rows.
+
+Exporter (OTEL_TRACES_EXPORTER):
+- none (default): spans are created for trace ids but not exported
+- console: print spans to stdout
+- file: append spans as JSON lines to OTEL_TRACES_FILE
+- otlp: OTLP/HTTP to OTEL_EXPORTER_OTLP_ENDPOINT (needs opentelemetry-exporter-otlp-proto-http)
+- package.module:factory: any callable returning a SpanExporter
+
+scheduler/tracing.py carries copies of the exporter setup and the SQL span
+listeners (the scheduler image has no backend code); keep them in sync.
+"""
+import importlib
+import os
+import threading
+from opentelemetry import context as otel_context
+from opentelemetry import trace
+from opentelemetry.propagate import extract
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SpanExporter, SpanExportResult
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "emergency-backend")
+OTEL_TRACES_EXPORTER = os.getenv("OTEL_TRACES_EXPORTER", "none")
+OTEL_TRACES_FILE = os.getenv("OTEL_TRACES_FILE", "traces.jsonl")
+
+tracer = trace.get_tracer("emergency-service")
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends finished spans as one JSON object per line (for offline analysis)."""
+
+    def __init__(self, path: str = OTEL_TRACES_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        lines = [span.to_json(indent=None) + "\n" for span in spans]
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+def make_exporter(name: str = OTEL_TRACES_EXPORTER):
+    if name in ("", "none"):
+        return None
+    if name == "console":
+        return ConsoleSpanExporter()
+    if name == "file":
+        return FileSpanExporter()
+    if name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    module_name, _, factory = name.partition(":")
+    return getattr(importlib.import_module(module_name), factory)()
+
+
+def setup_tracing(service_name: str = OTEL_SERVICE_NAME):
+    """Install the tracer provider (once per process, before the first request)."""
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    exporter = make_exporter()
+    if exporter is not None:
+        # The batch worker thread is restarted in forked gunicorn workers by the SDK
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    print(f"[TRACING] {service_name}: exporter {OTEL_TRACES_EXPORTER}")
+
+
+def current_trace_ids():
+    """(trace_id, span_id) of the active span as hex strings, or (None, None)."""
+    span_context = trace.get_current_span().get_span_context()
+    if not span_context.is_valid:
+        return None, None
+    return format(span_context.trace_id, "032x"), format(span_context.span_id, "016x")
+
+
+# --- SQLAlchemy: one client span per statement inside a traced operation ---
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_db_span(conn, cursor, statement, parameters, context, executemany):
+    if not trace.get_current_span().is_recording():
+        return  # Startup, migrations and other untraced work
+    operation = statement.split(None, 1)[0].upper() if statement else "SQL"
+    conn.info["otel_span"] = tracer.start_span(
+        f"db {operation}",
+        kind=SpanKind.CLIENT,
+        attributes={"db.system": conn.dialect.name, "db.statement": statement[:2000]},
+    )
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_db_span(conn, cursor, statement, parameters, context, executemany):
+    span = conn.info.pop("otel_span", None)
+    if span is not None:
+        span.end()
+
+
+@event.listens_for(Engine, "handle_error")
+def _fail_db_span(exception_context):
+    connection = exception_context.connection
+    span = connection.info.pop("otel_span", None) if connection is not None else None
+    if span is not None:
+        span.record_exception(exception_context.original_exception)
+        span.set_status(Status(StatusCode.ERROR))
+        span.end()
+
+
+# --- HTTP server spans ---
+
+class TracingMiddleware:
+    """
+    ASGI middleware for the server span of each request, named after its route template.
+
+    Recent FastAPI versions open the server span themselves once a tracer
+    provider is installed; then that span is reused and only X-Trace-Id is
+    added, so every request has exactly one trace.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        span = trace.get_current_span()
+        token = None
+        if not span.is_recording():
+            headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+            parent = extract(headers)
+            span = tracer.start_span(f"{method} {scope['path']}", context=parent, kind=SpanKind.SERVER)
+            span.set_attribute("http.request.method", method)
+            token = otel_context.attach(trace.set_span_in_context(span, parent))
+        trace_id = format(span.get_span_context().trace_id, "032x")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                if token is not None:
+                    span.set_attribute("http.response.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.set_status(Status(StatusCode.ERROR))
+                message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", trace_id.encode())]
+            await send(message)
+
+        if token is None:
+            await self.app(scope, receive, send_wrapper)
+            return
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            span.record_exception(e)
+            span.set_status(Status(StatusCode.ERROR))
+            raise
+        finally:
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                span.update_name(f"{method} {route}")
+                span.set_attribute("http.route", route)
+            otel_context.detach(token)
+            span.end()
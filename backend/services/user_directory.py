@@ -0,0 +1,102 @@
+"""
+User search for the admin directory and the cached duty-eligible list.
+
+Search matches every word of the query as a case-insensitive substring of
+"username first_name last_name email" (SEARCH_TEXT). On PostgreSQL a
+pg_trgm GIN index on exactly this expression serves the LIKE filters
+(migration 0007); SQLite scans the table, which is fine at its scale.
+
+The duty-eligible list is read by every calendar load. It is cached per
+worker together with a fingerprint of the users table (row count, highest
+id, sum of row versions). Creating or deleting a user and every update
+through the API (which bumps the row version) change the fingerprint, so
+writes from any worker or script invalidate the cache, at the cost of one
+single-row aggregate per request.
+
+The caller map resolves incoming caller ids for 3CX (GET /3cx/lookup) with
+a dict lookup on the E.164 number. 3CX asks on every ringing call, so the
+fingerprint is checked at most every CALLER_LOOKUP_RECHECK_SECONDS instead
+of per call; a changed number is found after that delay at the latest.
+"""
+import os
+import threading
+import time
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import User
+from schemas import UserSimple
+from services import phone
+
+# Keep in sync with the index expression in migrations/versions/0007
+SEARCH_TEXT = func.lower(User.username + " " + User.first_name + " " + User.last_name + " " + User.email)
+
+CALLER_LOOKUP_RECHECK_SECONDS = float(os.getenv("CALLER_LOOKUP_RECHECK_SECONDS", "10"))
+
+_duty_eligible_cache = None  # (fingerprint, [UserSimple, ...])
+_caller_map = None  # (fingerprint, {E.164 number: [contact, ...]})
+_caller_map_checked = 0.0
+_caller_map_lock = threading.Lock()
+
+
+def search_filters(q: str) -> list:
+    """One LIKE filter per word of `q`; all of them must match."""
+    filters = []
+    for word in q.lower().split():
+        escaped = word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        filters.append(SEARCH_TEXT.like(f"%{escaped}%", escape="\\"))
+    return filters
+
+
+def _fingerprint(db: Session):
+    return tuple(db.query(func.count(User.id), func.max(User.id), func.sum(User.version)).one())
+
+
+def duty_eligible_users(db: Session) -> list:
+    """Active users who can take duty (planners always can), by name."""
+    global _duty_eligible_cache
+    fingerprint = _fingerprint(db)
+    if _duty_eligible_cache is not None and _duty_eligible_cache[0] == fingerprint:
+        return _duty_eligible_cache[1]
+
+    users = db.query(User).filter(
+        User.is_active == True,
+        (User.can_take_duty == True) | (User.role == "planner")
+    ).order_by(User.last_name, User.first_name, User.id).all()
+    result = [UserSimple.model_validate(user) for user in users]
+    _duty_eligible_cache = (fingerprint, result)
+    return result
+
+
+def _contact(user: User) -> dict:
+    return {
+        "id": user.id,
+        "firstname": user.first_name,
+        "lastname": user.last_name,
+        "email": user.email,
+        "mobilephone": user.phone_number,
+    }
+
+
+def _current_caller_map(db: Session) -> dict:
+    global _caller_map, _caller_map_checked
+    with _caller_map_lock:
+        now = time.monotonic()
+        if _caller_map is not None and now - _caller_map_checked < CALLER_LOOKUP_RECHECK_SECONDS:
+            return _caller_map[1]
+        fingerprint = _fingerprint(db)
+        _caller_map_checked = now
+        if _caller_map is None or _caller_map[0] != fingerprint:
+            numbers = {}
+            users = db.query(User).filter(User.is_active == True, User.phone_number.isnot(None)).order_by(User.id).all()
+            for user in users:
+                numbers.setdefault(user.phone_number, []).append(_contact(user))
+            _caller_map = (fingerprint, numbers)
+        return _caller_map[1]
+
+
+def lookup_caller(db: Session, number: str) -> list:
+    """Active users whose phone number matches the caller id `number` (any spelling)."""
+    normalized = phone.normalize(number)
+    if normalized is None:
+        return []
+    return _current_caller_map(db).get(normalized, [])
@@ -0,0 +1,232 @@
+"""
+Bulk user import from CSV or a directory export (POST /users/import, import_users.py).
+
+Accepted input:
+- CSV with a header row, separated by ";" or ",". Columns are matched by
+  name (our field names, German labels, or Entra ID/Graph attribute names
+  like userPrincipalName, givenName, surname, mail, mobilePhone).
+- JSON: a list of user objects or a Graph response ({"value": [...]}).
+
+Rows are matched to existing users by username, then by email, with a
+single lookup. Matched users get the non-empty columns of their row
+(username and password are never changed); the others are created. The
+initial password comes from a password column or `default_password`.
+Every new user's password is hashed with its own salt, spread over a
+process pool (services/passwords.py).
+
+An import is all or nothing: any invalid row rejects the whole file.
+Users and audit entries are written with multi-row statements in one
+transaction.
+"""
+import csv
+import io
+import json
+from pydantic import BaseModel, EmailStr, ValidationError
+from sqlalchemy import bindparam, insert, or_, update
+from sqlalchemy.orm import Session
+from typing import Optional
+from models import User
+from schemas import PhoneNumber
+from services import audit_service, passwords
+from services.audit_service import USER_FIELDS
+
+ROLES = ("admin", "planner", "buchhaltung")
+UPDATABLE_FIELDS = tuple(field for field in USER_FIELDS if field != "username")
+
+# Normalized column name (lower case, no spaces, "_" or "-") -> field
+COLUMN_ALIASES = {
+    "username": "username", "benutzername": "username", "mailnickname": "username", "samaccountname": "username",
+    "email": "email", "mail": "email", "emailaddress": "email",
+    "userprincipalname": "user_principal_name",
+    "firstname": "first_name", "vorname": "first_name", "givenname": "first_name",
+    "lastname": "last_name", "nachname": "last_name", "surname": "last_name", "sn": "last_name",
+    "phonenumber": "phone_number", "phone": "phone_number", "telefon": "phone_number",
+    "mobile": "phone_number", "mobilephone": "phone_number", "mobil": "phone_number", "businessphones": "phone_number",
+    "role": "role", "rolle": "role",
+    "isactive": "is_active", "active": "is_active", "aktiv": "is_active", "accountenabled": "is_active",
+    "cantakeduty": "can_take_duty", "bereitschaft": "can_take_duty",
+    "password": "password", "passwort": "password", "initialpassword": "password",
+}
+BOOLEAN_WORDS = {"ja": "true", "nein": "false", "x": "true"}
+
+
+class ImportRow(BaseModel):
+    username: str
+    email: EmailStr
+    first_name: str
+    last_name: str
+    phone_number: PhoneNumber = None
+    role: Optional[str] = None
+    is_active: Optional[bool] = None
+    can_take_duty: Optional[bool] = None
+    password: Optional[str] = None
+
+
+def _normalize_column(name: str) -> str:
+    return "".join(ch for ch in str(name).lower() if ch not in " _-")
+
+
+def _clean(record: dict) -> dict:
+    """Map columns to fields and drop empty cells."""
+    row = {}
+    for column, value in record.items():
+        field = COLUMN_ALIASES.get(_normalize_column(column))
+        if field is None or field in row:
+            continue
+        if isinstance(value, list):  # Graph: businessPhones
+            value = value[0] if value else None
+        if value is None:
+            continue
+        value = str(value).strip() if not isinstance(value, bool) else value
+        if value == "":
+            continue
+        if field in ("is_active", "can_take_duty") and isinstance(value, str):
+            value = BOOLEAN_WORDS.get(value.lower(), value)
+        row[field] = value
+
+    upn = row.pop("user_principal_name", None)
+    if upn:
+        row.setdefault("username", upn.split("@")[0])
+        row.setdefault("email", upn)
+    return row
+
+
+def parse(content: str, fmt: Optional[str] = None) -> list:
+    """[(line or item number, field dict)] of the file's users."""
+    content = content.lstrip("\ufeff")  # Excel BOM
+    if fmt is None:
+        fmt = "json" if content.lstrip()[:1] in ("[", "{") else "csv"
+    if fmt == "json":
+        data = json.loads(content)
+        if isinstance(data, dict):
+            data = data.get("value", [])
+        return [(number, _clean(item)) for number, item in enumerate(data, start=1) if isinstance(item, dict)]
+    if fmt != "csv":
+        raise ValueError(f"Unknown format: {fmt}")
+
+    dialect = csv.Sniffer().sniff(content[:4096], delimiters=";,\t")
+    reader = csv.DictReader(io.StringIO(content), dialect=dialect)
+    return [(reader.line_num, _clean(record)) for record in reader if any(record.values())]
+
+
+def _error(line, message: str) -> dict:
+    return {"line": line, "error": message}
+
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in exc.errors())
+
+
+def import_users(db: Session, actor, content: str, fmt: Optional[str] = None,
+                 default_password: Optional[str] = None, dry_run: bool = False) -> dict:
+    """
+    Create or update the file's users in the caller's transaction (nothing
+    is written when `dry_run` is set or any row is invalid).
+
+    Returns {"created", "updated", "unchanged", "dry_run", "errors"}; the
+    counts are only meaningful when "errors" is empty.
+    """
+    result = {"created": 0, "updated": 0, "unchanged": 0, "dry_run": dry_run, "errors": []}
+    errors = result["errors"]
+    try:
+        records = parse(content, fmt)
+    except (ValueError, csv.Error) as e:
+        errors.append(_error(None, f"Unreadable file: {e}"))
+        return result
+
+    rows = []
+    seen = {}
+    for line, record in records:
+        try:
+            row = ImportRow.model_validate(record)
+        except ValidationError as e:
+            errors.append(_error(line, _validation_message(e)))
+            continue
+        if row.role is not None and row.role not in ROLES:
+            errors.append(_error(line, f"Unknown role '{row.role}' (expected one of {', '.join(ROLES)})"))
+            continue
+        for key in (("username", row.username), ("email", row.email)):
+            if key in seen:
+                errors.append(_error(line, f"Duplicate {key[0]} '{key[1]}' (also in line {seen[key]})"))
+            seen.setdefault(key, line)
+        rows.append((line, row))
+    if not rows:
+        if not errors:
+            errors.append(_error(None, "No users found in the file"))
+        return result
+
+    # One lookup for all rows
+    existing = db.query(User).filter(or_(
+        User.username.in_([row.username for _, row in rows]),
+        User.email.in_([row.email for _, row in rows]),
+    )).all()
+    by_username = {user.username: user for user in existing}
+    by_email = {user.email: user for user in existing}
+
+    new_rows, changes = [], []
+    for line, row in rows:
+        user = by_username.get(row.username)
+        other = by_email.get(row.email)
+        if user is not None and other is not None and user is not other:
+            errors.append(_error(line, f"Username belongs to '{user.username}', email to '{other.username}'"))
+            continue
+        user = user or other
+        if user is None:
+            if not (row.password or default_password):
+                errors.append(_error(line, "New user needs a password column or a default password"))
+                continue
+            new_rows.append(row)
+            continue
+
+        provided = {field: getattr(row, field) for field in UPDATABLE_FIELDS if field in row.model_fields_set}
+        old_values = audit_service.snapshot(user, UPDATABLE_FIELDS)
+        old_changed, new_changed = audit_service.diff(old_values, {**old_values, **provided})
+        if new_changed:
+            changes.append((user, old_changed, new_changed))
+        else:
+            result["unchanged"] += 1
+    if errors:
+        errors.sort(key=lambda error: error["line"] or 0)
+        return result
+
+    result["created"] = len(new_rows)
+    result["updated"] = len(changes)
+    if dry_run:
+        return result
+
+    hashes = passwords.hash_many([row.password or default_password for row in new_rows])
+    with audit_service.AuditBatch(db, actor) as audit:
+        if new_rows:
+            values = [{
+                "username": row.username,
+                "email": row.email,
+                "password_hash": password_hash,
+                "first_name": row.first_name,
+                "last_name": row.last_name,
+                "phone_number": row.phone_number,
+                "role": row.role or "planner",
+                "is_active": True if row.is_active is None else row.is_active,
+                "can_take_duty": True if row.can_take_duty is None else row.can_take_duty,
+                "version": 1,
+            } for row, password_hash in zip(new_rows, hashes)]
+            db.execute(insert(User), values)
+            # Ids in one query (RETURNING with executemany falls back to single-row INSERTs on SQLite)
+            ids = dict(db.query(User.username, User.id).filter(User.username.in_([value["username"] for value in values])).all())
+            for value in values:
+                audit.record("CREATE", "users", ids[value["username"]], new_value={field: value[field] for field in USER_FIELDS})
+
+        # One UPDATE statement per set of changed columns; every update bumps the row version
+        by_columns = {}
+        for user, old_changed, new_changed in changes:
+            by_columns.setdefault(tuple(sorted(new_changed)), []).append(
+                {"user_id": user.id, **{f"new_{column}": value for column, value in new_changed.items()}}
+            )
+            audit.record("UPDATE", "users", user.id, old_value=old_changed, new_value=new_changed)
+        for columns, params in by_columns.items():
+            db.execute(
+                update(User.__table__)
+                .where(User.__table__.c.id == bindparam("user_id"))
+                .values(version=User.__table__.c.version + 1, **{column: bindparam(f"new_{column}") for column in columns}),
+                params,
+            )
+    return result
@@ -0,0 +1,81 @@
+"""
+Test databases: a migrated SQLite file always, and PostgreSQL when
+TEST_POSTGRES_URL points at an empty database (it is migrated here).
+`client` runs the API against them, logged in as an admin.
+
+Run from backend/: python -m pytest tests
+"""
+import os
+import subprocess
+import sys
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+def _migrate(url: str):
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        cwd=BACKEND_DIR, env={**os.environ, "DATABASE_URL": url}, check=True, capture_output=True,
+    )
+
+
+@pytest.fixture(scope="session", params=["sqlite", "postgresql"])
+def migrated_engine(request, tmp_path_factory):
+    """Engine on a database at the head revision, once per backend."""
+    if request.param == "sqlite":
+        url = f"sqlite:///{tmp_path_factory.mktemp('db') / 'test.db'}"
+    elif TEST_POSTGRES_URL:
+        url = TEST_POSTGRES_URL
+    else:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    _migrate(url)
+    engine = create_engine(url)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def db_session(migrated_engine):
+    """Session factory on the test database, for arranging and checking rows next to the API."""
+    return sessionmaker(bind=migrated_engine, autoflush=False)
+
+
+@pytest.fixture(scope="module")
+def client(migrated_engine, db_session):
+    """TestClient of the app on the test database, with an admin's bearer token in `client.headers`."""
+    from fastapi.testclient import TestClient
+    from database import get_db, get_read_db
+    from main import app
+    from models import User
+    from routers.auth import get_password_hash
+
+    def get_test_db():
+        db = db_session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    with db_session() as db:
+        if not db.query(User).filter(User.username == "test-admin").first():
+            db.add(User(
+                username="test-admin", email="test-admin@example.com", password_hash=get_password_hash("secret"),
+                first_name="Test", last_name="Admin", role="admin", can_take_duty=False,
+            ))
+            db.commit()
+
+    app.dependency_overrides[get_db] = get_test_db
+    app.dependency_overrides[get_read_db] = get_test_db
+    try:
+        with TestClient(app) as test_client:
+            token = test_client.post("/auth/token", data={"username": "test-admin", "password": "secret"}).json()["access_token"]
+            test_client.headers["Authorization"] = f"Bearer {token}"
+            yield test_client
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,97 @@
+"""
+Optimistic concurrency (services/concurrency.py): edits based on an
+outdated version (If-Match or `version` in the body) are answered with 409
+and the current row, also when the row changes between loading and
+writing, and leave the row as it was.
+"""
+import itertools
+from datetime import datetime, timedelta
+import pytest
+from models import NotfallPlan
+from routers import plans
+
+
+@pytest.fixture(scope="module")
+def user_id(client):
+    response = client.post("/users/", json={
+        "username": "occ-duty", "email": "occ-duty@example.com", "password": "secret",
+        "first_name": "Otto", "last_name": "Concurrent",
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+_weeks = itertools.count()
+
+
+@pytest.fixture
+def plan(client, user_id):
+    # A week of its own per test, after the other modules' plans
+    start = datetime(2032, 1, 5) + timedelta(weeks=next(_weeks))
+    response = client.post("/plans/", json={
+        "start_date": start.isoformat(), "end_date": (start + timedelta(weeks=1)).isoformat(), "user_id": user_id,
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_update_with_current_etag_succeeds(client, plan):
+    response = client.put(f"/plans/{plan['id']}", json={"confirmed": False}, headers={"If-Match": f'"{plan["version"]}"'})
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] == f'"{plan["version"] + 1}"'
+
+
+def test_update_with_outdated_etag_conflicts(client, db_session, plan):
+    end = datetime.fromisoformat(plan["end_date"])
+    assert client.put(f"/plans/{plan['id']}", json={"end_date": (end - timedelta(hours=1)).isoformat()}).status_code == 200
+
+    stale = client.put(f"/plans/{plan['id']}", json={"end_date": (end - timedelta(hours=2)).isoformat()},
+                       headers={"If-Match": f'W/"{plan["version"]}"'})
+    assert stale.status_code == 409
+    assert stale.json()["current"]["version"] == plan["version"] + 1
+    assert stale.headers["ETag"] == f'"{plan["version"] + 1}"'
+    with db_session() as db:
+        assert db.get(NotfallPlan, plan["id"]).end_date == end - timedelta(hours=1)
+
+
+def test_outdated_body_version_conflicts(client, plan):
+    assert client.put(f"/plans/{plan['id']}", json={"confirmed": False}).status_code == 200
+    stale = client.put(f"/plans/{plan['id']}", json={"confirmed": False, "version": plan["version"]})
+    assert stale.status_code == 409
+
+
+def test_change_between_load_and_write_conflicts(client, db_session, plan, monkeypatch):
+    sync_plan_days = plans.sync_plan_days
+
+    def concurrent_edit(db_plan):
+        with db_session() as other:
+            other.get(NotfallPlan, db_plan.id).version += 1
+            other.commit()
+        sync_plan_days(db_plan)
+
+    monkeypatch.setattr(plans, "sync_plan_days", concurrent_edit)
+    response = client.put(f"/plans/{plan['id']}", json={"confirmed": False}, headers={"If-Match": f'"{plan["version"]}"'})
+    assert response.status_code == 409
+    assert response.json()["current"]["version"] == plan["version"] + 1
+
+
+def test_delete_with_outdated_etag_conflicts(client, db_session, plan):
+    assert client.put(f"/plans/{plan['id']}", json={"confirmed": False}).status_code == 200
+    response = client.delete(f"/plans/{plan['id']}", headers={"If-Match": f'"{plan["version"]}"'})
+    assert response.status_code == 409
+    with db_session() as db:
+        assert db.get(NotfallPlan, plan["id"]) is not None
+
+
+def test_invalid_if_match_is_rejected(client, plan):
+    response = client.put(f"/plans/{plan['id']}", json={"confirmed": False}, headers={"If-Match": "yesterday"})
+    assert response.status_code == 400
+
+
+def test_user_update_with_outdated_etag_conflicts(client, user_id):
+    etag = client.get(f"/users/{user_id}").headers["ETag"]
+    assert client.put(f"/users/{user_id}", json={"first_name": "Otto"}, headers={"If-Match": etag}).status_code == 200
+
+    stale = client.put(f"/users/{user_id}", json={"first_name": "Ottokar"}, headers={"If-Match": etag})
+    assert stale.status_code == 409
+    assert stale.json()["current"]["first_name"] == "Otto"
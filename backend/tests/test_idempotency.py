@@ -0,0 +1,117 @@
+"""
+Idempotency-Key on POST endpoints (services/idempotency.py): reserve and
+commit before the endpoint runs, replay the stored response, release the
+key when the request fails or stores no response, reject reuse with a
+different body, purge expired keys.
+"""
+from datetime import datetime, timedelta
+import pytest
+from models import IdempotencyKey, NotfallPlan, User
+from routers import plans
+from services import idempotency
+
+
+@pytest.fixture(scope="module")
+def user_id(client):
+    response = client.post("/users/", json={
+        "username": "idem-duty", "email": "idem-duty@example.com", "password": "secret",
+        "first_name": "Ida", "last_name": "Duty",
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def plan_body(user_id, week):
+    start = datetime(2031, 1, 6) + timedelta(weeks=week)
+    return {"start_date": start.isoformat(), "end_date": (start + timedelta(weeks=1)).isoformat(), "user_id": user_id}
+
+
+def key_row(db_session, key):
+    with db_session() as db:
+        return db.query(IdempotencyKey).filter(IdempotencyKey.key == key).first()
+
+
+def test_retry_replays_the_stored_response(client, db_session, user_id):
+    body = plan_body(user_id, 0)
+    first = client.post("/plans/", json=body, headers={"Idempotency-Key": "replay"})
+    assert first.status_code == 200, first.text
+    assert "Idempotent-Replayed" not in first.headers
+
+    retry = client.post("/plans/", json=body, headers={"Idempotency-Key": "replay"})
+    assert retry.status_code == 200
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    with db_session() as db:
+        assert db.query(NotfallPlan).filter(NotfallPlan.start_date == datetime.fromisoformat(body["start_date"])).count() == 1
+
+
+def test_key_is_committed_before_the_endpoint_runs(client, db_session, user_id, monkeypatch):
+    seen = []
+    check_routable_phone = plans.check_routable_phone
+
+    def look_from_another_session(user: User):
+        row = key_row(db_session, "reserved")
+        seen.append(row and (row.request_hash is not None, row.status_code))
+        check_routable_phone(user)
+
+    monkeypatch.setattr(plans, "check_routable_phone", look_from_another_session)
+    response = client.post("/plans/", json=plan_body(user_id, 1), headers={"Idempotency-Key": "reserved"})
+    assert response.status_code == 200, response.text
+    assert seen == [(True, None)]
+    assert key_row(db_session, "reserved").status_code == 200
+
+
+def test_failed_request_releases_the_key(client, db_session, user_id):
+    body = plan_body(user_id, 2)
+    blocking = client.post("/plans/", json=body)
+    assert blocking.status_code == 200, blocking.text
+
+    failed = client.post("/plans/", json=body, headers={"Idempotency-Key": "released"})
+    assert failed.status_code == 400
+    assert key_row(db_session, "released") is None
+
+    # The retry runs again instead of replaying the error
+    assert client.delete(f"/plans/{blocking.json()['id']}").status_code == 200
+    retry = client.post("/plans/", json=body, headers={"Idempotency-Key": "released"})
+    assert retry.status_code == 200, retry.text
+    assert "Idempotent-Replayed" not in retry.headers
+
+
+def test_exception_in_endpoint_releases_the_key(client, db_session, user_id, monkeypatch):
+    def fail(user: User):
+        raise RuntimeError("Graph is down")
+
+    monkeypatch.setattr(plans, "check_routable_phone", fail)
+    with pytest.raises(RuntimeError):
+        client.post("/plans/", json=plan_body(user_id, 3), headers={"Idempotency-Key": "crashed"})
+    assert key_row(db_session, "crashed") is None
+
+
+def test_unsaved_response_releases_the_key(client, db_session):
+    content = "username;email;first_name;last_name\nidem-dry;idem-dry@example.com;Dry;Run\n"
+    response = client.post("/users/import", json={"content": content, "default_password": "secret", "dry_run": True},
+                           headers={"Idempotency-Key": "dry-run"})
+    assert response.status_code == 200, response.text
+    assert key_row(db_session, "dry-run") is None
+
+
+def test_key_reused_for_another_request_is_rejected(client, user_id):
+    first = client.post("/plans/", json=plan_body(user_id, 4), headers={"Idempotency-Key": "reused"})
+    assert first.status_code == 200, first.text
+    other = client.post("/plans/", json=plan_body(user_id, 5), headers={"Idempotency-Key": "reused"})
+    assert other.status_code == 422
+    assert "different request" in other.json()["detail"]
+
+
+def test_expired_keys_are_purged(client, db_session, user_id, monkeypatch):
+    with db_session() as db:
+        admin_id = db.query(User.id).filter(User.username == "test-admin").scalar()
+        db.add(IdempotencyKey(key="expired", user_id=admin_id, request_hash="x", status_code=200,
+                              response_body="{}", expires_at=datetime.utcnow() - timedelta(hours=1)))
+        db.commit()
+    monkeypatch.setattr(idempotency, "_last_purge", 0.0)
+
+    response = client.post("/plans/", json=plan_body(user_id, 6), headers={"Idempotency-Key": "purge"})
+    assert response.status_code == 200, response.text
+    assert key_row(db_session, "expired") is None
+    assert key_row(db_session, "purge") is not None
@@ -0,0 +1,88 @@
+"""
+The plan lookups on hot paths must use the indexes of migration 0003.
+
+The statements mirror the queries in routers/plans.py (read_plans,
+create_plan) and scheduler/main.py (get_current_active_user); keep them
+in sync when those change. PostgreSQL plans are taken with sequential
+scans disabled, since a few hundred test rows would otherwise never be
+worth an index.
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert, select
+from models import CalendarEvent, NotfallPlan, User
+
+WINDOW_START = datetime(2024, 3, 4)
+WINDOW_END = datetime(2024, 4, 8)
+
+
+@pytest.fixture(scope="module")
+def conn(migrated_engine):
+    with migrated_engine.connect() as conn:
+        if not conn.execute(select(User.id).where(User.username == "planner")).first():
+            _seed(conn)
+        if conn.dialect.name == "postgresql":
+            conn.exec_driver_sql("ANALYZE")
+            conn.exec_driver_sql("SET enable_seqscan = off")
+        yield conn
+
+
+def _seed(conn):
+    user_id = conn.execute(insert(User).values(
+        username="planner", email="planner@example.com", password_hash="x", first_name="P", last_name="L",
+    )).inserted_primary_key[0]
+    start = datetime(2020, 1, 6)
+    conn.execute(insert(NotfallPlan), [{
+        "start_date": start + timedelta(weeks=week),
+        "end_date": start + timedelta(weeks=week + 1),
+        "user_id": user_id,
+        "confirmed": week % 3 != 0,
+        "version": 1,
+    } for week in range(300)])
+    plan_ids = conn.execute(select(NotfallPlan.id).where(NotfallPlan.confirmed == True)).scalars().all()
+    conn.execute(insert(CalendarEvent), [{"notfallplan_id": plan_id, "ms_event_id": f"event-{plan_id}"} for plan_id in plan_ids])
+    conn.commit()
+
+
+def explain(conn, statement) -> str:
+    compiled = statement.compile(dialect=conn.dialect)
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    if conn.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + compiled.string, params).all()
+        return "\n".join(row[-1] for row in rows)
+    rows = conn.exec_driver_sql("EXPLAIN " + compiled.string, params).all()
+    return "\n".join(row[0] for row in rows)
+
+
+def test_read_plans_window_uses_range_index(conn):
+    plan = explain(conn, select(NotfallPlan).where(
+        NotfallPlan.end_date >= WINDOW_START,
+        NotfallPlan.start_date <= WINDOW_END,
+    ))
+    assert "ix_notfallplan_end_start" in plan, plan
+
+
+def test_overlap_check_uses_range_index(conn):
+    plan = explain(conn, select(NotfallPlan).where(
+        NotfallPlan.start_date < WINDOW_END,
+        NotfallPlan.end_date > WINDOW_START,
+    ).limit(1))
+    assert "ix_notfallplan_end_start" in plan, plan
+
+
+def test_scheduler_lookup_uses_confirmed_index(conn):
+    now = datetime(2024, 3, 6, 12, 0)
+    plan = explain(conn, select(NotfallPlan).where(
+        NotfallPlan.start_date <= now,
+        NotfallPlan.end_date >= now,
+        NotfallPlan.confirmed == True,
+    ).limit(1))
+    assert "ix_notfallplan_confirmed_range" in plan, plan
+
+
+def test_calendar_event_lookup_uses_plan_index(conn):
+    plan = explain(conn, select(CalendarEvent).where(CalendarEvent.notfallplan_id == 42).limit(1))
+    assert "ix_calendar_events_notfallplan_id" in plan, plan
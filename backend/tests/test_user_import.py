@@ -0,0 +1,85 @@
+"""
+Bulk user import (services/user_import.py, POST /users/import): all or
+nothing, existing users matched and updated, new users hashed one by one.
+"""
+from models import AuditLog, User
+
+HEADER = "username;email;first_name;last_name;phone_number;role\n"
+
+
+def users_named(db_session, *usernames):
+    with db_session() as db:
+        return {user.username: user for user in db.query(User).filter(User.username.in_(usernames))}
+
+
+def test_invalid_row_rejects_the_whole_file(client, db_session):
+    content = HEADER + (
+        "imp-valid;imp-valid@example.com;Vera;Valid;0171 1234567;planner\n"
+        "imp-mail;not-an-email;Max;Mail;;planner\n"
+        "imp-role;imp-role@example.com;Rita;Role;;chef\n"
+    )
+    response = client.post("/users/import", json={"content": content, "default_password": "secret"})
+    assert response.status_code == 422
+    assert [error["line"] for error in response.json()["detail"]] == [3, 4]
+    assert users_named(db_session, "imp-valid", "imp-mail", "imp-role") == {}
+
+
+def test_conflicting_match_rejects_the_whole_file(client, db_session):
+    other = client.post("/users/", json={
+        "username": "imp-other", "email": "imp-other@example.com", "password": "secret",
+        "first_name": "Otto", "last_name": "Other",
+    })
+    assert other.status_code == 200, other.text
+    content = HEADER + (
+        "imp-first;imp-first@example.com;Fritz;First;;planner\n"
+        "test-admin;imp-other@example.com;Test;Admin;;admin\n"
+    )
+    response = client.post("/users/import", json={"content": content, "default_password": "secret"})
+    assert response.status_code == 422
+    assert response.json()["detail"] == [{"line": 3, "error": "Username belongs to 'test-admin', email to 'imp-other'"}]
+    assert users_named(db_session, "imp-first") == {}
+    assert users_named(db_session, "test-admin")["test-admin"].email == "test-admin@example.com"
+
+
+def test_dry_run_writes_nothing(client, db_session):
+    content = HEADER + "imp-dry;imp-dry@example.com;Doris;Dry;;planner\n"
+    response = client.post("/users/import", json={"content": content, "default_password": "secret", "dry_run": True})
+    assert response.status_code == 200, response.text
+    assert response.json()["created"] == 1
+    assert users_named(db_session, "imp-dry") == {}
+
+
+def test_import_creates_and_updates_users(client, db_session):
+    existing = client.post("/users/", json={
+        "username": "imp-old", "email": "imp-old@example.com", "password": "secret",
+        "first_name": "Olga", "last_name": "Old",
+    })
+    assert existing.status_code == 200, existing.text
+    content = HEADER + (
+        "imp-old;imp-old@example.com;Olga;Neu;0171 7654321;planner\n"
+        "imp-one;imp-one@example.com;Otto;One;0049 171 1111111;planner\n"
+        "imp-two;imp-two@example.com;Tina;Two;;buchhaltung\n"
+    )
+    response = client.post("/users/import", json={"content": content, "default_password": "secret"})
+    assert response.status_code == 200, response.text
+    assert response.json() == {"created": 2, "updated": 1, "unchanged": 0, "dry_run": False}
+
+    users = users_named(db_session, "imp-old", "imp-one", "imp-two")
+    assert users["imp-old"].last_name == "Neu"
+    assert users["imp-old"].phone_number == "+491717654321"
+    assert users["imp-one"].phone_number == "+491711111111"
+    assert users["imp-two"].role == "buchhaltung"
+    # Same initial password, but every user gets their own salt
+    assert users["imp-one"].password_hash != users["imp-two"].password_hash
+    login = client.post("/auth/token", data={"username": "imp-two", "password": "secret"})
+    assert login.status_code == 200, login.text
+
+    with db_session() as db:
+        audited = {target_id for (target_id,) in db.query(AuditLog.target_id).filter(
+            AuditLog.target_table == "users",
+            AuditLog.target_id.in_([user.id for user in users.values()]),
+        )}
+    assert audited == {user.id for user in users.values()}
+
+    again = client.post("/users/import", json={"content": content, "default_password": "secret"})
+    assert again.json() == {"created": 0, "updated": 0, "unchanged": 3, "dry_run": False}
@@ -1,16 +1,19 @@
 "use client";
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { useRouter } from 'next/navigation';
-import { getUsers, createUser, updateUser, deleteUser, User, UserCreate, UserUpdate } from '@/services/userService';
+import { getUserPage, createUser, updateUser, deleteUser, importUsers, User, UserCreate, UserUpdate } from '@/services/userService';
 import { Card, CardContent, CardHeader, CardTitle, CardDescription } from "@/components/ui/card";
 import { Input } from "@/components/ui/input";
 import { Button } from "@/components/ui/button";
-import { Trash2, Plus, UserPlus, Edit, X, Check } from 'lucide-react';
+import { Trash2, Plus, UserPlus, Edit, X, Check, Upload } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
 
 export default function UsersPage() {
     const router = useRouter();
     const [users, setUsers] = useState<User[]>([]);
+    const [search, setSearch] = useState('');
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const importInput = useRef<HTMLInputElement>(null);
     const [loading, setLoading] = useState(false);
     const [showModal, setShowModal] = useState(false);
     const [editingUser, setEditingUser] = useState<User | null>(null);
@@ -37,13 +40,31 @@ export default function UsersPage() {
             router.push('/calendar');
             return;
         }
-        loadUsers();
     }, [router]);
 
+    // Search runs on the server; wait until typing pauses
+    useEffect(() => {
+        if (localStorage.getItem('role') !== 'admin') return;
+        const timer = setTimeout(() => loadUsers(), 300);
+        return () => clearTimeout(timer);
+    }, [search]);
+
     const loadUsers = async () => {
         try {
-            const data = await getUsers();
-            setUsers(data);
+            const page = await getUserPage({ q: search || undefined });
+            setUsers(page.items);
+            setNextCursor(page.nextCursor);
+        } catch (error) {
+            console.error('Failed to load users:', error);
+        }
+    };
+
+    const loadMoreUsers = async () => {
+        if (!nextCursor) return;
+        try {
+            const page = await getUserPage({ q: search || undefined, cursor: nextCursor });
+            setUsers(prev => [...prev, ...page.items]);
+            setNextCursor(page.nextCursor);
         } catch (error) {
             console.error('Failed to load users:', error);
         }
@@ -66,7 +87,7 @@ export default function UsersPage() {
                 if (formData.password) {
                     updateData.password = formData.password;
                 }
-                await updateUser(editingUser.id, updateData);
+                await updateUser(editingUser.id, updateData, editingUser.version);
             } else {
                 await createUser(formData);
             }
@@ -76,7 +97,9 @@ export default function UsersPage() {
             await loadUsers();
         } catch (error: any) {
             console.error('Failed to save user:', error);
-            alert(error.response?.data?.detail || 'Benutzer konnte nicht gespeichert werden');
+            const detail = error.response?.data?.detail;
+            // 422: validation errors, e.g. an unreadable phone number
+            alert(Array.isArray(detail) ? detail.map((d: { msg: string }) => d.msg).join('\n') : detail || 'Benutzer konnte nicht gespeichert werden');
         } finally {
             setLoading(false);
         }
@@ -101,7 +124,7 @@ export default function UsersPage() {
     const handleDelete = async (id: number) => {
         if (confirm("Diesen Benutzer wirklich löschen?")) {
             try {
-                await deleteUser(id);
+                await deleteUser(id, users.find(u => u.id === id)?.version);
                 loadUsers();
             } catch (error: any) {
                 alert(error.response?.data?.detail || 'Benutzer konnte nicht gelöscht werden');
@@ -109,6 +132,28 @@ export default function UsersPage() {
         }
     };
 
+    const handleImport = async (e: React.ChangeEvent<HTMLInputElement>) => {
+        const file = e.target.files?.[0];
+        e.target.value = '';
+        if (!file) return;
+        const defaultPassword = prompt("Startpasswort für neue Benutzer (leer lassen, wenn die Datei eine Passwort-Spalte hat):");
+        if (defaultPassword === null) return;
+        setLoading(true);
+        try {
+            const result = await importUsers(await file.text(), defaultPassword);
+            alert(`Import abgeschlossen: ${result.created} angelegt, ${result.updated} aktualisiert, ${result.unchanged} unverändert.`);
+            await loadUsers();
+        } catch (error: any) {
+            const detail = error.response?.data?.detail;
+            const message = Array.isArray(detail)
+                ? detail.slice(0, 10).map((d: { line: number | null; error: string }) => (d.line ? `Zeile ${d.line}: ${d.error}` : d.error)).join('\n')
+                : detail;
+            alert(`Import abgelehnt, es wurde kein Benutzer gespeichert.\n${message || ''}`);
+        } finally {
+            setLoading(false);
+        }
+    };
+
     const resetForm = () => {
         setFormData({
             username: '',
@@ -145,11 +190,24 @@ export default function UsersPage() {
                         </CardTitle>
                         <CardDescription>Benutzer anlegen, bearbeiten und löschen.</CardDescription>
                     </div>
-                    <Button onClick={() => { resetForm(); setEditingUser(null); setShowModal(true); }}>
-                        <Plus size={16} className="mr-2" /> Neuer Benutzer
-                    </Button>
+                    <div className="flex gap-2">
+                        <input ref={importInput} type="file" accept=".csv,.json,text/csv,application/json" className="hidden" onChange={handleImport} />
+                        <Button variant="outline" disabled={loading} onClick={() => importInput.current?.click()}>
+                            <Upload size={16} className="mr-2" /> Importieren
+                        </Button>
+                        <Button onClick={() => { resetForm(); setEditingUser(null); setShowModal(true); }}>
+                            <Plus size={16} className="mr-2" /> Neuer Benutzer
+                        </Button>
+                    </div>
                 </CardHeader>
                 <CardContent>
+                    <div className="mb-4 max-w-sm">
+                        <Input
+                            placeholder="Suchen nach Name, Benutzername oder E-Mail..."
+                            value={search}
+                            onChange={e => setSearch(e.target.value)}
+                        />
+                    </div>
                     <div className="rounded-md border">
                         <table className="w-full text-sm text-left">
                             <thead className="bg-muted/50 text-muted-foreground">
@@ -209,6 +267,11 @@ export default function UsersPage() {
                             </tbody>
                         </table>
                     </div>
+                    {nextCursor && (
+                        <div className="mt-4 flex justify-center">
+                            <Button variant="outline" onClick={loadMoreUsers}>Weitere laden</Button>
+                        </div>
+                    )}
                 </CardContent>
             </Card>
 
@@ -270,7 +333,8 @@ export default function UsersPage() {
                                         required={!editingUser}
                                     />
                                     <Input
-                                        placeholder="Telefonnummer"
+                                        type="tel"
+                                        placeholder="Telefonnummer (z.B. +49 171 1234567)"
                                         value={formData.phone_number}
                                         onChange={e => setFormData({ ...formData, phone_number: e.target.value })}
                                     />
@@ -1,22 +1,22 @@
 "use client";
 
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import FullCalendar from '@fullcalendar/react';
 import dayGridPlugin from '@fullcalendar/daygrid';
 import timeGridPlugin from '@fullcalendar/timegrid';
 import interactionPlugin from '@fullcalendar/interaction';
-import { getPlans, createPlan, confirmPlan, deletePlan } from '@/services/planService';
+import { getPlanFeed, subscribePlanEvents, createPlan, confirmPlan, deletePlan, autoPlan, Plan, PlanDelta } from '@/services/planService';
 import { getDutyEligibleUsers, User } from '@/services/userService';
 import { Card, CardContent, CardHeader, CardTitle, CardDescription } from "@/components/ui/card";
 import { Button } from "@/components/ui/button";
 import { motion, AnimatePresence } from "framer-motion";
-import { Check, Calendar as CalendarIcon, User as UserIcon, X, Trash2 } from 'lucide-react';
+import { Check, Calendar as CalendarIcon, User as UserIcon, X, Trash2, Wand2 } from 'lucide-react';
 import { useTheme } from "next-themes";
 import { jwtDecode } from "jwt-decode";
 import { stringToColor } from "@/lib/utils";
 
 export default function CalendarComponent() {
-    const [events, setEvents] = useState([]);
+    const [events, setEvents] = useState<any[]>([]);
     const [users, setUsers] = useState<User[]>([]);
     const [modalOpen, setModalOpen] = useState(false);
     const [detailModalOpen, setDetailModalOpen] = useState(false);
@@ -26,6 +26,10 @@ export default function CalendarComponent() {
     const { theme } = useTheme();
     const [currentUserRole, setCurrentUserRole] = useState<string | null>(null);
     const [currentUsername, setCurrentUsername] = useState<string | null>(null);
+    // Visible date range of the calendar, only these plans are loaded
+    const visibleRange = useRef<{ start: string, end: string } | null>(null);
+    // While the live stream is connected, changes arrive as deltas and no reload is needed
+    const live = useRef(false);
 
     useEffect(() => {
         const token = localStorage.getItem('token');
@@ -42,31 +46,58 @@ export default function CalendarComponent() {
         fetchUsers();
     }, [theme]);
 
+    useEffect(() => subscribePlanEvents(
+        applyDelta,
+        () => { live.current = true; fetchEvents(); },
+        () => { live.current = false; }
+    ), []);
+
+    const toEvent = (p: Plan) => {
+        const userColor = p.user?.username ? stringToColor(p.user.username) : '#808080';
+
+        return {
+            id: p.id.toString(),
+            title: p.user ? `${p.user.first_name} ${p.user.last_name}` : 'Unknown',
+            start: p.start_date,
+            end: p.end_date,
+            backgroundColor: p.confirmed ? userColor : 'transparent',
+            borderColor: userColor,
+            textColor: p.confirmed ? '#ffffff' : userColor,
+            allDay: true, // Force "full day" block appearance
+            classNames: p.confirmed ? [] : ['border-2', 'border-dashed', 'font-bold'], // Visual cue for unconfirmed
+            extendedProps: {
+                user_id: p.user_id,
+                username: p.user?.username,
+                confirmed: p.confirmed,
+                version: p.version
+            }
+        };
+    };
+
+    const applyDelta = (delta: PlanDelta) => {
+        if (delta.type === 'deleted') {
+            setEvents(prev => prev.filter(e => e.id !== delta.id.toString()));
+            return;
+        }
+        const event = toEvent(delta.plan);
+        setEvents(prev => {
+            const others = prev.filter(e => e.id !== event.id);
+            const range = visibleRange.current;
+            const visible = !range || (new Date(delta.plan.end_date) >= new Date(range.start) && new Date(delta.plan.start_date) <= new Date(range.end));
+            return visible ? [...others, event] : others;
+        });
+    };
+
+    const handleDatesSet = (dateInfo: any) => {
+        visibleRange.current = { start: dateInfo.startStr, end: dateInfo.endStr };
+        fetchEvents();
+    };
+
     const fetchEvents = async () => {
+        if (!visibleRange.current) return;
         try {
-            const plans = await getPlans();
-            const mappedEvents = plans.map(p => {
-                const userColor = p.user?.username ? stringToColor(p.user.username) : '#808080';
-
-                return {
-                    id: p.id.toString(),
-                    title: p.user ? `${p.user.first_name} ${p.user.last_name}` : 'Unknown',
-                    start: p.start_date,
-                    end: p.end_date,
-                    backgroundColor: p.confirmed ? userColor : 'transparent',
-                    borderColor: userColor,
-                    textColor: p.confirmed ? '#ffffff' : userColor,
-                    allDay: true, // Force "full day" block appearance
-                    classNames: p.confirmed ? [] : ['border-2', 'border-dashed', 'font-bold'], // Visual cue for unconfirmed
-                    extendedProps: {
-                        user_id: p.user_id,
-                        username: p.user?.username,
-                        confirmed: p.confirmed,
-                        created_by: p.created_by
-                    }
-                };
-            });
-            setEvents(mappedEvents as any);
+            const plans = await getPlanFeed(visibleRange.current.start, visibleRange.current.end);
+            setEvents(plans.map(toEvent));
         } catch (e) {
             console.error("Failed to fetch plans", e);
         }
@@ -131,7 +162,7 @@ export default function CalendarComponent() {
                     user_id: parseInt(selectedUserId)
                 });
                 setModalOpen(false);
-                fetchEvents();
+                if (!live.current) fetchEvents();
             } catch (error: any) {
                 alert(error.response?.data?.detail || "Eintrag konnte nicht erstellt werden.");
             }
@@ -157,7 +188,7 @@ export default function CalendarComponent() {
         try {
             await confirmPlan(parseInt(selectedEvent.id));
             setDetailModalOpen(false);
-            fetchEvents();
+            if (!live.current) fetchEvents();
         } catch (error: any) {
             alert(error.response?.data?.detail || "Bestätigung fehlgeschlagen.");
         }
@@ -167,19 +198,48 @@ export default function CalendarComponent() {
         if (!selectedEvent) return;
         if (!confirm("Wirklich löschen?")) return;
         try {
-            await deletePlan(parseInt(selectedEvent.id));
+            await deletePlan(parseInt(selectedEvent.id), selectedEvent.version);
             setDetailModalOpen(false);
-            fetchEvents();
+            if (!live.current) fetchEvents();
         } catch (error: any) {
             alert(error.response?.data?.detail || "Löschen fehlgeschlagen.");
         }
     };
 
+    // Admin: fill the free weeks of a period fairly (draft first, then unconfirmed plans)
+    const handleAutoPlan = async () => {
+        const start = prompt("Automatisch planen ab (JJJJ-MM-TT, ein Montag):");
+        if (!start) return;
+        const end = prompt("Bis ausschließlich (JJJJ-MM-TT, ein Montag):");
+        if (!end) return;
+        try {
+            const draft = await autoPlan({ start_date: start, end_date: end });
+            if (draft.plans.length === 0) {
+                alert("Keine freien Wochen im Zeitraum.");
+                return;
+            }
+            const people = draft.users.filter(u => u.planned_days > 0).length;
+            let summary = `${draft.plans.length} Einträge, verteilt auf ${people} Personen.`;
+            if (draft.unassigned.length) summary += `\n${draft.unassigned.length} Zeiträume bleiben unbesetzt.`;
+            if (draft.excluded.length) summary += `\n${draft.excluded.length} Personen ausgenommen (z.B. ungültige Telefonnummer).`;
+            if (!confirm(`${summary}\n\nAls unbestätigte Einträge anlegen?`)) return;
+            await autoPlan({ start_date: start, end_date: end, create: true });
+            if (!live.current) fetchEvents();
+        } catch (error: any) {
+            alert(error.response?.data?.detail || "Automatische Planung fehlgeschlagen.");
+        }
+    };
+
     return (
         <Card className="shadow-lg">
-            <CardHeader>
-                <CardTitle className="flex items-center gap-2"><CalendarIcon /> Dienstplan</CardTitle>
-                <CardDescription>Planung der Notfalldienste (Tag/Woche).</CardDescription>
+            <CardHeader className="flex flex-row items-start justify-between gap-4">
+                <div>
+                    <CardTitle className="flex items-center gap-2"><CalendarIcon /> Dienstplan</CardTitle>
+                    <CardDescription>Planung der Notfalldienste (Tag/Woche).</CardDescription>
+                </div>
+                {currentUserRole === 'admin' && (
+                    <Button variant="outline" onClick={handleAutoPlan}><Wand2 size={16} className="mr-2" /> Automatisch planen</Button>
+                )}
             </CardHeader>
             <CardContent className="p-0 sm:p-6 text-sm">
                 <FullCalendar
@@ -195,6 +255,7 @@ export default function CalendarComponent() {
                     selectMirror={true}
                     dayMaxEvents={true}
                     events={events}
+                    datesSet={handleDatesSet}
                     select={handleDateSelect}
                     eventClick={handleEventClick}
                     height="75vh"
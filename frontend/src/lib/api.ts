@@ -13,12 +13,29 @@ api.interceptors.request.use((config) => {
     return config;
 });
 
+// Key for one logical mutation; the API replays the first result when the same key is sent again
+export const newIdempotencyKey = () =>
+    typeof crypto !== 'undefined' && 'randomUUID' in crypto
+        ? crypto.randomUUID()
+        : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
+const MAX_IDEMPOTENT_RETRIES = 2;
+
 api.interceptors.response.use(
     (response) => {
         console.log(`API SUCCESS: ${response.status} ${response.config.url}`);
         return response;
     },
     (error) => {
+        // Requests with an Idempotency-Key are safe to resend when the response was lost
+        const config = error.config;
+        if (!error.response && config?.headers?.['Idempotency-Key']) {
+            config._retries = (config._retries || 0) + 1;
+            if (config._retries <= MAX_IDEMPOTENT_RETRIES) {
+                console.warn(`API RETRY ${config._retries}: ${config.method?.toUpperCase()} ${config.url}`);
+                return api(config);
+            }
+        }
         if (error.response) {
             console.error('API ERROR RESPONSE:', error.response.status, error.response.data);
             if (error.response.status === 401) {
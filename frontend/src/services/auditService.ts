@@ -5,10 +5,36 @@ export interface AuditLog {
     username: string;
     action: string;
     target_table: string;
+    target_id?: number | null;
     timestamp: string;
+    old_value?: any;
+    new_value?: any;
+}
+
+export interface AuditLogFilter {
+    cursor?: string;
+    limit?: number;
+    user_id?: number;
+    action?: string;
+    target_table?: string;
+    target_id?: number;
+    include_values?: boolean;
+}
+
+export interface AuditLogPage {
+    items: AuditLog[];
+    nextCursor: string | null;
 }
 
 export const getAuditLogs = async () => {
     const response = await api.get<AuditLog[]>('/audit');
     return response.data;
 };
+
+export const getAuditLogPage = async (filter: AuditLogFilter = {}): Promise<AuditLogPage> => {
+    const response = await api.get<AuditLog[]>('/audit', { params: filter });
+    return {
+        items: response.data,
+        nextCursor: response.headers['x-next-cursor'] ?? null,
+    };
+};
@@ -1,4 +1,4 @@
-import api from '@/lib/api';
+import api, { newIdempotencyKey } from '@/lib/api';
 
 export interface Plan {
     id: number;
@@ -7,6 +7,7 @@ export interface Plan {
     user_id: number;
     confirmed: boolean;
     created_by?: string;
+    version?: number;
     user?: {
         username?: string;
         first_name: string;
@@ -26,23 +27,134 @@ export const getPlans = async (start?: string, end?: string) => {
     return response.data;
 };
 
-export const createPlan = async (data: PlanCreate) => {
-    const response = await api.post<Plan>('/plans', data);
+// Compact feed for the calendar: users are sent once, plans as tuples (see GET /plans/feed)
+type FeedUser = [number, string, string, string];
+type FeedPlan = [number, number, string, string, boolean, number];
+
+const fromFeed = ([id, user_id, start_date, end_date, confirmed, version]: FeedPlan, user?: Plan['user']): Plan => ({
+    id, user_id, start_date, end_date, confirmed, version, user,
+});
+
+export const getPlanFeed = async (start: string, end: string): Promise<Plan[]> => {
+    const response = await api.get<{ users: FeedUser[]; plans: FeedPlan[] }>('/plans/feed', { params: { start, end } });
+    const users = new Map(response.data.users.map(([id, username, first_name, last_name]) => [id, { username, first_name, last_name }]));
+    return response.data.plans.map(plan => fromFeed(plan, users.get(plan[1])));
+};
+
+export type PlanDelta =
+    | { type: 'created' | 'updated' | 'confirmed'; plan: Plan }
+    | { type: 'deleted'; id: number };
+
+// Live changes from GET /plans/stream (Server-Sent Events, read with fetch so the token goes in a header).
+// onReady runs on every (re)connect: reload then, deltas sent while disconnected are not replayed.
+export const subscribePlanEvents = (onDelta: (delta: PlanDelta) => void, onReady: () => void, onDisconnect: () => void) => {
+    const controller = new AbortController();
+    let retryDelay = 1000;
+
+    const handle = (eventName: string, data: string) => {
+        if (eventName === 'ready') {
+            retryDelay = 1000;
+            onReady();
+        } else if (eventName === 'plan') {
+            const delta = JSON.parse(data);
+            if (delta.type === 'deleted') {
+                onDelta(delta);
+            } else {
+                const [userId, username, first_name, last_name] = delta.user ?? [];
+                onDelta({ type: delta.type, plan: fromFeed(delta.plan, userId ? { username, first_name, last_name } : undefined) });
+            }
+        }
+    };
+
+    const connect = async () => {
+        try {
+            const response = await fetch(`${api.defaults.baseURL}/plans/stream`, {
+                headers: { Authorization: `Bearer ${localStorage.getItem('token')}`, Accept: 'text/event-stream' },
+                signal: controller.signal,
+            });
+            if (!response.ok || !response.body) throw new Error(`Stream failed: ${response.status}`);
+            const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+            let buffer = '';
+            for (;;) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += value;
+                let end;
+                while ((end = buffer.indexOf('\n\n')) >= 0) {
+                    const message = buffer.slice(0, end);
+                    buffer = buffer.slice(end + 2);
+                    let eventName = 'message';
+                    const data: string[] = [];
+                    for (const line of message.split('\n')) {
+                        if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                        else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+                    }
+                    handle(eventName, data.join('\n'));
+                }
+            }
+        } catch (e) {
+            if (controller.signal.aborted) return;
+            console.warn('Plan stream interrupted', e);
+        }
+        if (controller.signal.aborted) return;
+        onDisconnect();
+        setTimeout(connect, retryDelay);
+        retryDelay = Math.min(retryDelay * 2, 30000);
+    };
+
+    connect();
+    return () => controller.abort();
+};
+
+// Mutations below send an Idempotency-Key, so network retries cannot create duplicates
+export const createPlan = async (data: PlanCreate, idempotencyKey: string = newIdempotencyKey()) => {
+    const response = await api.post<Plan>('/plans', data, { headers: { 'Idempotency-Key': idempotencyKey } });
+    return response.data;
+};
+
+// Conflict detection: pass the version that was loaded; the API answers 409 if the plan changed since
+const ifMatch = (version?: number) => (version !== undefined ? { 'If-Match': `"${version}"` } : undefined);
+
+export const updatePlan = async (id: number, data: Partial<PlanCreate>, version?: number) => {
+    const response = await api.put<Plan>(`/plans/${id}`, data, { headers: ifMatch(version) });
     return response.data;
 };
 
-export const updatePlan = async (id: number, data: Partial<PlanCreate>) => {
-    const response = await api.put<Plan>(`/plans/${id}`, data);
+export const confirmPlan = async (id: number, idempotencyKey: string = newIdempotencyKey()) => {
+    const response = await api.post(`/plans/${id}/confirm`, undefined, { headers: { 'Idempotency-Key': idempotencyKey } });
     return response.data;
 };
 
-export const confirmPlan = async (id: number) => {
-    const response = await api.post(`/plans/${id}/confirm`);
+export const deletePlan = async (id: number, version?: number) => {
+    const response = await api.delete(`/plans/${id}`, { headers: ifMatch(version) });
     return response.data;
 };
 
-export const deletePlan = async (id: number) => {
-    const response = await api.delete(`/plans/${id}`);
+export const confirmPlans = async (planIds: number[], idempotencyKey: string = newIdempotencyKey()) => {
+    const response = await api.post('/plans/confirm', { plan_ids: planIds }, { headers: { 'Idempotency-Key': idempotencyKey } });
     return response.data;
 };
 
+export interface AutoPlanRequest {
+    start_date: string;  // YYYY-MM-DD
+    end_date: string;  // YYYY-MM-DD, exclusive
+    slot_days?: number;
+    user_ids?: number[];
+    blackouts?: { start_date: string; end_date: string; user_id?: number }[];
+    targets?: Record<number, number>;
+    create?: boolean;
+}
+
+export interface AutoPlanResult {
+    plans: { start_date: string; end_date: string; user_id: number }[];
+    unassigned: { start_date: string; end_date: string }[];
+    users: { user: { id: number; username: string; first_name: string; last_name: string }; weight: number; history_days: number; planned_days: number }[];
+    excluded: { user_id: number; reason: string }[];
+    created: number[];
+}
+
+// Fair rota for a period (admin): a draft, or with create the draft inserted as unconfirmed plans
+export const autoPlan = async (data: AutoPlanRequest, idempotencyKey: string = newIdempotencyKey()) => {
+    const response = await api.post<AutoPlanResult>('/plans/auto-plan', data, { headers: { 'Idempotency-Key': idempotencyKey } });
+    return response.data;
+};
@@ -25,3 +25,21 @@ export const getStatsOverview = async (): Promise<StatsResponse> => {
     const response = await api.get('/stats/overview');
     return response.data;
 };
+
+export type DutyGroup = 'week' | 'month' | 'quarter' | 'year';
+
+export interface DutyStatRow extends StatUser {
+    period: string;
+}
+
+export interface DutyStatsResponse {
+    from: string;
+    to: string;
+    group: DutyGroup;
+    data: DutyStatRow[];
+}
+
+export const getDutyStats = async (from: string, to: string, group: DutyGroup = 'month', user?: number): Promise<DutyStatsResponse> => {
+    const response = await api.get('/stats/duty', { params: { from, to, group, user } });
+    return response.data;
+};
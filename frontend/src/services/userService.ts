@@ -1,4 +1,4 @@
-import api from '@/lib/api';
+import api, { newIdempotencyKey } from '@/lib/api';
 
 export interface User {
     id: number;
@@ -12,6 +12,7 @@ export interface User {
     can_take_duty: boolean;
     created_at: string;
     last_login: string | null;
+    version?: number;
 }
 
 export interface UserCreate {
@@ -37,9 +38,24 @@ export interface UserUpdate {
     password?: string;
 }
 
-export const getUsers = async (): Promise<User[]> => {
-    const response = await api.get('/users/');
-    return response.data;
+export interface UserFilter {
+    q?: string;
+    role?: string;
+    cursor?: string;
+    limit?: number;
+}
+
+export interface UserPage {
+    items: User[];
+    nextCursor: string | null;
+}
+
+export const getUserPage = async (filter: UserFilter = {}): Promise<UserPage> => {
+    const response = await api.get<User[]>('/users/', { params: filter });
+    return {
+        items: response.data,
+        nextCursor: response.headers['x-next-cursor'] ?? null,
+    };
 };
 
 export const getDutyEligibleUsers = async (): Promise<User[]> => {
@@ -52,16 +68,32 @@ export const getUser = async (id: number): Promise<User> => {
     return response.data;
 };
 
-export const createUser = async (data: UserCreate): Promise<User> => {
-    const response = await api.post('/users/', data);
+export const createUser = async (data: UserCreate, idempotencyKey: string = newIdempotencyKey()): Promise<User> => {
+    const response = await api.post('/users/', data, { headers: { 'Idempotency-Key': idempotencyKey } });
     return response.data;
 };
 
-export const updateUser = async (id: number, data: UserUpdate): Promise<User> => {
-    const response = await api.put(`/users/${id}`, data);
+export interface UserImportResult {
+    created: number;
+    updated: number;
+    unchanged: number;
+    dry_run: boolean;
+}
+
+// CSV or directory export (JSON) as text; invalid rows are answered with 422 and [{line, error}]
+export const importUsers = async (content: string, defaultPassword?: string, idempotencyKey: string = newIdempotencyKey()): Promise<UserImportResult> => {
+    const response = await api.post('/users/import', { content, default_password: defaultPassword || undefined }, { headers: { 'Idempotency-Key': idempotencyKey } });
+    return response.data;
+};
+
+// Conflict detection: pass the version that was loaded; the API answers 409 if the user changed since
+const ifMatch = (version?: number) => (version !== undefined ? { 'If-Match': `"${version}"` } : undefined);
+
+export const updateUser = async (id: number, data: UserUpdate, version?: number): Promise<User> => {
+    const response = await api.put(`/users/${id}`, data, { headers: ifMatch(version) });
     return response.data;
 };
 
-export const deleteUser = async (id: number): Promise<void> => {
-    await api.delete(`/users/${id}`);
+export const deleteUser = async (id: number, version?: number): Promise<void> => {
+    await api.delete(`/users/${id}`, { headers: ifMatch(version) });
 };
@@ -0,0 +1,302 @@
+"""
+Concurrent load tests against the running stack (through nginx).
+
+Usage: python loadtest.py <scenario> [--base-url https://localhost/api] [--users 50] [--duration 60] [--output report.json]
+
+Scenarios (each virtual user is one thread with its own login):
+    login_storm       everybody logs in at once and opens the calendar (Monday morning)
+    month_end         buchhaltung: statistics, CSV/PDF exports and the audit export of last month
+    bulk_confirm      admins create draft weeks, confirm them in one request, delete them again
+    calendar_polling  open calendars re-fetching the visible range every --poll seconds
+    mixed             all of the above at once (70% polling, 15% logins, 10% exports, 5% confirms)
+    ceiling           `mixed` at each --steps user count until p95 exceeds --slo-ms or errors exceed
+                      --max-error-rate; reports the highest user count that held
+
+Needs a database seeded with backend/seed_data.py (users log in with its
+password, LOADTEST_PASSWORD) and the Graph/3CX stand-ins (standins.py,
+docker-compose.loadtest.yml) so no real calendar events are created.
+Reports p50/p95/p99 latency and error rate per endpoint.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+import requests
+import urllib3
+
+LOADTEST_ADMIN = os.getenv("LOADTEST_ADMIN", "bench_admin")
+LOADTEST_PASSWORD = os.getenv("LOADTEST_PASSWORD", "bench123")
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)  # nginx uses a self-signed certificate
+
+
+class Stats:
+    """Latencies and errors per endpoint, shared by all virtual users."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.started = time.perf_counter()
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        with self._lock:
+            self.latencies[endpoint].append(seconds * 1000)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        endpoints = {}
+        for endpoint, timings in sorted(self.latencies.items()):
+            timings = sorted(timings)
+            endpoints[endpoint] = {
+                "requests": len(timings),
+                "rps": round(len(timings) / elapsed, 2),
+                "p50_ms": round(_percentile(timings, 50), 1),
+                "p95_ms": round(_percentile(timings, 95), 1),
+                "p99_ms": round(_percentile(timings, 99), 1),
+                "error_rate": round(self.errors[endpoint] / len(timings), 4),
+            }
+        everything = sorted(t for timings in self.latencies.values() for t in timings)
+        total = len(everything)
+        return {
+            "duration_s": round(elapsed, 1),
+            "requests": total,
+            "rps": round(total / elapsed, 2) if elapsed else 0,
+            "p50_ms": round(_percentile(everything, 50), 1),
+            "p95_ms": round(_percentile(everything, 95), 1),
+            "p99_ms": round(_percentile(everything, 99), 1),
+            "error_rate": round(sum(self.errors.values()) / total, 4) if total else 0,
+            "endpoints": endpoints,
+        }
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class Client:
+    """One virtual user: a keep-alive session that times every request under a fixed endpoint name."""
+
+    def __init__(self, base_url: str, stats: Stats):
+        self.base_url = base_url.rstrip("/")
+        self.stats = stats
+        self.session = requests.Session()
+        self.session.verify = False
+
+    def call(self, method: str, endpoint: str, path: str, expect=(200,), **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=60, **kwargs)
+            ok = response.status_code in expect
+        except requests.RequestException:
+            response, ok = None, False
+        self.stats.record(f"{method} {endpoint}", time.perf_counter() - started, ok)
+        return response if ok else None
+
+    def login(self, username: str):
+        response = self.call("POST", "/auth/token", "/auth/token", data={"username": username, "password": LOADTEST_PASSWORD})
+        if response is None:
+            return False
+        self.session.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+        return True
+
+
+def _calendar_range():
+    """Visible range of the month view: the current month plus a week on each side."""
+    first = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return {"start": (first - timedelta(weeks=1)).isoformat(), "end": (first + timedelta(weeks=6)).isoformat()}
+
+
+def _think(seconds: float, stop: threading.Event):
+    stop.wait(random.uniform(0.5, 1.5) * seconds)
+
+
+# --- Virtual users ---
+
+def login_storm_user(client: Client, ctx: dict, stop: threading.Event):
+    while not stop.is_set():
+        client.session.headers.pop("Authorization", None)
+        if client.login(ctx["username"]):
+            client.call("GET", "/users/duty-eligible", "/users/duty-eligible")
+            client.call("GET", "/plans", "/plans/", params=_calendar_range())
+        _think(ctx["think"] * 10, stop)
+
+
+def month_end_user(client: Client, ctx: dict, stop: threading.Event):
+    if not client.login(ctx["username"]):
+        return
+    last_month = datetime.now().replace(day=1) - timedelta(days=1)
+    month = {"month": last_month.month, "year": last_month.year}
+    period = {"from": last_month.replace(day=1).date().isoformat(), "to": (last_month + timedelta(days=1)).date().isoformat()}
+    while not stop.is_set():
+        client.call("GET", "/stats/overview", "/stats/overview")
+        client.call("GET", "/stats/duty", "/stats/duty", params={**period, "group": "week"})
+        client.call("GET", "/export/plans", "/export/plans", params=month)
+        client.call("GET", "/export/plans/pdf", "/export/plans/pdf", params=month)
+        client.call("GET", "/export/audit", "/export/audit", params=month)
+        _think(ctx["think"] * 5, stop)
+
+
+def bulk_confirm_user(client: Client, ctx: dict, stop: threading.Event):
+    if not client.login(ctx["username"]):
+        return
+    # Every virtual user books its own four weeks far behind the seeded data, so they never overlap
+    first_week = datetime(2100, 1, 4) + timedelta(weeks=4 * ctx["index"])
+    while not stop.is_set():
+        plan_ids = []
+        for week in range(4):
+            start = first_week + timedelta(weeks=week)
+            response = client.call("POST", "/plans", "/plans/", json={
+                "start_date": start.isoformat(),
+                "end_date": (start + timedelta(days=7)).isoformat(),
+                "user_id": random.choice(ctx["duty_user_ids"]),
+            })
+            if response is not None:
+                plan_ids.append(response.json()["id"])
+        if plan_ids:
+            client.call("POST", "/plans/confirm", "/plans/confirm", json={"plan_ids": plan_ids})
+        for plan_id in plan_ids:
+            client.call("DELETE", "/plans/{plan_id}", f"/plans/{plan_id}")
+        _think(ctx["think"] * 3, stop)
+
+
+def calendar_polling_user(client: Client, ctx: dict, stop: threading.Event):
+    if not client.login(ctx["username"]):
+        return
+    # Tabs were opened at different times
+    stop.wait(random.uniform(0, ctx["poll"]))
+    while not stop.is_set():
+        client.call("GET", "/plans", "/plans/", params=_calendar_range())
+        stop.wait(ctx["poll"])
+
+
+SCENARIOS = {
+    "login_storm": [(login_storm_user, "planner", 1.0)],
+    "month_end": [(month_end_user, "buchhaltung", 1.0)],
+    "bulk_confirm": [(bulk_confirm_user, "admin", 1.0)],
+    "calendar_polling": [(calendar_polling_user, "planner", 1.0)],
+    "mixed": [
+        (calendar_polling_user, "planner", 0.70),
+        (login_storm_user, "planner", 0.15),
+        (month_end_user, "buchhaltung", 0.10),
+        (bulk_confirm_user, "admin", 0.05),
+    ],
+}
+
+
+def load_accounts(base_url: str):
+    """Active usernames by role and the ids of duty-eligible users, read with the benchmark admin."""
+    client = Client(base_url, Stats())
+    if not client.login(LOADTEST_ADMIN):
+        sys.exit(f"Login as {LOADTEST_ADMIN} failed; seed the database with backend/seed_data.py first")
+    accounts = defaultdict(list)
+    params = {"limit": 500}
+    while True:
+        response = client.call("GET", "/users", "/users/", params=params)
+        for user in response.json():
+            if user["is_active"]:
+                accounts[user["role"]].append(user["username"])
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+    duty_user_ids = [user["id"] for user in client.call("GET", "/users/duty-eligible", "/users/duty-eligible").json()]
+    return accounts, duty_user_ids
+
+
+def run(scenario: str, users: int, duration: float, args, accounts, duty_user_ids):
+    """Run `users` virtual users of the scenario for `duration` seconds; returns the report."""
+    stats = Stats()
+    stop = threading.Event()
+    threads = []
+    counts = defaultdict(int)
+    for index in range(users):
+        # Spread the virtual users over the scenario's user types by weight
+        roll, cumulative = (index + 0.5) / users, 0.0
+        for behaviour, role, weight in SCENARIOS[scenario]:
+            cumulative += weight
+            if roll <= cumulative:
+                break
+        names = accounts.get(role) or accounts["admin"]
+        ctx = {
+            "index": index,
+            "username": names[counts[role] % len(names)],
+            "duty_user_ids": duty_user_ids,
+            "think": args.think,
+            "poll": args.poll,
+        }
+        counts[role] += 1
+        thread = threading.Thread(target=behaviour, args=(Client(args.base_url, stats), ctx, stop), daemon=True)
+        threads.append(thread)
+
+    stats.started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    stop.wait(duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=65)
+
+    report = stats.report()
+    report.update({"scenario": scenario, "users": users})
+    return report
+
+
+def print_report(report: dict):
+    print(f"\n=== {report['scenario']}: {report['users']} users, {report['duration_s']} s, "
+          f"{report['rps']} req/s, p95 {report['p95_ms']} ms, errors {report['error_rate']:.2%} ===", file=sys.stderr)
+    print(f"  {'endpoint':<30} {'requests':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}", file=sys.stderr)
+    for endpoint, row in report["endpoints"].items():
+        print(f"  {endpoint:<30} {row['requests']:>8} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} "
+              f"{row['p99_ms']:>9.1f} {row['error_rate']:>7.2%}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load tests against the running stack")
+    parser.add_argument("scenario", choices=[*SCENARIOS, "ceiling"])
+    parser.add_argument("--base-url", default=os.getenv("LOADTEST_BASE_URL", "https://localhost/api"))
+    parser.add_argument("--users", type=int, default=50, help="Virtual users")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds per run (per step for ceiling)")
+    parser.add_argument("--think", type=float, default=1.0, help="Think time scale, 0 for back-to-back requests")
+    parser.add_argument("--poll", type=float, default=30, help="Calendar polling interval in seconds")
+    parser.add_argument("--steps", default="10,25,50,100,200,400", help="User counts for ceiling")
+    parser.add_argument("--slo-ms", type=float, default=1000, help="ceiling: p95 limit over all requests")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="ceiling: error rate limit")
+    parser.add_argument("--output", help="Write the JSON report to this file (default: stdout)")
+    args = parser.parse_args()
+
+    accounts, duty_user_ids = load_accounts(args.base_url)
+
+    if args.scenario != "ceiling":
+        result = run(args.scenario, args.users, args.duration, args, accounts, duty_user_ids)
+        print_report(result)
+    else:
+        result = {"scenario": "ceiling", "slo_ms": args.slo_ms, "max_error_rate": args.max_error_rate, "ceiling_users": 0, "steps": []}
+        for users in (int(step) for step in args.steps.split(",")):
+            report = run("mixed", users, args.duration, args, accounts, duty_user_ids)
+            print_report(report)
+            result["steps"].append(report)
+            if report["p95_ms"] > args.slo_ms or report["error_rate"] > args.max_error_rate:
+                break
+            result["ceiling_users"] = users
+        print(f"\nCeiling: {result['ceiling_users']} concurrent users "
+              f"(p95 <= {args.slo_ms:.0f} ms, errors <= {args.max_error_rate:.1%})", file=sys.stderr)
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Local stand-ins for MS Graph and the 3CX XAPI, for load tests.
+
+Answers the calls made by backend/services/graph_service.py and
+scheduler/main.py after an artificial delay, so a load test measures the
+stack and not Microsoft's or the PBX's latency (and creates no real
+calendar events). GET /stats returns the number of calls per endpoint.
+
+    STANDIN_PORT        listen port (default 9000)
+    STANDIN_LATENCY_MS  delay per call (default 150, roughly Graph's)
+    STANDIN_ERROR_RATE  share of event calls answered with 503 (default 0)
+
+Point the services at it with
+    GRAPH_TOKEN_URL=http://standins:9000/graph/token
+    GRAPH_BASE_URL=http://standins:9000/graph/v1.0
+    CX_TENANT_URL=http://standins:9000/3cx
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STANDIN_PORT = int(os.getenv("STANDIN_PORT", "9000"))
+STANDIN_LATENCY_MS = float(os.getenv("STANDIN_LATENCY_MS", "150"))
+STANDIN_ERROR_RATE = float(os.getenv("STANDIN_ERROR_RATE", "0"))
+
+_calls = Counter()
+_lock = threading.Lock()
+
+EVENTS = re.compile(r"^/graph/v1\.0/(users/[^/]+|me)/calendar/events$")
+EVENT = re.compile(r"^/graph/v1\.0/(users/[^/]+|me)/calendar/events/[^/]+$")
+CX_USER = re.compile(r"^/3cx/xapi/v1/Users\(\d+\)$")
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, status: int, body=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        if data:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method: str):
+        path = self.path.split("?", 1)[0]
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+        if method == "GET" and path == "/stats":
+            with _lock:
+                self._reply(200, dict(_calls))
+            return
+
+        time.sleep(STANDIN_LATENCY_MS / 1000)
+        token = {"access_token": f"standin-{uuid.uuid4().hex}", "token_type": "Bearer", "expires_in": 3600}
+        failed = random.random() < STANDIN_ERROR_RATE
+
+        if method == "POST" and path in ("/graph/token", "/3cx/connect/token"):
+            name, status, body = f"{path} token", 200, token
+        elif method == "POST" and EVENTS.match(path):
+            name, status, body = "graph create_event", 201, {"id": f"standin-{uuid.uuid4()}"}
+        elif method == "DELETE" and EVENT.match(path):
+            name, status, body = "graph delete_event", 204, None
+        elif method == "GET" and path == "/3cx/xapi/v1/Users":
+            name, status, body = "3cx user_lookup", 200, {"value": [{"Id": 1, "Number": "999"}]}
+        elif method == "PATCH" and CX_USER.match(path):
+            name, status, body = "3cx update_mobile", 204, None
+        else:
+            name, status, body = "unknown", 404, {"error": f"No stand-in for {method} {path}"}
+
+        if failed and status < 300 and "token" not in name:
+            status, body = 503, {"error": "Injected failure"}
+        with _lock:
+            _calls[name] += 1
+        self._reply(status, body)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def log_message(self, format, *args):
+        pass  # One line per call would drown the load test output
+
+
+if __name__ == "__main__":
+    print(f"[STANDIN] MS Graph / 3CX stand-in on :{STANDIN_PORT} ({STANDIN_LATENCY_MS:.0f} ms per call)")
+    ThreadingHTTPServer(("", STANDIN_PORT), StandinHandler).serve_forever()
@@ -1,11 +1,79 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool
 import os
+import time
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres:password@db:5432/emergency_db")
 
-engine = create_engine(DATABASE_URL)
+# Copy of the backend engine factory (backend/database.py), which the
+# scheduler image does not contain: keep the pool and timeout settings of
+# both files in sync. The scheduler is a single loop, so one pooled
+# connection plus one spare is plenty.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "1"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "1"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_IDLE_IN_TRANSACTION_TIMEOUT_MS = int(os.getenv("DB_IDLE_IN_TRANSACTION_TIMEOUT_MS", "60000"))
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+DB_POOL_WAIT_WARN_SECONDS = float(os.getenv("DB_POOL_WAIT_WARN_SECONDS", "1"))
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that logs slow and failed checkouts (the backend exports the
+    same measurements as db_pool_checkout_wait_seconds / db_pool_checkout_errors_total;
+    the scheduler has no metrics endpoint).
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception as e:
+            print(f"[WARNING] Database pool checkout failed after {time.perf_counter() - start:.1f} s: {e}")
+            raise
+        waited = time.perf_counter() - start
+        if waited >= DB_POOL_WAIT_WARN_SECONDS:
+            print(f"[WARNING] Waited {waited:.1f} s for a database connection (checked out: {self.checkedout()})")
+        return connection
+
+
+def make_engine(url: str = DATABASE_URL):
+    if not url.startswith("postgresql"):
+        return create_engine(url)
+
+    timeouts = {
+        "statement_timeout": DB_STATEMENT_TIMEOUT_MS,
+        "idle_in_transaction_session_timeout": DB_IDLE_IN_TRANSACTION_TIMEOUT_MS,
+    }
+
+    if DB_PGBOUNCER:
+        engine = create_engine(url, poolclass=NullPool)
+
+        @event.listens_for(engine, "begin")
+        def set_transaction_timeouts(conn):
+            for name, value in timeouts.items():
+                conn.exec_driver_sql(f"SET LOCAL {name} = {int(value)}")
+
+        return engine
+
+    options = " ".join(f"-c {name}={int(value)}" for name, value in timeouts.items())
+    return create_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        connect_args={"options": options},
+    )
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
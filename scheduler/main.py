@@ -2,10 +2,13 @@ import time
 import requests
 import os
 import pytz
+import re
 from datetime import datetime
 from database import SessionLocal
 from models import NotfallPlan, User
 from sqlalchemy import and_
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from tracing import tracer, setup_tracing
 
 # Configuration
 CHECK_INTERVAL = 60 # Check every 60 seconds
@@ -17,6 +20,8 @@ CX_CLIENT_ID = os.getenv("CX_CLIENT_ID", "")
 CX_CLIENT_SECRET = os.getenv("CX_CLIENT_SECRET", "")
 CX_DUMMY_EXT = os.getenv("CX_DUMMY_EXT", "999") # The Dummy Extension to update
 CENTRAL_NUMBER = os.getenv("CENTRAL_NUMBER", "200") # Fallback to Central if no one on duty
+# The backend stores numbers as E.164; anything else (entered before it did) is not sent to 3CX
+E164 = re.compile(r"^\+[1-9]\d{6,14}$")
 
 # Cache for 3CX User ID
 _cx_user_id = None
@@ -39,17 +44,19 @@ def get_3cx_token():
         "scope": "offline_access" # Basic scope
     }
     
-    try:
-        resp = requests.post(token_url, data=payload, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        _last_token = data["access_token"]
-        _token_expiry = time.time() + data.get("expires_in", 3600)
-        print("[3CX] Authenticated successfully.")
-        return _last_token
-    except Exception as e:
-        print(f"[3CX] Authentication failed: {e}")
-        return None
+    with tracer.start_as_current_span("3cx.token", kind=SpanKind.CLIENT) as span:
+        try:
+            resp = requests.post(token_url, data=payload, timeout=10)
+            resp.raise_for_status()
+            data = resp.json()
+            _last_token = data["access_token"]
+            _token_expiry = time.time() + data.get("expires_in", 3600)
+            print("[3CX] Authenticated successfully.")
+            return _last_token
+        except Exception as e:
+            span.set_status(Status(StatusCode.ERROR, str(e)))
+            print(f"[3CX] Authentication failed: {e}")
+            return None
 
 def get_dummy_user_id(token):
     """Finds the System ID of the Dummy User by Extension Number"""
@@ -62,23 +69,25 @@ def get_dummy_user_id(token):
     # Adjust endpoint based on XAPI documentation: /xapi/v1/Users
     url = f"{CX_TENANT_URL}/xapi/v1/Users?$filter=Number eq '{CX_DUMMY_EXT}'"
     
-    try:
-        resp = requests.get(url, headers=headers, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        
-        # XAPI returns list in 'value' or standard OData format
-        users = data.get("value", [])
-        if users:
-            _cx_user_id = users[0]["Id"]
-            print(f"[3CX] Found User ID: {_cx_user_id}")
-            return _cx_user_id
-        else:
-            print(f"[3CX] User with extension {CX_DUMMY_EXT} not found.")
+    with tracer.start_as_current_span("3cx.user_lookup", kind=SpanKind.CLIENT) as span:
+        try:
+            resp = requests.get(url, headers=headers, timeout=10)
+            resp.raise_for_status()
+            data = resp.json()
+            
+            # XAPI returns list in 'value' or standard OData format
+            users = data.get("value", [])
+            if users:
+                _cx_user_id = users[0]["Id"]
+                print(f"[3CX] Found User ID: {_cx_user_id}")
+                return _cx_user_id
+            else:
+                print(f"[3CX] User with extension {CX_DUMMY_EXT} not found.")
+                return None
+        except Exception as e:
+            span.set_status(Status(StatusCode.ERROR, str(e)))
+            print(f"[3CX] User lookup failed: {e}")
             return None
-    except Exception as e:
-        print(f"[3CX] User lookup failed: {e}")
-        return None
 
 def update_3cx_mobile(number: str):
     """Updates the Dummy User's Mobile Number via XAPI"""
@@ -101,33 +110,40 @@ def update_3cx_mobile(number: str):
         "Mobile": number
     }
 
-    try:
-        resp = requests.patch(url, json=payload, headers=headers, timeout=10)
-        resp.raise_for_status()
-        print("[3CX] Successfully updated mobile number.")
-    except Exception as e:
-        print(f"[3CX] Update failed: {e}")
-        if resp.text:
-            print(f"[3CX] Response: {resp.text}")
+    with tracer.start_as_current_span("3cx.update_mobile", kind=SpanKind.CLIENT) as span:
+        try:
+            resp = requests.patch(url, json=payload, headers=headers, timeout=10)
+            resp.raise_for_status()
+            print("[3CX] Successfully updated mobile number.")
+        except Exception as e:
+            span.set_status(Status(StatusCode.ERROR, str(e)))
+            print(f"[3CX] Update failed: {e}")
+            if resp.text:
+                print(f"[3CX] Response: {resp.text}")
 
 def get_current_active_user(db):
     """Finds the user currently scheduled and confirmed."""
     now = datetime.now(TIMEZONE).replace(tzinfo=None) # Start simple
     
-    plan = db.query(NotfallPlan).filter(
-        and_(
-            NotfallPlan.start_date <= now,
-            NotfallPlan.end_date >= now,
-            NotfallPlan.confirmed == True
-        )
-    ).first()
-    
-    if plan and plan.user:
-        return plan.user
-    return None
+    with tracer.start_as_current_span("scheduler.lookup_on_duty") as span:
+        plan = db.query(NotfallPlan).filter(
+            and_(
+                NotfallPlan.start_date <= now,
+                NotfallPlan.end_date >= now,
+                NotfallPlan.confirmed == True
+            )
+        ).first()
+        
+        if plan and plan.user:
+            span.set_attribute("plan.id", plan.id)
+            # How far into the shift this tick is (a late handover shows up here)
+            span.set_attribute("plan.seconds_since_start", (now - plan.start_date).total_seconds())
+            return plan.user
+        return None
 
 def main():
     print("Starting Scheduler Service (Push Mode)...")
+    setup_tracing()
     
     if not CX_CLIENT_ID or not CX_CLIENT_SECRET:
         print("[WARNING] CX_CLIENT_ID or CX_CLIENT_SECRET not set. 3CX Integration disabled.")
@@ -135,32 +151,38 @@ def main():
     last_number = None
 
     while True:
-        try:
-            db = SessionLocal()
-            target_number = CENTRAL_NUMBER # Default Fallback
-
-            user = get_current_active_user(db)
-            if user:
-                if user.phone_number:
-                    target_number = user.phone_number
-                    print(f"[{datetime.now()}] Active Plan: {user.first_name} {user.last_name} ({target_number})")
+        # One trace per tick: DB lookup and 3CX calls are its children
+        with tracer.start_as_current_span("scheduler.tick") as tick:
+            try:
+                db = SessionLocal()
+                target_number = CENTRAL_NUMBER # Default Fallback
+
+                user = get_current_active_user(db)
+                if user:
+                    if user.phone_number and E164.match(user.phone_number):
+                        target_number = user.phone_number
+                        print(f"[{datetime.now()}] Active Plan: {user.first_name} {user.last_name} ({target_number})")
+                    elif user.phone_number:
+                        print(f"[{datetime.now()}] [WARNING] Active Plan: {user.first_name} {user.last_name} has an invalid number ({user.phone_number}). Using Fallback.")
+                    else:
+                        print(f"[{datetime.now()}] Active Plan: {user.first_name} {user.last_name} HAS NO NUMBER. Using Fallback.")
                 else:
-                    print(f"[{datetime.now()}] Active Plan: {user.first_name} {user.last_name} HAS NO NUMBER. Using Fallback.")
-            else:
-                 print(f"[{datetime.now()}] No Active Plan. Using Fallback: {CENTRAL_NUMBER}")
-
-            # Only update if number changed to reduce API calls
-            if target_number != last_number:
-                if CX_CLIENT_ID:
-                    update_3cx_mobile(target_number)
-                last_number = target_number
-            else:
-                pass # No change
+                     print(f"[{datetime.now()}] No Active Plan. Using Fallback: {CENTRAL_NUMBER}")
+
+                # Only update if number changed to reduce API calls
+                if target_number != last_number:
+                    tick.set_attribute("scheduler.number_changed", True)
+                    if CX_CLIENT_ID:
+                        update_3cx_mobile(target_number)
+                    last_number = target_number
+                else:
+                    pass # No change
 
-            db.close()
-            
-        except Exception as e:
-            print(f"Error in scheduler loop: {e}")
+                db.close()
+                
+            except Exception as e:
+                tick.set_status(Status(StatusCode.ERROR, str(e)))
+                print(f"Error in scheduler loop: {e}")
         
         time.sleep(CHECK_INTERVAL)
 
@@ -12,7 +12,7 @@ class User(Base):
     password_hash = Column(String, nullable=False)
     first_name = Column(String, nullable=False)
     last_name = Column(String, nullable=False)
-    phone_number = Column(String, nullable=True)  # For call routing
+    phone_number = Column(String, nullable=True)  # For call routing (E.164, normalized by the backend)
     role = Column(String, default="planner")  # admin, planner, buchhaltung
     is_active = Column(Boolean, default=True)
     can_take_duty = Column(Boolean, default=True)  # Eligible for emergency service
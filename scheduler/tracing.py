@@ -0,0 +1,99 @@
+"""
+OpenTelemetry tracing for the scheduler (same settings as backend/services/tracing.py).
+
+One span per tick (main.py), with child spans for the on-duty lookup, the
+3CX calls and every SQL statement.
+
+OTEL_TRACES_EXPORTER: none (default) | console | file | otlp | package.module:factory
+
+The scheduler image is built without the backend code, so the exporter
+setup and the SQL span listeners are copies of the backend's; keep them
+in sync with backend/services/tracing.py.
+"""
+import importlib
+import os
+import threading
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SpanExporter, SpanExportResult
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "emergency-scheduler")
+OTEL_TRACES_EXPORTER = os.getenv("OTEL_TRACES_EXPORTER", "none")
+OTEL_TRACES_FILE = os.getenv("OTEL_TRACES_FILE", "traces.jsonl")
+
+tracer = trace.get_tracer("emergency-scheduler")
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends finished spans as one JSON object per line (for offline analysis)."""
+
+    def __init__(self, path: str = OTEL_TRACES_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        lines = [span.to_json(indent=None) + "\n" for span in spans]
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+def make_exporter(name: str = OTEL_TRACES_EXPORTER):
+    if name in ("", "none"):
+        return None
+    if name == "console":
+        return ConsoleSpanExporter()
+    if name == "file":
+        return FileSpanExporter()
+    if name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    module_name, _, factory = name.partition(":")
+    return getattr(importlib.import_module(module_name), factory)()
+
+
+def setup_tracing(service_name: str = OTEL_SERVICE_NAME):
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    exporter = make_exporter()
+    if exporter is not None:
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    print(f"[TRACING] {service_name}: exporter {OTEL_TRACES_EXPORTER}")
+
+
+# --- SQLAlchemy: one client span per statement inside a traced operation ---
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_db_span(conn, cursor, statement, parameters, context, executemany):
+    if not trace.get_current_span().is_recording():
+        return  # Untraced work (e.g. before the first tick)
+    operation = statement.split(None, 1)[0].upper() if statement else "SQL"
+    conn.info["otel_span"] = tracer.start_span(
+        f"db {operation}",
+        kind=SpanKind.CLIENT,
+        attributes={"db.system": conn.dialect.name, "db.statement": statement[:2000]},
+    )
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_db_span(conn, cursor, statement, parameters, context, executemany):
+    span = conn.info.pop("otel_span", None)
+    if span is not None:
+        span.end()
+
+
+@event.listens_for(Engine, "handle_error")
+def _fail_db_span(exception_context):
+    connection = exception_context.connection
+    span = connection.info.pop("otel_span", None) if connection is not None else None
+    if span is not None:
+        span.record_exception(exception_context.original_exception)
+        span.set_status(Status(StatusCode.ERROR))
+        span.end()